@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque
+
+from pymongo.errors import BulkWriteError
+
+# Buffers analytics events in memory and writes them with unordered insert_many.
+# A background task flushes whenever `batch_size` events are waiting or `flush_interval_ms` has
+# passed since the last flush. The buffer holds at most `capacity` events; past that add() raises
+# BufferFullError so the endpoint can shed load instead of growing without bound.
+# insert_many stamps _ids onto the batch before sending it, so a retried batch can partly be in the
+# collection already: those come back as duplicate-key (E11000) write errors and count as written.
+# Other per-document errors are retried if transient, otherwise the document is dropped.
+
+DUPLICATE_KEY = 11000
+# Write errors worth retrying: the server was stepping down, shutting down or timed out
+TRANSIENT_WRITE_ERRORS = {6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+STOP_MAX_FAILURES = 3
+
+
+class BufferFullError(Exception):
+    pass
+
+
+class EventBuffer:
+    def __init__(self, collection, batch_size=500, flush_interval_ms=250, capacity=50_000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.capacity = capacity
+        self.events = deque()
+        self.stats = {"accepted": 0, "written": 0, "rejected": 0, "dropped": 0, "flushes": 0}
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+        self._listeners = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def subscribe(self, fn):
+        # `await fn(batch)` runs after each batch has been written (e.g. to maintain rollups)
+        self._listeners.append(fn)
+
+    def add_many(self, events):
+        if len(self.events) + len(events) > self.capacity:
+            self.stats["rejected"] += len(events)
+            raise BufferFullError("Analytics buffer is full")
+        self.events.extend(events)
+        self.stats["accepted"] += len(events)
+        if len(self.events) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def add(self, event):
+        self.add_many([event])
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Stop the background flusher, then write out whatever is still buffered
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        failures = 0
+        while self.events:
+            if await self.flush():
+                failures = 0
+                continue
+            failures += 1
+            if failures >= STOP_MAX_FAILURES:
+                self.stats["dropped"] += len(self.events)
+                print(f"ERROR: Dropping {len(self.events)} analytics events after {failures} failed flushes at shutdown")
+                self.events.clear()
+                break
+            await asyncio.sleep(self.flush_interval)
+
+    def _requeue(self, docs):
+        # Back at the head if there's room, so a short outage doesn't lose events
+        if len(self.events) + len(docs) <= self.capacity:
+            self.events.extendleft(reversed(docs))
+        else:
+            self.stats["dropped"] += len(docs)
+
+    async def flush(self):
+        # Writes up to one batch; returns False if (part of) the write failed and was requeued
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            n = min(len(self.events), self.batch_size)
+            if n == 0:
+                return True
+            batch = [self.events.popleft() for _ in range(n)]
+            written, ok = batch, True
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except asyncio.CancelledError:
+                # Shutting down mid-write: keep the batch for stop() to flush. Whatever did land
+                # comes back as duplicate-key errors on that retry and is counted as written then.
+                self.events.extendleft(reversed(batch))
+                raise
+            except BulkWriteError as e:
+                # Unordered: every document without a write error was inserted
+                retry, drop = set(), {}
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") == DUPLICATE_KEY:
+                        continue # already in the collection from an earlier attempt
+                    if error.get("code") in TRANSIENT_WRITE_ERRORS:
+                        retry.add(error["index"])
+                    else:
+                        drop[error["index"]] = error.get("errmsg")
+                written = [doc for i, doc in enumerate(batch) if i not in retry and i not in drop]
+                if drop:
+                    self.stats["dropped"] += len(drop)
+                    print(f"ERROR: Dropped {len(drop)} analytics events the database rejected: {next(iter(drop.values()))}")
+                if retry:
+                    self._requeue([batch[i] for i in sorted(retry)])
+                    print(f"ERROR: Failed to write {len(retry)} of {len(batch)} analytics events, will retry")
+                    ok = False
+            except Exception as e:
+                self._requeue(batch)
+                print(f"ERROR: Failed to flush {len(batch)} analytics events: {e}")
+                return False
+            self.stats["written"] += len(written)
+            self.stats["flushes"] += 1
+            if written:
+                for fn in self._listeners:
+                    try:
+                        await fn(written)
+                    except Exception as e:
+                        print(f"ERROR: analytics listener failed for {len(written)} events: {e}")
+            return ok
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Woken by a full batch or the interval expiring: drain everything that's waiting
+            while self.events:
+                if not await self.flush():
+                    await asyncio.sleep(self.flush_interval) # back off after a failed write
+                    break
@@ -0,0 +1,153 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# Per-minute and per-hour event counts, maintained incrementally from each flushed batch of raw
+# analytics events. One rollup document per (granularity, bucket, eventName, productId):
+#   productId=None  -> total count for that event name in the bucket
+#   productId="12"  -> count for that product (taken from eventData.productId)
+# Raw events expire through a TTL index on `timestamp`; minute rollups carry an `expiresAt` so
+# they age out too, hour rollups are kept. An existing index on either field without the wanted
+# TTL is converted with collMod instead of failing startup.
+# Increments that fail to apply are kept and sent again with the next batch. $inc isn't idempotent,
+# so only the operations the server reported as failed are kept; after a connection error mid-write
+# the whole batch is, and some counts may then be applied twice.
+
+GRANULARITIES = ("minute", "hour")
+
+
+def _utc_naive(ts):
+    if ts is None:
+        return datetime.utcnow()
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts, granularity):
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _product_id(event):
+    data = event.get("eventData") or {}
+    product_id = data.get("productId")
+    return None if product_id is None else str(product_id)
+
+
+def rollup_counts(events):
+    counts = Counter()
+    for event in events:
+        ts = _utc_naive(event.get("timestamp"))
+        name = event.get("eventName")
+        product_id = _product_id(event)
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(ts, granularity)
+            counts[(granularity, bucket, name, None)] += 1
+            if product_id is not None:
+                counts[(granularity, bucket, name, product_id)] += 1
+    return counts
+
+
+def rollup_updates(counts, minute_retention):
+    # counts: rollup_counts() output; ops are in counts' iteration order
+    ops = []
+    for (granularity, bucket, name, product_id), n in counts.items():
+        key = {"granularity": granularity, "bucket": bucket, "eventName": name, "productId": product_id}
+        on_insert = {"expiresAt": bucket + minute_retention} if granularity == "minute" else {}
+        update = {"$inc": {"count": n}}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        ops.append(UpdateOne(key, update, upsert=True))
+    return ops
+
+
+class AnalyticsRollups:
+    def __init__(self, raw_collection, rollup_collection, raw_ttl_days=30, minute_retention_days=7):
+        self.raw = raw_collection
+        self.rollups = rollup_collection
+        self.raw_ttl = timedelta(days=raw_ttl_days)
+        self.minute_retention = timedelta(days=minute_retention_days)
+        self.pending = Counter() # increments that failed to apply, retried with the next batch
+
+    async def ensure_indexes(self):
+        await self.rollups.create_index(
+            [("granularity", 1), ("eventName", 1), ("bucket", 1), ("productId", 1)], unique=True
+        )
+        await self.rollups.create_index([("granularity", 1), ("bucket", 1)])
+        await self._ensure_ttl(self.rollups, "expiresAt", 0)
+        await self._ensure_ttl(self.raw, "timestamp", int(self.raw_ttl.total_seconds()))
+
+    async def _ensure_ttl(self, collection, field, seconds):
+        existing = next(
+            (info for info in (await collection.index_information()).values() if info["key"] == [(field, 1)]),
+            None,
+        )
+        if existing is None:
+            await collection.create_index(field, expireAfterSeconds=seconds)
+        elif existing.get("expireAfterSeconds") != seconds:
+            # create_index would fail with IndexOptionsConflict; change the TTL in place
+            try:
+                await collection.database.command(
+                    {"collMod": collection.name, "index": {"keyPattern": {field: 1}, "expireAfterSeconds": seconds}}
+                )
+            except OperationFailure as e:
+                print(f"WARNING: could not set a {seconds}s TTL on {collection.name}.{field}: {e}")
+
+    async def apply(self, events):
+        # Called with each batch after it has been written to the raw collection
+        counts = rollup_counts(events)
+        counts.update(self.pending)
+        self.pending = Counter()
+        if not counts:
+            return
+        keys = list(counts)
+        ops = rollup_updates(counts, self.minute_retention)
+        try:
+            await self.rollups.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything without a write error was applied
+            failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+            self.pending.update({key: counts[key] for key in failed})
+            print(f"ERROR: {len(failed)} of {len(ops)} analytics rollup updates failed, retrying with the next batch")
+        except Exception as e:
+            self.pending.update(counts)
+            print(f"ERROR: analytics rollup update failed ({len(ops)} updates), retrying with the next batch: {e}")
+
+    def _match(self, since, until, event_name, products):
+        span = until - since
+        # Minute buckets for short windows, hour buckets otherwise (or once minute rollups have expired)
+        granularity = "minute" if span <= timedelta(hours=6) and since >= datetime.utcnow() - self.minute_retention else "hour"
+        match = {
+            "granularity": granularity,
+            "bucket": {"$gte": bucket_start(since, granularity), "$lte": until},
+            "productId": {"$ne": None} if products else None,
+        }
+        if event_name:
+            match["eventName"] = event_name
+        return match, granularity
+
+    async def event_counts(self, since, until, event_name=None):
+        match, granularity = self._match(since, until, event_name, products=False)
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$eventName", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1}},
+        ]
+        rows = await self.rollups.aggregate(pipeline).to_list(length=None)
+        return granularity, [{"eventName": r["_id"], "count": r["count"]} for r in rows]
+
+    async def top_products(self, since, until, event_name=None, limit=10):
+        match, granularity = self._match(since, until, event_name, products=True)
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$productId", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1}},
+            {"$limit": limit},
+        ]
+        rows = await self.rollups.aggregate(pipeline).to_list(length=None)
+        return granularity, [{"productId": r["_id"], "count": r["count"]} for r in rows]
@@ -0,0 +1,80 @@
+# Events/sec for analytics ingestion: one insert_one per event (old /api/analytics/track) vs EventBuffer.
+# Runs against MONGO_URI (scratch database "bench_analytics") or in-process with --mongomock.
+# Usage (from backend/): python benchmarks/bench_analytics_ingest.py --events 20000 --concurrency 200
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics_buffer import EventBuffer  # noqa: E402
+
+
+def make_client(use_mongomock):
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(override=True)
+    return AsyncIOMotorClient(os.getenv("MONGO_URI"))
+
+
+def make_event(i):
+    return {
+        "eventName": "product_view" if i % 3 else "add_to_cart",
+        "eventData": {"productId": str(i % 30 + 1)},
+        "timestamp": datetime.utcnow(),
+        "userId": f"user{i % 100}",
+        "sessionId": None,
+    }
+
+
+async def run(write_one, events, concurrency):
+    queue = iter(range(events))
+
+    async def worker():
+        for i in queue:
+            await write_one(make_event(i))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - t0
+
+
+async def main(args):
+    client = make_client(args.mongomock)
+    collection = client["bench_analytics"]["events"]
+
+    await collection.delete_many({})
+    single_s = await run(collection.insert_one, args.events, args.concurrency)
+
+    await collection.delete_many({})
+    buffer = EventBuffer(collection, batch_size=args.batch, flush_interval_ms=args.flush_ms, capacity=args.events + 1)
+    buffer.start()
+
+    async def buffered(event):
+        buffer.add(event)
+
+    t0 = time.perf_counter()
+    accept_s = await run(buffered, args.events, args.concurrency)
+    await buffer.stop() # include the time to get every event into Mongo
+    batched_s = time.perf_counter() - t0
+    written = await collection.count_documents({})
+    await client.drop_database("bench_analytics")
+
+    print(f"insert_one : {args.events / single_s:10.0f} events/s ({single_s:.2f}s)")
+    print(f"buffered   : {args.events / batched_s:10.0f} events/s end-to-end ({batched_s:.2f}s), "
+          f"{args.events / accept_s:.0f} events/s accepted, {buffer.stats['flushes']} flushes, {written} written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--flush-ms", type=float, default=250)
+    parser.add_argument("--mongomock", action="store_true")
+    asyncio.run(main(parser.parse_args()))
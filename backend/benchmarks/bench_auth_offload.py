@@ -0,0 +1,79 @@
+# Shows what a login burst does to everything else on the event loop: 100 concurrent bcrypt verifies,
+# inline (old login handler) vs PasswordHasher, while a probe coroutine standing in for a cart route
+# measures how long it waits to be scheduled. Needs only bcrypt.
+# Usage (from backend/): python benchmarks/bench_auth_offload.py --logins 100 --rounds 12
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from password_hasher import PasswordHasher  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def probe(stop, interval=0.005):
+    # A cheap request every 5 ms; latency = how late it gets to run
+    lat = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lat.append((time.perf_counter() - t0 - interval) * 1000)
+    return lat
+
+
+async def scenario(verify, logins):
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop))
+    await asyncio.sleep(0.05)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    lat = await probe_task
+    return {
+        "logins_per_s": round(logins / elapsed, 1),
+        "probe_p50_ms": round(statistics.median(lat), 2),
+        "probe_p99_ms": round(percentile(lat, 99), 2),
+        "probe_max_ms": round(max(lat), 2),
+    }
+
+
+async def main(args):
+    password = b"correct horse battery staple"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=args.rounds)).decode()
+
+    async def inline():
+        await asyncio.sleep(0) # the user lookup
+        bcrypt.checkpw(password, hashed.encode())
+
+    hasher = PasswordHasher(rounds=args.rounds, max_workers=args.workers, max_pending=args.logins, timeout=60)
+
+    async def offloaded():
+        await asyncio.sleep(0)
+        await hasher.verify(password.decode(), hashed)
+
+    results = {
+        "inline": await scenario(inline, args.logins),
+        "offloaded": await scenario(offloaded, args.logins),
+        "hasher": hasher.snapshot(),
+    }
+    hasher.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+# Fires N parallel /cart/add operations at one user and checks no update was lost.
+# Runs against MONGO_URI (scratch database "bench_cart"). --mongomock (pip install mongomock-motor)
+# only smoke-tests the script: mongomock re-applies the filter after $push and ignores the $elemMatch
+# projection in find_one_and_update, so the consistency check is reported as unsupported there.
+# Usage (from backend/): python benchmarks/bench_cart_concurrency.py --adds 1000 --products 10
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cart_ops import add_item  # noqa: E402
+
+
+def make_client(use_mongomock):
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(override=True)
+    return AsyncIOMotorClient(os.getenv("MONGO_URI"))
+
+
+async def main(args):
+    client = make_client(args.mongomock)
+    db = client["bench_cart"]
+    users = db["users"]
+    await users.delete_many({})
+    await users.insert_one({"username": "bench", "cart": [], "cartTotals": {"lines": 0, "quantity": 0, "amountCents": 0}})
+
+    # Spread adds over a few products so both the $push and the positional $inc paths race
+    plan = [(f"p{i % args.products}", 1 + i % 3) for i in range(args.adds)]
+    expected = Counter()
+    for product_id, quantity in plan:
+        expected[product_id] += quantity
+
+    async def one(product_id, quantity):
+        item = {"productId": product_id, "name": product_id, "price": 1.0, "image": None}
+        await add_item(users, "bench", item, quantity)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(p, q) for p, q in plan))
+    elapsed = time.perf_counter() - t0
+    if args.mongomock:
+        print(f"{args.adds} adds in {elapsed:.2f}s ({args.adds / elapsed:.0f}/s), "
+              "consistency check unsupported under mongomock")
+        await client.drop_database("bench_cart")
+        return 0
+
+    user = await users.find_one({"username": "bench"})
+    cart = user["cart"]
+    actual = Counter({i["productId"]: i["quantity"] for i in cart})
+    duplicates = len(cart) - len({i["productId"] for i in cart})
+    # Every line is priced at 1.00, so the maintained totals must match the summed quantities
+    totals = user["cartTotals"]
+    totals_ok = totals == {"lines": len(expected), "quantity": sum(expected.values()), "amountCents": 100 * sum(expected.values())}
+    ok = actual == expected and duplicates == 0 and totals_ok
+    print(f"{args.adds} adds in {elapsed:.2f}s ({args.adds / elapsed:.0f}/s), "
+          f"cart lines={len(cart)}, duplicates={duplicates}, quantities {'OK' if actual == expected else 'MISMATCH'}, "
+          f"totals {'OK' if totals_ok else 'MISMATCH'}")
+    if not ok:
+        print(f"expected={dict(expected)}\nactual={dict(actual)}\ntotals={totals}")
+    await client.drop_database("bench_cart")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--adds", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--mongomock", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,85 @@
+# Time-to-first-byte for the chatbot: the buffered path (/chatbot waits for the whole completion and
+# renders markdown) vs the streaming path (/chatbot/stream relays the first token straight away).
+# Uses the local stub OpenAI server; caching is disabled so every request goes upstream.
+# Usage (from backend/): python benchmarks/bench_chat_ttfb.py --requests 50 --latency-ms 1500
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import markdown
+from openai import AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from llm_client import CachedLLMClient  # noqa: E402
+from chat_stream import sse, MarkdownBlockRenderer  # noqa: E402
+from stub_openai import serve_in_thread, app as stub_app  # noqa: E402
+
+
+async def buffered(llm, question):
+    t0 = time.perf_counter()
+    text = await llm.complete("stub-model", [{"role": "user", "content": question}])
+    markdown.markdown(text)
+    ttfb = time.perf_counter() - t0
+    return ttfb, ttfb
+
+
+async def streamed(llm, question):
+    t0 = time.perf_counter()
+    ttfb = None
+    renderer = MarkdownBlockRenderer(markdown.markdown)
+    async for delta in llm.stream("stub-model", [{"role": "user", "content": question}]):
+        sse("token", {"text": delta})
+        if ttfb is None:
+            ttfb = time.perf_counter() - t0
+        for html in renderer.feed(delta):
+            sse("block", {"html": html})
+    renderer.finish()
+    return ttfb, time.perf_counter() - t0
+
+
+async def cancelled(llm, question):
+    # Read two tokens and hang up, like a browser tab being closed mid-answer
+    tokens = llm.stream("stub-model", [{"role": "user", "content": question}])
+    n = 0
+    async for _ in tokens:
+        n += 1
+        if n == 2:
+            break
+    await tokens.aclose()
+
+
+def summarize(samples):
+    ttfb = [s[0] * 1000 for s in samples]
+    total = [s[1] * 1000 for s in samples]
+    return {"ttfb_p50_ms": round(statistics.median(ttfb), 1), "ttfb_max_ms": round(max(ttfb), 1),
+            "total_p50_ms": round(statistics.median(total), 1)}
+
+
+async def main(args):
+    server = serve_in_thread(args.port, latency_ms=args.latency_ms)
+    client = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{args.port}/v1")
+    llm = CachedLLMClient(client, max_concurrency=args.requests, timeout=30, cache_size=0)
+
+    questions = [f"Suggest a gift under {i * 10}" for i in range(args.requests)]
+    results = {
+        "buffered": summarize(await asyncio.gather(*(buffered(llm, q) for q in questions))),
+        "streamed": summarize(await asyncio.gather(*(streamed(llm, q) for q in questions))),
+    }
+    await asyncio.gather(*(cancelled(llm, q) for q in questions[:10]))
+    await asyncio.sleep(0.2)
+    results["upstream_streams_cancelled"] = stub_app.state.cancelled_streams
+    server.should_exit = True
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=1500)
+    parser.add_argument("--port", type=int, default=8102)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+# Load test for the /visual-search encode path: 50 concurrent uploads, inline encode (old behaviour,
+# blocking the event loop) vs BatchingEncoder. Uses a stub encoder whose cost is a fixed per-call
+# overhead plus a per-image cost, which is how CLIP on CPU/GPU behaves; pass --real to use CLIP.
+# Usage (from backend/): python benchmarks/bench_clip_batching.py --concurrency 50 --requests 500
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference_queue import BatchingEncoder, QueueFullError  # noqa: E402
+
+
+def make_stub_encoder(call_ms, item_ms):
+    def encode(images):
+        time.sleep((call_ms + item_ms * len(images)) / 1000)
+        return [[0.0] * 512 for _ in images]
+    return encode
+
+
+def make_real_encoder():
+    from PIL import Image
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer("clip-ViT-B-32")
+    image = Image.new("RGB", (224, 224), (120, 90, 60))
+
+    def encode(images):
+        return model.encode([image] * len(images), batch_size=len(images), convert_to_numpy=True)
+    return encode
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def drive(encode_one, concurrency, total):
+    # Closed loop: `concurrency` clients, each issuing its next upload as soon as the previous one
+    # returns. Latency is measured from the issue time, so time spent waiting for a blocked event
+    # loop is included.
+    latencies, rejected = [], 0
+
+    async def client(n):
+        nonlocal rejected
+        issued = time.perf_counter()
+        for _ in range(n):
+            try:
+                await encode_one()
+            except QueueFullError:
+                rejected += 1
+            else:
+                latencies.append((time.perf_counter() - issued) * 1000)
+            issued = time.perf_counter()
+
+    t0 = time.perf_counter()
+    per_client = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    await asyncio.gather(*(client(n) for n in per_client))
+    elapsed = time.perf_counter() - t0
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "images_per_s": round(len(latencies) / elapsed, 1),
+        "rejected": rejected,
+    }
+
+
+async def main(args):
+    encode = make_real_encoder() if args.real else make_stub_encoder(args.call_ms, args.item_ms)
+
+    async def inline():
+        # What visual_search did before: a blocking encode on the event loop. The sleep(0) stands in
+        # for the upload read, which is where the real handler yields to other requests.
+        await asyncio.sleep(0)
+        encode(["img"])
+
+    batcher = BatchingEncoder(encode, max_batch_size=args.batch, max_wait_ms=args.wait_ms, max_queue=args.queue)
+    batcher.start()
+    try:
+        results = {
+            "inline": await drive(inline, args.concurrency, args.requests),
+            "batched": await drive(lambda: batcher.encode("img"), args.concurrency, args.requests),
+            "batcher_stats": batcher.stats,
+        }
+    finally:
+        await batcher.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, default=10)
+    parser.add_argument("--queue", type=int, default=256)
+    parser.add_argument("--call-ms", type=float, default=25, help="stub: fixed cost per encode call")
+    parser.add_argument("--item-ms", type=float, default=5, help="stub: extra cost per image")
+    parser.add_argument("--real", action="store_true", help="use the real CLIP model")
+    asyncio.run(main(parser.parse_args()))
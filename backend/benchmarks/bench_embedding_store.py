@@ -0,0 +1,64 @@
+# Start-up cost of EmbeddingStore.sync for a large catalog: cold (empty store, everything encoded),
+# warm (nothing changed) and with a fraction of products renamed. The encoder is a stub that returns
+# random vectors, so the numbers are the store's own load/compare/save cost plus how many rows would
+# have gone through CLIP; multiply "encoded" by the real per-row encode time for the full picture.
+# Usage (from backend/): python benchmarks/bench_embedding_store.py --products 100000 --changed 0.01
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_store import EmbeddingStore  # noqa: E402
+
+
+class StubEncoder:
+    def __init__(self, dim, seed=0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+        self.encoded = 0
+
+    def __call__(self, texts, batch_size=None):
+        self.encoded += len(texts)
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32)
+
+
+def timed_sync(path, products, texts, dim):
+    # A fresh EmbeddingStore per run, as a restarted worker would have
+    encoder = StubEncoder(dim)
+    t0 = time.perf_counter()
+    matrix = EmbeddingStore(path, "bench-model").sync(products, texts, encoder)
+    np.asarray(matrix[-1])  # touch the mmap so a warm load is not just an open()
+    return {"sync_s": round(time.perf_counter() - t0, 3), "encoded": encoder.encoded}
+
+
+def main(args):
+    path = args.dir or tempfile.mkdtemp(prefix="bench_embedding_store_")
+    products = [{"id": str(i)} for i in range(args.products)]
+    texts = [f"Product {i} name" for i in range(args.products)]
+    try:
+        print(json.dumps({"products": args.products, "dim": args.dim, "run": "cold", **timed_sync(path, products, texts, args.dim)}))
+        print(json.dumps({"products": args.products, "dim": args.dim, "run": "warm", **timed_sync(path, products, texts, args.dim)}))
+        step = max(1, int(1 / args.changed)) if args.changed > 0 else 0
+        if step:
+            texts = [f"{t} v2" if i % step == 0 else t for i, t in enumerate(texts)]
+            print(json.dumps({"products": args.products, "dim": args.dim, "run": f"changed_{args.changed}",
+                              **timed_sync(path, products, texts, args.dim)}))
+        size_mb = sum(e.stat().st_size for e in os.scandir(path)) / 1e6
+        print(json.dumps({"store_mb": round(size_mb, 1)}))
+    finally:
+        if not args.dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--changed", type=float, default=0.01, help="fraction of products renamed for the last run")
+    parser.add_argument("--dir", default=None, help="store directory to reuse (default: a temp dir, removed afterwards)")
+    main(parser.parse_args())
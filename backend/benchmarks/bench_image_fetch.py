@@ -0,0 +1,123 @@
+# Products/sec for image acquisition against a local stub search + image server: one product at a
+# time (the old bing.py / SerpApi loop) vs ImageFetcher with N concurrent requests. The stub adds
+# --latency-ms to every request and fails --fail-rate of them with 503 to exercise the retries.
+# A second pass kills the run halfway and resumes it from the checkpoint.
+# Usage (from backend/): python benchmarks/bench_image_fetch.py --products 200 --concurrency 16
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from io import BytesIO
+from urllib.parse import urlparse, parse_qs, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from image_fetcher import ImageFetcher, HttpSearchProvider  # noqa: E402
+
+
+def stub_image():
+    out = BytesIO()
+    Image.new("RGB", (64, 64), (200, 80, 40)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def serve_stub(latency_ms, fail_rate):
+    image = stub_image()
+    rng = random.Random(0)
+    calls = {"n": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, so pooled connections are actually reused
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            calls["n"] += 1
+            time.sleep(latency_ms / 1000)
+            url = urlparse(self.path)
+            if rng.random() < fail_rate:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if url.path == "/search":
+                q = parse_qs(url.query)["q"][0]
+                body = json.dumps({"images": [f"http://{self.headers['Host']}/img/{quote(q)}.png"]}).encode()
+                content_type = "application/json"
+            else:
+                body, content_type = image, "image/png"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            pass # the cancelled run in the resume pass drops connections mid-response
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+async def timed_run(names, provider, out_dir, concurrency, checkpoint=None):
+    fetcher = ImageFetcher(provider, out_dir=out_dir, concurrency=concurrency, retries=5, backoff=0.01,
+                           checkpoint_path=checkpoint)
+    t0 = time.perf_counter()
+    results = await fetcher.run(names)
+    return time.perf_counter() - t0, fetcher.stats, results
+
+
+async def main(args):
+    server, calls = serve_stub(args.latency_ms, args.fail_rate)
+    provider = HttpSearchProvider(f"http://127.0.0.1:{server.server_address[1]}/search")
+    names = [f"Product {i}" for i in range(args.products)]
+    report = {"products": args.products, "latency_ms": args.latency_ms, "fail_rate": args.fail_rate}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        serial_s, serial_stats, _ = await timed_run(names, provider, os.path.join(tmp, "serial"), 1)
+        pooled_s, pooled_stats, _ = await timed_run(names, provider, os.path.join(tmp, "pooled"), args.concurrency)
+        report["serial"] = {"s": round(serial_s, 2), "products_per_s": round(len(names) / serial_s, 1), **serial_stats}
+        report["concurrent"] = {"s": round(pooled_s, 2), "products_per_s": round(len(names) / pooled_s, 1), **pooled_stats}
+
+        # Crash halfway through, then resume from the checkpoint
+        checkpoint = os.path.join(tmp, "fetch.checkpoint.jsonl")
+        out_dir = os.path.join(tmp, "resume")
+        task = asyncio.create_task(timed_run(names, provider, out_dir, args.concurrency, checkpoint))
+        await asyncio.sleep(pooled_s / 2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        calls_before = calls["n"]
+        resume_s, resume_stats, results = await timed_run(names, provider, out_dir, args.concurrency, checkpoint)
+        report["resume"] = {
+            "s": round(resume_s, 2),
+            "resumed_from_checkpoint": resume_stats["resumed"],
+            "requests": calls["n"] - calls_before,
+            "complete": sum(1 for r in results.values() if r["path"]) == len(names),
+        }
+    server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+# Image variant build: sources/sec with 1 vs N pool workers, and bytes a product-grid tile
+# downloads (the original JPEG vs the 320px WebP/AVIF variant). Uses images/ if present, otherwise
+# --synthetic generated photos.
+# Usage (from backend/): python benchmarks/bench_image_variants.py --workers 4 --synthetic 40
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from image_variants import ImageVariantStore  # noqa: E402
+
+
+def make_sources(directory, n):
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        # Blurred noise compresses roughly like a product photo, unlike raw noise
+        pixels = (rng.random((150, 200, 3)) * 255).astype("uint8")
+        img = Image.fromarray(pixels).resize((1600, 1200), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+        img.save(os.path.join(directory, f"product_{i}.jpg"), quality=92)
+
+
+def tile_bytes(store, name, fmt, width):
+    candidates = sorted((v for v in store.variants(name) if v["format"] == fmt), key=lambda v: v["width"])
+    return next((v for v in candidates if v["width"] >= width), candidates[-1])["bytes"]
+
+
+async def timed_build(source_dir, out_dir, workers):
+    store = ImageVariantStore(source_dir, out_dir, workers=workers)
+    t0 = time.perf_counter()
+    rendered = await store.build()
+    return time.perf_counter() - t0, len(rendered), store
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = os.path.join(BACKEND_DIR, "images")
+        if args.synthetic or not os.path.isdir(source_dir):
+            source_dir = os.path.join(tmp, "src")
+            os.makedirs(source_dir)
+            make_sources(source_dir, args.synthetic or 40)
+
+        one_s, n, _ = await timed_build(source_dir, os.path.join(tmp, "w1"), 1)
+        pooled_s, _, store = await timed_build(source_dir, os.path.join(tmp, "wn"), args.workers)
+        noop_s, _, _ = await timed_build(source_dir, os.path.join(tmp, "wn"), args.workers)
+
+        original = sum(os.path.getsize(os.path.join(source_dir, name)) for name in store.images)
+        tile = {fmt: sum(tile_bytes(store, name, fmt, 320) for name in store.images) for fmt in store.formats}
+        print(json.dumps({
+            "sources": n,
+            "formats": store.formats,
+            "build_1_worker_s": round(one_s, 2),
+            f"build_{args.workers}_workers_s": round(pooled_s, 2),
+            "rebuild_unchanged_s": round(noop_s, 3),
+            "grid_bytes_original": original,
+            "grid_bytes_320px": tile,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--synthetic", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+# Drives CachedLLMClient against the local stub OpenAI server with a skewed, repetitive workload
+# (a few popular questions asked many times, some concurrently) and reports hit ratio and latency saved.
+# Usage (from backend/): python benchmarks/bench_llm_cache.py --requests 500 --distinct 40 --concurrency 32
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from openai import AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from llm_client import CachedLLMClient  # noqa: E402
+from stub_openai import serve_in_thread, app as stub_app  # noqa: E402
+
+
+async def main(args):
+    server = serve_in_thread(args.port, latency_ms=args.latency_ms)
+    client = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{args.port}/v1")
+    llm = CachedLLMClient(client, max_concurrency=args.max_concurrency, timeout=10)
+
+    rng = random.Random(0)
+    questions = [f"What are the best budget headphones under {100 + 10 * i}?" for i in range(args.distinct)]
+    # Zipf-ish popularity; whitespace/case variants exercise prompt normalisation
+    weights = [1 / (i + 1) for i in range(args.distinct)]
+    workload = [rng.choices(questions, weights)[0] for _ in range(args.requests)]
+    workload = [q.upper() if rng.random() < 0.1 else f"  {q} " if rng.random() < 0.1 else q for q in workload]
+
+    latencies = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def ask(q):
+        async with sem:
+            t0 = time.perf_counter()
+            await llm.complete("stub-model", [{"role": "user", "content": q}], max_tokens=300)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(ask(q) for q in workload))
+    elapsed = time.perf_counter() - t0
+    server.should_exit = True
+
+    print(json.dumps({
+        "requests": args.requests,
+        "upstream_calls": stub_app.state.calls,
+        "elapsed_s": round(elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "uncached_latency_ms": args.latency_ms,
+        **llm.snapshot(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--port", type=int, default=8101)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,287 @@
+# End-to-end load test of the FastAPI app: seeds a synthetic catalog, users and view history, starts
+# the app in its own process against mongomock or a local mongod, with stub CLIP, Groq and
+# translator services, drives a mixed workload and prints throughput and p50/p95/p99 per endpoint as
+# JSON. Runs entirely offline (see loadtest/ for the pieces).
+# --compare checks the results against a stored baseline and exits 1 on a regression, so a change to
+# main.py can be shown to make things faster or slower. Baselines are per machine: record one with
+# --save-baseline on the machine you compare on.
+# Usage (from backend/):
+#   python benchmarks/bench_load.py --duration 60 --compare
+#   python benchmarks/bench_load.py --save-baseline                                (on the base commit)
+#   python benchmarks/bench_load.py --products 50000 --users 5000 --concurrency 64
+#   python benchmarks/bench_load.py --mongo mongodb://127.0.0.1:27017 --reset      (existing server)
+#   python benchmarks/bench_load.py --mix visual_search=50,login=0 --env CLIP_BATCH_MAX_SIZE=32
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+from loadtest.synthetic import Dataset, upload_images  # noqa: E402
+from loadtest.workloads import run_load, parse_mix, MONGOMOCK_UNSUPPORTED  # noqa: E402
+from loadtest.report import summarize, compare  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "loadtest", "baseline.json")
+HEALTH_SNAPSHOTS = ("/health/auth", "/health/recommendations", "/health/search", "/health/visual-search", "/health/llm")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+        return f"{rev}-dirty" if dirty else rev
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_mongod(workdir):
+    # Throwaway mongod on a free port with its data under the scratch directory
+    binary = shutil.which("mongod")
+    if binary is None:
+        sys.exit("mongod not found on PATH; use --mongo mongomock or a mongodb:// URI.")
+    import pymongo
+    port = free_port()
+    os.makedirs(os.path.join(workdir, "mongod"))
+    proc = subprocess.Popen(
+        [binary, "--dbpath", os.path.join(workdir, "mongod"), "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL, stderr=sys.stderr,
+    )
+    uri = f"mongodb://127.0.0.1:{port}"
+    pymongo.MongoClient(uri, serverSelectionTimeoutMS=30_000).admin.command("ping")
+    return proc, uri
+
+
+def stop(proc, timeout=30):
+    # SIGINT lets uvicorn run the app's shutdown handlers (analytics flush etc.)
+    if proc is None or proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def wait_for(client, proc, path, ready, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"The app exited during startup (code {proc.returncode}).")
+        try:
+            response = await client.get(path)
+            if ready(response):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    sys.exit(f"Timed out after {timeout:.0f}s waiting for {path}.")
+
+
+async def wait_until_warm(base_url, proc, dataset, timeout):
+    # Time to each startup milestone: answering, indexes built, recommendation table and product
+    # image embeddings in place. The load starts only once everything is warm.
+    t0 = time.perf_counter()
+    startup = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        await wait_for(client, proc, "/health/live", lambda r: r.status_code == 200, timeout)
+        startup["live_s"] = round(time.perf_counter() - t0, 2)
+        await wait_for(client, proc, "/health/ready", lambda r: r.status_code == 200, timeout)
+        startup["ready_s"] = round(time.perf_counter() - t0, 2)
+        await wait_for(client, proc, "/health/recommendations", lambda r: r.json().get("builtAt") is not None, timeout)
+        startup["recommendations_s"] = round(time.perf_counter() - t0, 2)
+        if dataset.imaged_products:
+            expected = len(dataset.imaged_products)
+            await wait_for(client, proc, "/health/visual-search", lambda r: r.json().get("productImages", 0) >= expected, timeout)
+            startup["product_images_s"] = round(time.perf_counter() - t0, 2)
+    return startup
+
+
+async def health_snapshots(base_url):
+    snapshots = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        for path in HEALTH_SNAPSHOTS:
+            try:
+                snapshots[path] = (await client.get(path)).json()
+            except (httpx.HTTPError, ValueError) as e:
+                snapshots[path] = {"error": str(e)}
+    return snapshots
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            sys.exit(f"--env expects KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    env_overrides = parse_env(args.env)
+    mongo = args.mongo
+    if mongo == "auto":
+        mongo = "mongod" if shutil.which("mongod") else "mongomock"
+        if mongo == "mongomock":
+            print("WARNING: mongod not found, using mongomock. It runs queries in Python on the event loop and "
+                  "doesn't support every operation (see loadtest/server.py); use mongod for numbers that matter.", file=sys.stderr)
+    if mongo == "mongomock":
+        try:
+            import mongomock_motor  # noqa: F401
+        except ImportError:
+            sys.exit("mongomock_motor is not installed (pip install mongomock-motor); or use --mongo mongod / a mongodb:// URI.")
+        skipped = sorted(MONGOMOCK_UNSUPPORTED & set(mix))
+        if skipped:
+            print(f"WARNING: leaving {', '.join(skipped)} out of the mix: mongomock doesn't support the queries behind it.", file=sys.stderr)
+            mix = {name: weight for name, weight in mix.items() if name not in skipped}
+            if not mix:
+                sys.exit("Nothing left to run under mongomock; use --mongo mongod / a mongodb:// URI.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+    os.makedirs(workdir, exist_ok=True)
+
+    dataset = Dataset(args.seed, args.products, args.users, args.views_per_user, product_images=args.product_images)
+    dataset.write_images(os.path.join(workdir, "images"))
+    uploads = upload_images(dataset, args.uploads, args.seed)
+
+    mongod = stubs = server = None
+    try:
+        if mongo == "mongomock":
+            mongo_mode, mongo_uri = "mongomock", "mongodb://mongomock"
+        elif mongo == "mongod":
+            mongod, mongo_uri = start_mongod(workdir)
+            mongo_mode = "mongod"
+        else:
+            mongo_mode, mongo_uri = "mongod", mongo
+
+        llm_port, translator_port, app_port = free_port(), free_port(), free_port()
+        stubs = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, "loadtest", "stubs.py"),
+             "--llm-port", str(llm_port), "--translator-port", str(translator_port),
+             "--llm-latency-ms", str(args.llm_latency_ms), "--translator-latency-ms", str(args.translator_latency_ms)],
+            stdout=sys.stderr,
+        )
+        env = {
+            **os.environ,
+            "MONGO_URI": mongo_uri,
+            "GROQ_API_KEY": "stub",
+            "GROQ_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+            "TRANSLATOR_BACKEND": "http",
+            "TRANSLATOR_URL": f"http://127.0.0.1:{translator_port}",
+            "MODEL_LOADING": "lazy",
+            **env_overrides,
+        }
+        server_args = [
+            sys.executable, os.path.join(BENCHMARKS_DIR, "loadtest", "server.py"),
+            "--port", str(app_port), "--mongo", "mongomock" if mongo_mode == "mongomock" else "uri",
+            "--seed", str(args.seed), "--products", str(args.products), "--users", str(args.users),
+            "--views-per-user", str(args.views_per_user), "--product-images", str(args.product_images),
+            "--clip-text-ms", str(args.clip_text_ms), "--clip-image-ms", str(args.clip_image_ms),
+        ]
+        if args.reset:
+            server_args.append("--reset")
+        server = subprocess.Popen(server_args, cwd=workdir, env=env, stdout=sys.stderr)
+
+        base_url = f"http://127.0.0.1:{app_port}"
+        startup = asyncio.run(wait_until_warm(base_url, server, dataset, args.startup_timeout))
+        recorder = asyncio.run(run_load(base_url, dataset, uploads, mix, args.concurrency, args.duration, args.warmup, args.seed))
+        snapshots = asyncio.run(health_snapshots(base_url))
+    finally:
+        stop(server)
+        stop(stubs)
+        stop(mongod)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {
+        "started": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "mongo": mongo_mode,
+        "seed": args.seed,
+        "products": args.products,
+        "users": args.users,
+        "views_per_user": args.views_per_user,
+        "product_images": args.product_images,
+        "uploads": args.uploads,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "mix": mix, # under mongomock, without MONGOMOCK_UNSUPPORTED scenarios
+        "clip": {"text_ms": args.clip_text_ms, "image_ms": args.clip_image_ms},
+        "env": env_overrides,
+    }
+    report = summarize(recorder, meta, snapshots)
+    report["startup"] = startup
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="auto", help="mongod (throwaway local mongod), mongomock, a mongodb:// URI, or auto: mongod if installed")
+    parser.add_argument("--reset", action="store_true", help="with a URI: replace an existing ecommerce catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--views-per-user", type=int, default=40, help="seeded view history per user")
+    parser.add_argument("--product-images", type=int, default=100, help="products with a local image file")
+    parser.add_argument("--uploads", type=int, default=64, help="distinct images sent to /visual-search")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--mix", default="", help="scenario weights, e.g. browse=30,cart=10,chat=5")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the app, e.g. ANALYTICS_BATCH_SIZE=1000")
+    parser.add_argument("--clip-text-ms", type=float, default=0.5)
+    parser.add_argument("--clip-image-ms", type=float, default=20.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--translator-latency-ms", type=float, default=50.0)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--workdir", default=None, help="scratch directory for the app (kept); default: a temporary one")
+    parser.add_argument("--out", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default=None, metavar="BASELINE")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None, metavar="BASELINE")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown before --compare fails")
+    args = parser.parse_args()
+
+    if args.compare and not os.path.isfile(args.compare):
+        sys.exit(f"No baseline at {args.compare}; record one on this machine with --save-baseline first.")
+    report = run(args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    regressed = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        regressed = bool(report["comparison"]["regressions"])
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    sys.exit(1 if regressed else 0)
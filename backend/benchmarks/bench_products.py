@@ -0,0 +1,131 @@
+# /products response bytes and latency on a large synthetic catalog: the full cached catalog (and its
+# 304), keyset pages, projected pages (fields=), price-range pages and one product's review page.
+# Requests go through main.app in-process (httpx ASGI transport, no sockets) against a scratch
+# "bench_products" database on MONGO_URI, or mongomock with --mongomock. mongomock scans the whole
+# collection in Python for every find, so its page latencies are an upper bound; bytes are exact.
+# Usage (from backend/): python benchmarks/bench_products.py --products 50000 --reviews-per-product 20
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+SEED_BATCH = 5000
+
+
+def import_main(use_mongomock):
+    # main reads its configuration at import and mounts images/ from the working directory
+    import dotenv
+    dotenv.load_dotenv = lambda *a, **kw: False
+    os.environ.setdefault("GROQ_API_KEY", "bench-placeholder")
+    if use_mongomock:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    workdir = tempfile.mkdtemp(prefix="bench_products_")
+    os.makedirs(os.path.join(workdir, "images"))
+    os.chdir(workdir)
+    import main
+    return main
+
+
+def make_products(n, reviews_per_product, seed):
+    from loadtest.synthetic import Dataset, REVIEW_TEXTS
+    rng = np.random.default_rng(seed)
+    products = Dataset(seed, n, users=0, views_per_user=0, product_images=0).products
+    for p in products:
+        ratings = rng.integers(1, 6, size=reviews_per_product)
+        p["reviews"] = [
+            {"id": j + 1, "author": f"Reviewer {j + 1}", "rating": int(r), "text": REVIEW_TEXTS[5 - r][1], "date": "2024-07-15"}
+            for j, r in enumerate(ratings)
+        ]
+    return products
+
+
+async def measure(client, label, paths, headers=None):
+    latencies, sizes, statuses = [], [], set()
+    for path in paths:
+        t0 = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        sizes.append(len(response.content))
+        statuses.add(response.status_code)
+    return {
+        "case": label,
+        "requests": len(paths),
+        "status": sorted(statuses),
+        "bytes": int(np.median(sizes)),
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 2) for q in (50, 95)},
+    }
+
+
+async def page_paths(client, query, pages):
+    # Follows next_cursor from the first page, like a client scrolling
+    paths, cursor = [], None
+    for _ in range(pages):
+        path = f"/products?{query}" + (f"&cursor={cursor}" if cursor else "")
+        paths.append(path)
+        cursor = (await client.get(path)).json()["next_cursor"]
+        if cursor is None:
+            break
+    return paths
+
+
+async def main_async(args):
+    import httpx
+    main = import_main(args.mongomock)
+    collection = main.client["bench_products"]["products"]
+    main.products_collection = main.catalog_cache.collection = collection
+
+    t0 = time.perf_counter()
+    products = make_products(args.products, args.reviews_per_product, args.seed)
+    await collection.drop()
+    for i in range(0, len(products), SEED_BATCH):
+        await collection.insert_many(products[i:i + SEED_BATCH], ordered=False)
+    from db_indexes import ensure_indexes
+    await ensure_indexes(main.client["bench_products"])
+    await main.catalog_cache.load()
+    print(json.dumps({"products": args.products, "reviews": args.products * args.reviews_per_product,
+                      "mongo": "mongomock" if args.mongomock else "uri", "seed_s": round(time.perf_counter() - t0, 1)}))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        full = await client.get("/products")
+        etag = full.headers["etag"]
+        rng = np.random.default_rng(args.seed)
+        product_ids = [str(i) for i in rng.integers(1, args.products + 1, size=args.requests)]
+        cases = [
+            ("full", ["/products"] * args.full_requests, None),
+            ("full_304", ["/products"] * args.requests, {"If-None-Match": etag}),
+            ("page_24", await page_paths(client, "limit=24", args.requests), None),
+            ("page_24_projected", await page_paths(client, "limit=24&fields=id,name,price,image", args.requests), None),
+            ("page_24_price_range", await page_paths(client, "limit=24&min_price=100&max_price=200", args.requests), None),
+            ("category_page_24_projected", await page_paths(
+                client, f"limit=24&category={products[0]['category']}&fields=id,name,price,image", args.requests), None),
+            ("reviews_page_10", [f"/products/{pid}/reviews?limit=10" for pid in product_ids], None),
+        ]
+        for label, paths, headers in cases:
+            print(json.dumps(await measure(client, label, paths, headers)))
+
+    if not args.keep:
+        await main.client.drop_database("bench_products")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--reviews-per-product", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="requests per case (pages followed in order)")
+    parser.add_argument("--full-requests", type=int, default=10, help="requests for the full catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="leave the bench_products database in place")
+    asyncio.run(main_async(parser.parse_args()))
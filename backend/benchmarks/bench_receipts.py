@@ -0,0 +1,86 @@
+# Receipts/sec for N receipts: the old inline path (one render per request, serially) vs
+# ReceiptJobs with a process pool. Uses the builtin renderer, plus wkhtmltopdf when it is installed.
+# Usage (from backend/): python benchmarks/bench_receipts.py --receipts 1000 --workers 4
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from receipts import ReceiptJobs, render_receipt, resolve_renderer  # noqa: E402
+
+
+def make_orders(n, rng):
+    with open(os.path.join(BACKEND_DIR, "data", "products.json"), encoding="utf-8") as f:
+        products = json.load(f)
+    orders = []
+    for i in range(n):
+        items = rng.sample(products, k=min(len(products), rng.randint(1, 6)))
+        orders.append({
+            "orderId": f"ORD-{i:06d}",
+            "customer": f"user{i}",
+            "items": ", ".join(p["name"] for p in items),
+            "total": round(sum(float(p.get("price", 0)) for p in items), 2),
+            "date": "2026-10-18",
+        })
+    return orders
+
+
+def bench_inline(orders, renderer, out_dir):
+    t0 = time.perf_counter()
+    for i, order in enumerate(orders):
+        render_receipt(f"{i:08d}", order, os.path.join(out_dir, f"inline-{i}.pdf"), renderer)
+    return time.perf_counter() - t0
+
+
+async def bench_jobs(orders, renderer, out_dir, workers):
+    jobs = ReceiptJobs(out_dir, renderer=renderer, max_workers=workers, max_pending=len(orders))
+    # Warm the pool so process start-up isn't counted against throughput
+    await jobs.wait(jobs.submit(orders[0]), 60)
+    t0 = time.perf_counter()
+    submit_ms = []
+    ids = []
+    for order in orders:
+        s = time.perf_counter()
+        ids.append(jobs.submit(order))
+        submit_ms.append((time.perf_counter() - s) * 1000)
+    for job_id in ids:
+        await jobs.wait(job_id, 600)
+    elapsed = time.perf_counter() - t0
+    snapshot = jobs.snapshot()
+    jobs.shutdown()
+    submit_ms.sort()
+    return elapsed, submit_ms[len(submit_ms) // 2], snapshot
+
+
+async def main(args):
+    orders = make_orders(args.receipts, random.Random(0))
+    renderers = ["builtin"] + (["wkhtmltopdf"] if resolve_renderer("auto") == "wkhtmltopdf" else [])
+    report = {"receipts": len(orders), "workers": args.workers, "results": {}}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for renderer in renderers:
+            inline_s = bench_inline(orders, renderer, out_dir)
+            pooled_s, submit_p50_ms, snapshot = await bench_jobs(orders, renderer, out_dir, args.workers)
+            report["results"][renderer] = {
+                "inline_s": round(inline_s, 2),
+                "inline_receipts_per_s": round(len(orders) / inline_s, 1),
+                "pooled_s": round(pooled_s, 2),
+                "pooled_receipts_per_s": round(len(orders) / pooled_s, 1),
+                "submit_p50_ms": round(submit_p50_ms, 3),
+                "failed": snapshot["failed"],
+            }
+    if len(renderers) == 1:
+        report["note"] = "wkhtmltopdf not installed; only the builtin renderer was measured"
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--receipts", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
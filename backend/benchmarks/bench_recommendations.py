@@ -0,0 +1,89 @@
+# /recommendations cost: precomputed RecommendationTable lookup vs the per-request similarity pass
+# over TF-IDF name vectors it replaces, plus what the table costs to build and keep fresh
+# (content neighbours, full rank, incremental refresh after a batch of view events).
+# Usage (from backend/): python benchmarks/bench_recommendations.py --sizes 10000 50000
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from vector_search import build_index  # noqa: E402
+from recommendation_table import RecommendationTable, content_neighbors  # noqa: E402
+
+
+def synthetic_catalog(n, dim, rng):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    words = [f"w{i}" for i in range(max(200, n // 20))]
+    names = [" ".join(rng.choice(words, size=rng.integers(2, 6))) for _ in range(n)]
+    products = [{"id": str(i), "name": name, "category": f"c{rng.integers(0, 10)}"} for i, name in enumerate(names)]
+    tfidf = TfidfVectorizer().fit_transform(names)
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, centers.shape[0], size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return products, tfidf, embeddings
+
+
+def view_events(n, users, per_user, rng):
+    # Each user browses a small neighbourhood of the catalog, like a real session
+    events = []
+    for u in range(users):
+        start = rng.integers(0, n)
+        for pid in (start + rng.integers(0, 50, size=per_user)) % n:
+            events.append({"eventName": "product_viewed", "userId": f"u{u}", "eventData": {"productId": str(pid)}})
+    return events
+
+
+def percentiles(latencies):
+    return {f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 99)}
+
+
+async def run(n, dim, k, queries, rng):
+    products, tfidf, embeddings = synthetic_catalog(n, dim, rng)
+    results = {"n": n, "dim": dim, "k": k}
+
+    t0 = time.perf_counter()
+    rows, sims = content_neighbors([tfidf, embeddings], [0.5, 0.5], 100)
+    results["content_neighbors_s"] = round(time.perf_counter() - t0, 2)
+
+    table = RecommendationTable(k=50)
+    table.add_events(view_events(n, n // 10, 10, rng))
+    t0 = time.perf_counter()
+    await table.rebuild(products, rows, sims)
+    results["rank_all_s"] = round(time.perf_counter() - t0, 2)
+
+    batch = view_events(n, 50, 10, rng) # one analytics flush worth of views
+    t0 = time.perf_counter()
+    await table.apply(batch)
+    refreshed = await table.refresh()
+    results["refresh_500_events"] = {"rows": refreshed, "ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+    ids = [str(i) for i in rng.integers(0, n, size=queries)]
+    name_index = build_index(tfidf, "exact", categories=[p["category"] for p in products])
+    for label, fn in (
+        ("per_request", lambda pid: name_index.search(tfidf[int(pid)], k=k, exclude=int(pid))),
+        ("table", lambda pid: table.lookup(pid, k)),
+    ):
+        latencies = []
+        for pid in ids:
+            t0 = time.perf_counter()
+            fn(pid)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[label] = percentiles(latencies)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        print(json.dumps(asyncio.run(run(n, args.dim, args.k, args.queries, rng))))
@@ -0,0 +1,115 @@
+# /search latency on a synthetic catalog: SearchIndex build time, query p50/p95/p99 (full words and
+# search-as-you-type prefixes) and the cost of incremental upserts/deletes.
+# Words are drawn Zipf-style from the real catalog's vocabulary, so common terms have posting
+# lists in the tens of thousands at 100k products, like a real catalog.
+# Usage (from backend/): python benchmarks/bench_search.py --sizes 10000 100000
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from search_index import SearchIndex, tokenize  # noqa: E402
+
+
+def catalog_vocabulary():
+    with open(os.path.join(BACKEND_DIR, "data", "products.json"), encoding="utf-8") as f:
+        products = json.load(f)
+    words = {}
+    for p in products:
+        for field in ("name", "description", "category", "subcategory"):
+            for token in tokenize(str(p.get(field) or "")):
+                words[token] = words.get(token, 0) + 1
+    categories = sorted({p.get("category") for p in products if p.get("category")})
+    return sorted(words, key=lambda w: -words[w]), categories
+
+
+def synthetic_products(n, vocab, categories, rng):
+    # Zipf ranks over the vocabulary, plus per-product model numbers so the vocabulary keeps growing
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    products = []
+    for i in range(n):
+        name = rng.choice(vocab, size=rng.integers(2, 6), p=weights)
+        description = rng.choice(vocab, size=rng.integers(15, 40), p=weights)
+        products.append({
+            "id": str(i),
+            "name": " ".join(name) + f" m{rng.integers(0, n // 10 + 1)}",
+            "description": " ".join(description),
+            "category": categories[rng.integers(0, len(categories))],
+            "subcategory": vocab[rng.integers(0, min(50, len(vocab)))],
+        })
+    return products
+
+
+def percentiles(latencies):
+    return {f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)}
+
+
+def run(n, queries, k, rng, vocab, categories):
+    products = synthetic_products(n, vocab, categories, rng)
+    index = SearchIndex()
+    t0 = time.perf_counter()
+    for p in products:
+        index.add(p["id"], p)
+    results = {"n": n, "terms": len(index.postings), "build_s": round(time.perf_counter() - t0, 2)}
+    t0 = time.perf_counter()
+    index.compile_all()
+    results["compile_s"] = round(time.perf_counter() - t0, 2)
+
+    samples = [products[i] for i in rng.integers(0, n, size=queries)]
+    word_queries = [" ".join(tokenize(p["name"])[:rng.integers(1, 4)]) + " " for p in samples]
+    prefix_queries = [q.rstrip()[:max(2, len(q.rstrip()) - 2)] for q in word_queries]
+
+    for label, qs, kwargs in (
+        ("words", word_queries, {}),
+        ("prefix", prefix_queries, {}),
+        ("category", word_queries, {"category": categories[0]}),
+    ):
+        latencies = []
+        for q in qs:
+            t0 = time.perf_counter()
+            index.search(q, k=k, **kwargs)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[label] = percentiles(latencies)
+
+    # Incremental maintenance: rename products (re-index) and delete/re-add them
+    latencies = []
+    for p in products[:500]:
+        changed = {**p, "name": p["name"] + " refurbished"}
+        t0 = time.perf_counter()
+        index.on_catalog_change("upsert", p["id"], changed)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    results["upsert"] = percentiles(latencies)
+    latencies = []
+    for p in products[500:1000]:
+        t0 = time.perf_counter()
+        index.on_catalog_change("delete", p["id"], None)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        index.on_catalog_change("upsert", p["id"], p)
+    results["delete"] = percentiles(latencies)
+
+    # First queries after a burst of updates merge the queued changes into the touched terms
+    latencies = []
+    for q in word_queries[:200]:
+        t0 = time.perf_counter()
+        index.search(q, k=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    results["after_updates"] = percentiles(latencies)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vocab, categories = catalog_vocabulary()
+    for n in args.sizes:
+        print(json.dumps(run(n, args.queries, args.k, rng, vocab, categories)))
@@ -0,0 +1,64 @@
+# Reviews/sec for sentiment scoring: one polarity_scores call per review (the old per-request path)
+# vs SentimentScorer.score_many, cold (process pool) and warm (memoised).
+# Reviews are sampled from data/products.json and padded with synthetic variants to --reviews.
+# Usage (from backend/): python benchmarks/bench_sentiment.py --reviews 50000 --workers 4
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from sentiment import SentimentScorer  # noqa: E402
+
+
+def load_reviews(n, unique_ratio, rng):
+    with open(os.path.join(BACKEND_DIR, "data", "products.json"), encoding="utf-8") as f:
+        base = [r["text"] for p in json.load(f) for r in p.get("reviews", [])]
+    unique = [f"{rng.choice(base)} {rng.choice(base)} #{i}" for i in range(max(1, int(n * unique_ratio)))]
+    return [rng.choice(unique) for _ in range(n)]
+
+
+async def main(args):
+    rng = random.Random(0)
+    reviews = load_reviews(args.reviews, args.unique_ratio, rng)
+    try:
+        analyzer = SentimentIntensityAnalyzer()
+    except LookupError:
+        sys.exit("VADER lexicon not found; install it with: python -m nltk.downloader vader_lexicon")
+
+    t0 = time.perf_counter()
+    for text in reviews:
+        analyzer.polarity_scores(text)
+    single_s = time.perf_counter() - t0
+
+    scorer = SentimentScorer(analyzer, pool_workers=args.workers, pool_threshold=256)
+    t0 = time.perf_counter()
+    await scorer.score_many(reviews)
+    cold_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    await scorer.score_many(reviews)
+    warm_s = time.perf_counter() - t0
+    scorer.shutdown()
+
+    print(json.dumps({
+        "reviews": len(reviews),
+        "unique": len(set(reviews)),
+        "single_reviews_per_s": round(len(reviews) / single_s),
+        "batched_cold_reviews_per_s": round(len(reviews) / cold_s),
+        "batched_warm_reviews_per_s": round(len(reviews) / warm_s),
+        "note": "cold includes process-pool start-up",
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reviews", type=int, default=50_000)
+    parser.add_argument("--unique-ratio", type=float, default=0.6)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+# Worker start-up cost: wall time and resident memory to `import main` in a fresh interpreter,
+# i.e. what every uvicorn/gunicorn worker pays before it can answer /health/live. With --warm it
+# also loads every registered model (what a worker pays before /health/ready turns green).
+# Each measurement runs in its own process; --runs are reported as median.
+# Usage (from backend/): python benchmarks/bench_startup.py [--warm] [--runs 3] [--backend-dir DIR]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = r"""
+import os, sys, time, json
+t0 = time.perf_counter()
+import main
+import_s = time.perf_counter() - t0
+warm_s = None
+if WARM and hasattr(main, "models"):
+    t1 = time.perf_counter()
+    main.models.preload()
+    warm_s = time.perf_counter() - t1
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+print(json.dumps({"import_s": import_s, "warm_s": warm_s, "rss_mb": rss_mb(),
+                  "heavy_modules": sorted(m for m in ("torch", "sentence_transformers", "sklearn", "pandas", "nltk") if m in sys.modules)}))
+"""
+
+
+def measure(backend_dir, warm):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.replace("WARM", str(warm))],
+        cwd=backend_dir, capture_output=True, text=True, check=True,
+        # The OpenAI client refuses to construct without a key; no request is made
+        env={**os.environ, "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench-placeholder")},
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(args):
+    runs = [measure(args.backend_dir, args.warm) for _ in range(args.runs)]
+    report = {
+        "backend_dir": os.path.abspath(args.backend_dir),
+        "runs": args.runs,
+        "import_s": round(statistics.median(r["import_s"] for r in runs), 2),
+        "rss_mb": round(statistics.median(r["rss_mb"] for r in runs)),
+        "heavy_modules_after_import": runs[-1]["heavy_modules"],
+    }
+    if args.warm and runs[-1]["warm_s"] is not None:
+        report["warm_s"] = round(statistics.median(r["warm_s"] for r in runs), 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend-dir", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument("--warm", action="store_true")
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,83 @@
+# Login lookup and add-to-cart latency with a large users collection, before and after
+# db_indexes.ensure_indexes. Seeds a scratch database ("bench_indexes") on MONGO_URI; --mongomock
+# only smoke-tests the script (mongomock never uses indexes).
+# Usage (from backend/): python benchmarks/bench_user_indexes.py --users 1000000 --queries 500
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cart_ops import add_item, EMPTY_TOTALS  # noqa: E402
+from db_indexes import ensure_indexes, check_queries  # noqa: E402
+
+SEED_BATCH = 10_000
+
+
+def make_client(use_mongomock):
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(override=True)
+    return AsyncIOMotorClient(os.getenv("MONGO_URI"))
+
+
+async def seed(db, n):
+    await db.users.drop()
+    await db.products.drop()
+    await db.products.insert_one({"id": "1", "name": "Bench product", "price": 9.99, "stock": 10**9})
+    for start in range(0, n, SEED_BATCH):
+        await db.users.insert_many([
+            {"username": f"user{i}", "email": f"user{i}@example.com", "name": f"User {i}", "password": "x",
+             "cart": [], "cartTotals": dict(EMPTY_TOTALS), "orders": []}
+            for i in range(start, min(start + SEED_BATCH, n))
+        ], ordered=False)
+
+
+async def measure(db, n, queries, rng):
+    item = {"productId": "1", "name": "Bench product", "price": 9.99, "image": None}
+    results = {}
+    for label, op in (
+        # Same filter and projection as /auth/login
+        ("login_lookup", lambda u: db.users.find_one({"username": u}, {"username": 1, "email": 1, "password": 1})),
+        ("cart_add", lambda u: add_item(db.users, u, item, 1)),
+    ):
+        latencies = []
+        for i in rng.integers(0, n, size=queries):
+            t0 = time.perf_counter()
+            await op(f"user{i}")
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[label] = {f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)}
+    return results
+
+
+async def main(args):
+    db = make_client(args.mongomock)["bench_indexes"]
+    t0 = time.perf_counter()
+    await seed(db, args.users)
+    print(json.dumps({"users": args.users, "seed_s": round(time.perf_counter() - t0, 1)}))
+    rng = np.random.default_rng(0)
+    print(json.dumps({"indexes": "none", **await measure(db, args.users, args.queries, rng)}))
+    t0 = time.perf_counter()
+    await ensure_indexes(db)
+    print(json.dumps({"indexes": "ensure_indexes", "build_s": round(time.perf_counter() - t0, 1),
+                      **await measure(db, args.users, args.queries, rng)}))
+    if not args.mongomock:
+        plans = [r for r in await check_queries(db) if r["collection"] == "users"]
+        print(json.dumps({"plans": [{"query": r["query"], "stages": r["stages"]} for r in plans]}))
+    if not args.keep:
+        await db.client.drop_database("bench_indexes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="leave the bench_indexes database in place")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+# Recall / latency benchmark for vector_search backends on synthetic CLIP-sized vectors.
+# Usage (from backend/): python benchmarks/bench_vector_search.py --sizes 10000 100000 1000000
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_search import build_index  # noqa: E402
+
+
+def synthetic_vectors(n, dim, n_clusters, rng):
+    # Clustered data behaves more like real embeddings than pure Gaussian noise
+    # Built in float32 chunks: at 1M x 512 a float64 noise array alone would be 4 GB
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    vectors = centers[labels]
+    for start in range(0, n, 65536):
+        chunk = vectors[start:start + 65536]
+        chunk += 0.5 * rng.standard_normal(chunk.shape, dtype=np.float32)
+    return vectors
+
+
+def run(n, dim, k, queries, nprobe, rng):
+    vectors = synthetic_vectors(n, dim, max(16, n // 500), rng)
+    qs = vectors[rng.choice(n, size=queries, replace=False)] + 0.1 * rng.standard_normal((queries, dim), dtype=np.float32)
+    categories = rng.integers(0, 10, size=n).tolist()
+
+    results = {"n": n, "dim": dim, "k": k}
+    exact_hits = []
+    for name, kwargs in (("exact", {}), ("ivf", {"nprobe": nprobe})):
+        t0 = time.perf_counter()
+        index = build_index(vectors, name, categories=categories, **kwargs)
+        build_s = time.perf_counter() - t0
+
+        latencies, hits = [], []
+        for q in qs:
+            t0 = time.perf_counter()
+            hits.append({row for row, _ in index.search(q, k=k)})
+            latencies.append((time.perf_counter() - t0) * 1000)
+        if name == "exact":
+            exact_hits = hits
+        recall = float(np.mean([len(h & e) / k for h, e in zip(hits, exact_hits)]))
+        results[name] = {
+            "build_s": round(build_s, 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "recall_at_k": round(recall, 4),
+        }
+        del index # so the next backend isn't built next to this one
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        print(json.dumps(run(n, args.dim, args.k, args.queries, args.nprobe, rng)))
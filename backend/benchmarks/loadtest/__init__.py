@@ -0,0 +1,6 @@
+# Offline load-test harness behind benchmarks/bench_load.py:
+# - synthetic.py: deterministic catalog, users, view history and images
+# - stubs.py: stub CLIP encoder, Groq (stub_openai.py) and translator servers
+# - server.py: the app in its own process, seeded, against mongomock or mongod
+# - workloads.py: weighted scenarios driven by closed-loop virtual users
+# - report.py: per-endpoint latency/throughput JSON and the baseline comparison
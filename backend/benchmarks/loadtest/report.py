@@ -0,0 +1,79 @@
+import numpy as np
+
+# Load-test results as JSON, and the comparison against a stored baseline.
+# - per label: count, error count, throughput and p50/p95/p99/max latency in ms
+# - compare() flags a label when its p95 or p99 got slower by more than `tolerance` (and by at least
+#   `floor_ms`, so sub-millisecond jitter never counts), its throughput dropped by more than
+#   `tolerance`, or its error rate went up. Labels with fewer than `min_count` samples in either
+#   run are reported but never flagged; their tails are noise.
+# - results from a different scale, mix or environment are still compared but listed under
+#   "mismatched", since they aren't like for like
+
+PERCENTILES = (50, 95, 99)
+COMPARABLE_META = ("products", "users", "concurrency", "mix", "mongo", "clip", "env", "cpus")
+
+
+def latency_summary(latencies):
+    values = np.asarray(latencies, dtype=np.float64)
+    summary = {f"p{q}_ms": round(float(np.percentile(values, q)), 2) for q in PERCENTILES}
+    summary["max_ms"] = round(float(values.max()), 2)
+    return summary
+
+
+def summarize(recorder, meta, server=None):
+    elapsed = recorder.stopped - recorder.started
+    endpoints = {}
+    for label in sorted(recorder.latencies):
+        latencies = recorder.latencies[label]
+        endpoints[label] = {
+            "count": len(latencies),
+            "errors": recorder.errors[label],
+            "rps": round(len(latencies) / elapsed, 2),
+            **latency_summary(latencies),
+            "statuses": dict(recorder.statuses[label]),
+        }
+    everything = [ms for latencies in recorder.latencies.values() for ms in latencies]
+    totals = {
+        "count": len(everything),
+        "errors": sum(recorder.errors.values()),
+        "rps": round(len(everything) / elapsed, 2),
+        **(latency_summary(everything) if everything else {}),
+    }
+    return {"meta": {**meta, "measured_s": round(elapsed, 2)}, "totals": totals, "endpoints": endpoints, "server": server or {}}
+
+
+def _change(before, after):
+    return round((after - before) / before, 4) if before else None
+
+
+def compare(report, baseline, tolerance=0.15, floor_ms=2.0, min_count=50):
+    regressions = []
+    endpoints = {}
+    for label, base in baseline.get("endpoints", {}).items():
+        now = report["endpoints"].get(label)
+        if now is None:
+            regressions.append({"endpoint": label, "reason": "missing"})
+            continue
+        row = {"count": {"baseline": base["count"], "current": now["count"]}}
+        flagged = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            row[key] = {"baseline": base[key], "current": now[key], "change": _change(base[key], now[key])}
+            if key != "p50_ms" and now[key] > base[key] * (1 + tolerance) and now[key] - base[key] >= floor_ms:
+                flagged.append({"endpoint": label, "metric": key, **row[key]})
+        row["rps"] = {"baseline": base["rps"], "current": now["rps"], "change": _change(base["rps"], now["rps"])}
+        if now["rps"] < base["rps"] * (1 - tolerance):
+            flagged.append({"endpoint": label, "metric": "rps", **row["rps"]})
+        base_rate = base["errors"] / max(1, base["count"])
+        now_rate = now["errors"] / max(1, now["count"])
+        row["error_rate"] = {"baseline": round(base_rate, 4), "current": round(now_rate, 4)}
+        if now_rate > base_rate + 0.001:
+            flagged.append({"endpoint": label, "metric": "error_rate", **row["error_rate"]})
+        if min(base["count"], now["count"]) >= min_count:
+            regressions.extend(flagged)
+        endpoints[label] = row
+    mismatched = {
+        key: {"baseline": baseline.get("meta", {}).get(key), "current": report["meta"].get(key)}
+        for key in COMPARABLE_META
+        if baseline.get("meta", {}).get(key) != report["meta"].get(key)
+    }
+    return {"tolerance": tolerance, "regressions": regressions, "mismatched": mismatched, "endpoints": endpoints}
@@ -0,0 +1,85 @@
+import os
+import sys
+import argparse
+
+BENCHMARKS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+# The app under test, started by bench_load.py in its own process (and working directory) so the
+# load generator doesn't share a GIL with it. Configuration comes from the environment like in
+# production; this only swaps in what must not touch the network:
+# - the developer's .env is not loaded (it would override the stub URLs)
+# - --mongo mongomock: motor is replaced by mongomock_motor, otherwise MONGO_URI is used as is.
+#   mongomock is for running without a mongod at all: it executes queries in Python on the event loop
+#   and differs on some operations (positional cart updates, bulk updates with sort), so its
+#   numbers aren't comparable with a real server's; bench_load.py drops the cart scenario there
+# - CLIP is a StubClip registered under the same model name
+# - the "ecommerce" database is seeded from the synthetic Dataset before main's own startup runs.
+#   An existing catalog is only replaced with --reset.
+# Usage: see bench_load.py; standalone (from a scratch directory containing images/):
+#   MONGO_URI=mongodb://127.0.0.1:27017 python <backend>/benchmarks/loadtest/server.py --port 8100 --reset
+
+SEED_BATCH = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mongo", choices=["mongomock", "uri"], default="uri")
+    parser.add_argument("--reset", action="store_true", help="drop the seeded collections if they already have data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--views-per-user", type=int, default=40)
+    parser.add_argument("--product-images", type=int, default=100)
+    parser.add_argument("--clip-text-ms", type=float, default=0.5)
+    parser.add_argument("--clip-image-ms", type=float, default=20.0)
+    return parser.parse_args()
+
+
+def patch_environment(args):
+    import dotenv
+    dotenv.load_dotenv = lambda *a, **kw: False
+    if args.mongo == "mongomock":
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+async def insert_batched(collection, docs):
+    for i in range(0, len(docs), SEED_BATCH):
+        await collection.insert_many(docs[i:i + SEED_BATCH], ordered=False)
+
+
+def make_seeder(main, dataset, reset):
+    from loadtest.synthetic import PASSWORD
+
+    async def seed():
+        collections = [main.products_collection, main.users_collection, main.analytics_collection, main.db["analytics_rollups"]]
+        if await main.products_collection.find_one({}, {"_id": 1}) is not None:
+            if not reset:
+                raise RuntimeError("The ecommerce database already has products; pass --reset to replace them.")
+            for collection in collections:
+                await collection.drop()
+        password_hash = await main.password_hasher.hash(PASSWORD)
+        await insert_batched(main.products_collection, [dict(p) for p in dataset.products])
+        await insert_batched(main.users_collection, dataset.user_docs(password_hash))
+        await insert_batched(main.analytics_collection, [dict(e) for e in dataset.history])
+        print(f"Seeded {len(dataset.products)} products, {len(dataset.users)} users, {len(dataset.history)} events.")
+    return seed
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    patch_environment(args)
+    import uvicorn
+    import main
+    from loadtest.stubs import StubClip
+    from loadtest.synthetic import Dataset
+
+    main.models.register("clip", lambda: StubClip(text_ms=args.clip_text_ms, image_ms=args.clip_image_ms))
+    dataset = Dataset(args.seed, args.products, args.users, args.views_per_user, product_images=args.product_images)
+    main.app.router.on_startup.insert(0, make_seeder(main, dataset, args.reset))
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
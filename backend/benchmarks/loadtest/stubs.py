@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import zlib
+import asyncio
+import argparse
+import threading
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_openai import app as llm_app  # noqa: E402
+
+# Offline stand-ins for everything the backend would otherwise reach over the network or load from
+# the model hub.
+# - StubClip: SentenceTransformer-compatible encode() for strings and PIL images. Text vectors are a
+#   sum of per-token random vectors (names sharing words are close); image vectors are a fixed random
+#   projection of a 16x16 thumbnail. Each call sleeps batch_ms + per-item ms, in place of the model.
+# - translator: LibreTranslate-compatible POST /translate (TRANSLATOR_BACKEND=http)
+# - the Groq stub is stub_openai.py; run as a script, this serves both on 127.0.0.1
+# Run standalone: python benchmarks/loadtest/stubs.py --llm-port 8101 --translator-port 8102
+
+
+class StubClip:
+    def __init__(self, dim=512, text_ms=0.5, image_ms=20.0, batch_ms=2.0):
+        self.dim = dim
+        self.text_ms = text_ms
+        self.image_ms = image_ms
+        self.batch_ms = batch_ms
+        self._projection = np.random.default_rng(0).standard_normal((16 * 16 * 3, dim)).astype(np.float32)
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _token(self, token):
+        vec = self._tokens.get(token)
+        if vec is None:
+            vec = np.random.default_rng(zlib.crc32(token.encode("utf-8"))).standard_normal(self.dim).astype(np.float32)
+            with self._lock:
+                self._tokens[token] = vec
+        return vec
+
+    def _encode_one(self, item):
+        if isinstance(item, str):
+            tokens = item.casefold().split() or [""]
+            return sum(self._token(t) for t in tokens)
+        pixels = np.asarray(item.convert("RGB").resize((16, 16)), dtype=np.float32).reshape(-1) / 255.0
+        return (pixels - pixels.mean()) @ self._projection
+
+    def encode(self, items, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(items, str) or not isinstance(items, (list, tuple))
+        items = [items] if single else list(items)
+        per_item = sum(self.text_ms if isinstance(i, str) else self.image_ms for i in items)
+        time.sleep((self.batch_ms * max(1, -(-len(items) // max(1, batch_size))) + per_item) / 1000)
+        out = np.stack([self._encode_one(i) for i in items]) if items else np.zeros((0, self.dim), dtype=np.float32)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+translator_app = FastAPI()
+translator_app.state.latency_ms = float(os.getenv("STUB_TRANSLATOR_LATENCY_MS", "50"))
+translator_app.state.calls = 0
+
+
+@translator_app.post("/translate")
+async def translate(request: Request):
+    body = await request.json()
+    translator_app.state.calls += 1
+    await asyncio.sleep(translator_app.state.latency_ms / 1000)
+    return {"translatedText": f"[{body.get('target', 'en')}] {body.get('q', '')}"}
+
+
+@translator_app.get("/stats")
+async def translator_stats():
+    return {"calls": translator_app.state.calls}
+
+
+def serve_in_thread(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-port", type=int, default=8101)
+    parser.add_argument("--translator-port", type=int, default=8102)
+    parser.add_argument("--llm-latency-ms", type=float, default=None)
+    parser.add_argument("--translator-latency-ms", type=float, default=None)
+    args = parser.parse_args()
+    if args.llm_latency_ms is not None:
+        llm_app.state.latency_ms = args.llm_latency_ms
+    if args.translator_latency_ms is not None:
+        translator_app.state.latency_ms = args.translator_latency_ms
+    serve_in_thread(translator_app, args.translator_port)
+    uvicorn.run(llm_app, host="127.0.0.1", port=args.llm_port, log_level="warning")
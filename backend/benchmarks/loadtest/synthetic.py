@@ -0,0 +1,150 @@
+import os
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from cart_ops import compute_totals
+from sentiment import aggregate
+from image_variants import product_image_name
+
+# Deterministic synthetic data for the load test. The server process seeds MongoDB from it and the
+# driver regenerates the same Dataset (same seed and scale) to pick product ids, users and queries,
+# so nothing has to be passed between the two.
+# - product names/descriptions are drawn Zipf-style from the real catalog's vocabulary and
+#   (category, subcategory) pairs, plus a model number so names stay unique
+# - every user has the same password (one bcrypt hash for the whole seed); some start with a cart
+# - view history: each user browses a small neighbourhood of the catalog, like a real session
+# - product images are generated shapes, so visual search has image embeddings to fuse
+
+PASSWORD = "load-test-password"
+HISTORY_DAYS = 7
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REVIEW_TEXTS = [
+    (5, "Excellent quality, works exactly as described."),
+    (4, "Good value for the price, would buy again."),
+    (3, "Does the job but nothing special."),
+    (2, "Stopped working properly after a few weeks."),
+    (1, "Very disappointed, returned it."),
+]
+
+
+def catalog_vocabulary():
+    with open(os.path.join(BACKEND_DIR, "data", "products.json"), encoding="utf-8") as f:
+        products = json.load(f)
+    words = {}
+    for p in products:
+        for field in ("name", "description"):
+            for word in str(p.get(field) or "").replace(",", " ").replace(".", " ").split():
+                words[word] = words.get(word, 0) + 1
+    pairs = sorted({(p["category"], p["subcategory"]) for p in products})
+    return sorted(words, key=lambda w: -words[w]), pairs
+
+
+class Dataset:
+    def __init__(self, seed=0, products=5000, users=500, views_per_user=40, cart_share=0.3, product_images=100):
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        vocab, pairs = catalog_vocabulary()
+        weights = 1.0 / np.arange(1, len(vocab) + 1)
+        weights /= weights.sum()
+        self.categories = sorted({c for c, _ in pairs})
+
+        self.products = []
+        for i in range(products):
+            category, subcategory = pairs[rng.integers(0, len(pairs))]
+            name = " ".join(rng.choice(vocab, size=rng.integers(1, 3), p=weights))
+            ratings = rng.integers(1, 6, size=rng.integers(0, 6))
+            reviews = [
+                {"id": j + 1, "author": f"Reviewer {j + 1}", "rating": int(r), "text": REVIEW_TEXTS[5 - r][1], "date": "2024-07-15"}
+                for j, r in enumerate(ratings)
+            ]
+            self.products.append({
+                "id": str(i + 1),
+                "name": f"{name} {subcategory} M{i + 1}",
+                "price": round(float(rng.uniform(5, 500)), 2),
+                "description": " ".join(rng.choice(vocab, size=rng.integers(10, 25), p=weights)),
+                "image": f"https://img.example.invalid/{i + 1}.jpg",
+                "category": category,
+                "subcategory": subcategory,
+                "stock": 1_000_000, # cart updates must never run out during a run
+                "reviews": reviews,
+                # Seeded up front so startup doesn't need the VADER lexicon
+                "sentimentSummary": aggregate([{"compound": (r["rating"] - 3) / 2} for r in reviews]),
+            })
+        # Products with a local image file: spread over the catalog
+        step = max(1, products // max(1, product_images)) if product_images else 0
+        self.imaged_products = self.products[::step][:product_images] if step else []
+        for p in self.imaged_products:
+            p["image"] = f"/images/{product_image_name(p)}"
+
+        self.users = []
+        for i in range(users):
+            username = f"loaduser{i}"
+            cart = []
+            if products and rng.random() < cart_share:
+                start = rng.integers(0, products)
+                picked = sorted({int(x) for x in (start + rng.integers(0, 30, size=rng.integers(1, 5))) % products})
+                for row in picked:
+                    p = self.products[row]
+                    cart.append({"productId": p["id"], "name": p["name"], "price": p["price"], "image": p["image"], "quantity": int(rng.integers(1, 3))})
+            self.users.append({"username": username, "email": f"{username}@example.com", "name": f"Load User {i}", "cart": cart})
+
+        now = datetime.utcnow()
+        self.history = []
+        for user in self.users if products else []:
+            start = rng.integers(0, products)
+            minutes = np.sort(rng.integers(0, HISTORY_DAYS * 24 * 60, size=views_per_user))[::-1]
+            for row, ago in zip((start + rng.integers(0, 50, size=views_per_user)) % products, minutes):
+                self.history.append({
+                    "eventName": "product_viewed",
+                    "eventData": {"productId": self.products[row]["id"]},
+                    "timestamp": now - timedelta(minutes=int(ago)),
+                    "userId": user["username"],
+                    "sessionId": None,
+                })
+
+    def user_docs(self, password_hash):
+        return [
+            {**u, "password": password_hash, "cartTotals": compute_totals(u["cart"]), "orders": []}
+            for u in self.users
+        ]
+
+    def write_images(self, images_dir):
+        os.makedirs(images_dir, exist_ok=True)
+        for p in self.imaged_products:
+            product_image(p).save(os.path.join(images_dir, product_image_name(p)), "JPEG", quality=90)
+
+
+def product_image(product, size=320):
+    # Background colour and a few shapes, all derived from the product id
+    rng = np.random.default_rng(zlib.crc32(product["id"].encode("utf-8")))
+    img = Image.new("RGB", (size, size), tuple(int(c) for c in rng.integers(0, 256, size=3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.integers(3, 7)):
+        x0, y0 = (int(v) for v in rng.integers(0, size * 3 // 4, size=2))
+        x1, y1 = x0 + int(rng.integers(20, size // 2)), y0 + int(rng.integers(20, size // 2))
+        fill = tuple(int(c) for c in rng.integers(0, 256, size=3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)([x0, y0, x1, y1], fill=fill)
+    return img
+
+
+def upload_images(dataset, count, seed=0):
+    # JPEG bytes for /visual-search: photos of catalog products, cropped and re-encoded. A product
+    # can come up more than once, so the upload embedding cache sees some repeats.
+    rng = np.random.default_rng(seed)
+    pool = dataset.imaged_products or dataset.products
+    uploads = []
+    for _ in range(count if pool else 0):
+        img = product_image(pool[rng.integers(0, len(pool))])
+        w, h = img.size
+        left, top = (int(v) for v in rng.integers(0, w // 8, size=2))
+        img = img.crop((left, top, w - int(rng.integers(0, w // 8)), h - int(rng.integers(0, h // 8)))).resize((640, 640))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=int(rng.integers(70, 95)))
+        uploads.append(buf.getvalue())
+    return uploads
@@ -0,0 +1,207 @@
+import time
+import asyncio
+from collections import Counter, defaultdict
+
+import httpx
+import numpy as np
+
+from loadtest.synthetic import PASSWORD
+
+# Closed-loop mixed workload: `concurrency` virtual users, each picking a scenario by weight and
+# running it back to back (no think time) until the deadline. Every HTTP call is timed under its
+# own label; samples taken during warm-up are dropped.
+# - each virtual user owns one synthetic user (cart, login, analytics userId) and browses around
+#   its own spot in the catalog, so carts and co-views look like real sessions
+# - a call counts as an error when its status isn't one the scenario expects (e.g. 304 is fine for
+#   a catalog revalidation, 400 for a cart update that ran out of stock)
+
+DEFAULT_MIX = {
+    "browse": 30,
+    "catalog": 5,
+    "search": 15,
+    "recommendations": 15,
+    "cart": 10,
+    "analytics": 15,
+    "login": 3,
+    "visual_search": 7,
+    "chat": 0,
+    "translate": 0,
+}
+
+# Scenarios mongomock can't run faithfully: it ignores the $elemMatch projection and positional
+# updates the cart endpoints rely on (every cart_remove comes back 404), so their latencies would
+# describe error paths. bench_load.py leaves them out of the mix under --mongo mongomock.
+MONGOMOCK_UNSUPPORTED = frozenset({"cart"})
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list) # label -> ms
+        self.statuses = defaultdict(Counter) # label -> status -> count
+        self.errors = Counter()
+        self.recording = False
+        self.started = None
+        self.stopped = None
+
+    def add(self, label, ms, status, ok):
+        if not self.recording:
+            return
+        self.latencies[label].append(ms)
+        self.statuses[label][str(status)] += 1
+        if not ok:
+            self.errors[label] += 1
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.stopped = time.perf_counter()
+
+
+class VirtualUser:
+    def __init__(self, index, client, recorder, dataset, uploads, seed):
+        self.client = client
+        self.recorder = recorder
+        self.dataset = dataset
+        self.uploads = uploads
+        self.rng = np.random.default_rng([seed, index])
+        self.user = dataset.users[index % len(dataset.users)] if dataset.users else None
+        self.home = int(self.rng.integers(0, max(1, len(dataset.products))))
+        self.etag = None
+
+    async def call(self, label, method, url, ok=(200,), **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.recorder.add(label, (time.perf_counter() - t0) * 1000, status, status in ok)
+        return response if status in ok else None
+
+    def product(self):
+        # Mostly near this user's spot in the catalog, sometimes anywhere
+        n = len(self.dataset.products)
+        row = (self.home + int(self.rng.integers(0, 50))) % n if self.rng.random() < 0.8 else int(self.rng.integers(0, n))
+        return self.dataset.products[row]
+
+
+async def browse(vu):
+    category = vu.dataset.categories[vu.rng.integers(0, len(vu.dataset.categories))]
+    params = {"limit": 24, "category": category, "fields": "id,name,price,image,category"}
+    response = await vu.call("products_page", "GET", "/products", params=params)
+    if response is not None and response.json().get("next_cursor") and vu.rng.random() < 0.5:
+        await vu.call("products_page", "GET", "/products", params={**params, "cursor": response.json()["next_cursor"]})
+
+
+async def catalog(vu):
+    headers = {"If-None-Match": vu.etag} if vu.etag else {}
+    response = await vu.call("products_catalog", "GET", "/products", ok=(200, 304), headers=headers)
+    if response is not None:
+        vu.etag = response.headers.get("etag")
+
+
+async def search(vu):
+    words = vu.product()["name"].split()[:-1]
+    q = " ".join(words[:vu.rng.integers(1, len(words) + 1)])
+    if vu.rng.random() < 0.3:
+        q = q[:max(2, len(q) - 2)] # still typing
+    await vu.call("search", "GET", "/search", params={"q": q, "limit": 20})
+
+
+async def recommendations(vu):
+    await vu.call("recommendations", "GET", "/recommendations", params={"product_id": vu.product()["id"], "k": 6})
+
+
+async def cart(vu):
+    username = vu.user["username"]
+    product_id = vu.product()["id"]
+    if await vu.call("cart_add", "POST", "/cart/add", json={"username": username, "productId": product_id, "quantity": 1}) is None:
+        return
+    await vu.call("cart_update", "POST", "/cart/update", ok=(200, 400),
+                  json={"username": username, "productId": product_id, "quantity": int(vu.rng.integers(1, 4))})
+    if vu.rng.random() < 0.5:
+        await vu.call("cart_remove", "POST", "/cart/remove", json={"username": username, "productId": product_id})
+    await vu.call("cart_summary", "GET", f"/cart/{username}/summary")
+
+
+async def analytics(vu):
+    # A burst like the frontend's batched tracker sends: mostly views, a few add-to-carts
+    events = []
+    for _ in range(vu.rng.integers(20, 101)):
+        name = "product_viewed" if vu.rng.random() < 0.9 else "product_added_to_cart"
+        events.append({"eventName": name, "eventData": {"productId": vu.product()["id"]}, "userId": vu.user["username"]})
+    await vu.call("analytics_batch", "POST", "/api/analytics/track/batch", json=events)
+
+
+async def login(vu):
+    await vu.call("login", "POST", "/auth/login", json={"username": vu.user["username"], "password": PASSWORD})
+
+
+async def visual_search(vu):
+    image = vu.uploads[vu.rng.integers(0, len(vu.uploads))]
+    await vu.call("visual_search", "POST", "/visual-search", ok=(200, 404), params={"k": 5},
+                  files={"file": ("upload.jpg", image, "image/jpeg")})
+
+
+async def chat(vu):
+    await vu.call("chat", "POST", "/chatbot", json={"query": f"Recommend something like {vu.product()['name']}"})
+
+
+async def translate(vu):
+    await vu.call("translate", "POST", "/reviews/translate/batch", json={"productId": vu.product()["id"], "target": "fr"})
+
+
+SCENARIOS = {
+    "browse": browse,
+    "catalog": catalog,
+    "search": search,
+    "recommendations": recommendations,
+    "cart": cart,
+    "analytics": analytics,
+    "login": login,
+    "visual_search": visual_search,
+    "chat": chat,
+    "translate": translate,
+}
+
+
+def parse_mix(spec):
+    # "browse=30,cart=10" overrides the default weights; scenarios left out keep theirs
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name.strip()} (known: {', '.join(SCENARIOS)})")
+        mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+async def run_virtual_user(vu, names, weights, deadline):
+    while time.perf_counter() < deadline:
+        name = names[vu.rng.choice(len(names), p=weights)]
+        await SCENARIOS[name](vu)
+
+
+async def run_load(base_url, dataset, uploads, mix, concurrency=32, duration=60.0, warmup=10.0, seed=0):
+    if not dataset.products or not dataset.users:
+        raise ValueError("The load test needs at least one product and one user.")
+    if "visual_search" in mix and not uploads:
+        raise ValueError("visual_search needs upload images.")
+    names = list(mix)
+    weights = np.array([mix[n] for n in names], dtype=float)
+    weights /= weights.sum()
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        users = [VirtualUser(i, client, recorder, dataset, uploads, seed) for i in range(concurrency)]
+        start = time.perf_counter()
+        deadline = start + warmup + duration
+        tasks = [asyncio.create_task(run_virtual_user(vu, names, weights, deadline)) for vu in users]
+        await asyncio.sleep(warmup)
+        recorder.start()
+        await asyncio.gather(*tasks)
+        recorder.stop()
+    return recorder
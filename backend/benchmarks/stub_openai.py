@@ -0,0 +1,103 @@
+# Local stand-in for an OpenAI-compatible chat completions API (Groq), for benchmarks that must
+# run without network access. Every completion takes STUB_LLM_LATENCY_MS and echoes the prompt.
+# With "stream": true the same text is sent as SSE chunks: the first one after STUB_LLM_TTFT_MS,
+# the rest spread over the remaining latency.
+# Run standalone: python benchmarks/stub_openai.py --port 8101  (then GROQ_BASE_URL=http://127.0.0.1:8101/v1)
+import os
+import time
+import asyncio
+import argparse
+import threading
+
+import json
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI()
+app.state.latency_ms = float(os.getenv("STUB_LLM_LATENCY_MS", "400"))
+app.state.ttft_ms = float(os.getenv("STUB_LLM_TTFT_MS", "80"))
+app.state.calls = 0
+app.state.cancelled_streams = 0
+
+
+def completion_text(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    return "\n".join([
+        "- Here's what I found for you:",
+        f"- **{prompt[:60]}**",
+        "- Great value for the price",
+        "- Ships fast and is well reviewed",
+    ])
+
+
+def stream_chunks(model, text):
+    tokens = [t + " " for t in text.split(" ")]
+    per_token = max(0.0, app.state.latency_ms - app.state.ttft_ms) / 1000 / max(1, len(tokens) - 1)
+
+    async def chunks():
+        try:
+            await asyncio.sleep(app.state.ttft_ms / 1000)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(per_token)
+                chunk = {
+                    "id": f"stub-{app.state.calls}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        except asyncio.CancelledError:
+            app.state.cancelled_streams += 1
+            raise
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.calls += 1
+    if body.get("stream"):
+        return stream_chunks(body.get("model", "stub"), completion_text(body.get("messages", [])))
+    await asyncio.sleep(app.state.latency_ms / 1000)
+    text = completion_text(body.get("messages", []))
+    return {
+        "id": f"stub-{app.state.calls}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {"calls": app.state.calls, "cancelled_streams": app.state.cancelled_streams}
+
+
+def serve_in_thread(port, latency_ms=None):
+    # Starts the stub on 127.0.0.1:<port> in a daemon thread and waits until it accepts requests
+    if latency_ms is not None:
+        app.state.latency_ms = latency_ms
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--latency-ms", type=float, default=None)
+    args = parser.parse_args()
+    if args.latency_ms is not None:
+        app.state.latency_ms = args.latency_ms
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,181 @@
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+
+# Atomic cart mutations on users.cart. Each operation is a single find_one_and_update using the
+# positional operator / $push / $pull, so concurrent requests can't overwrite each other's changes.
+# The same update $incs users.cartTotals ({lines, quantity, amountCents}), so totals never need a
+# pass over the cart; money is kept in integer cents so repeated $inc doesn't drift.
+# Stock moves (update/remove) are a separate conditional $inc on the product; pass a session started
+# with a transaction to make the cart write and the stock write commit together.
+
+MAX_CAS_RETRIES = 8
+CART_PROJECTION = {"cart": 1, "cartTotals": 1, "_id": 0}
+EMPTY_TOTALS = {"lines": 0, "quantity": 0, "amountCents": 0}
+
+
+class CartError(Exception):
+    pass
+
+
+class UserNotFound(CartError):
+    pass
+
+
+class ItemNotInCart(CartError):
+    pass
+
+
+class InsufficientStock(CartError):
+    def __init__(self, available):
+        super().__init__(f"Only {available} more units available")
+        self.available = available
+
+
+def to_cents(price):
+    return int(round(float(price) * 100))
+
+
+def _totals_inc(lines, quantity, unit_price):
+    return {
+        "cartTotals.lines": lines,
+        "cartTotals.quantity": quantity,
+        "cartTotals.amountCents": quantity * to_cents(unit_price),
+    }
+
+
+def compute_totals(cart):
+    # Full recomputation; only used to backfill users that predate cartTotals
+    return {
+        "lines": len(cart),
+        "quantity": sum(i["quantity"] for i in cart),
+        "amountCents": sum(i["quantity"] * to_cents(i["price"]) for i in cart),
+    }
+
+
+def totals_response(doc):
+    totals = (doc or {}).get("cartTotals") or EMPTY_TOTALS
+    return {
+        "items": totals.get("lines", 0),
+        "quantity": totals.get("quantity", 0),
+        "totalPrice": totals.get("amountCents", 0) / 100,
+    }
+
+
+async def _cart_line(users, username, product_id, session):
+    # Returns the user's cart line for product_id, None if the product isn't in the cart;
+    # raises UserNotFound if the user doesn't exist
+    doc = await users.find_one(
+        {"username": username},
+        {"cart": {"$elemMatch": {"productId": product_id}}, "_id": 0},
+        session=session,
+    )
+    if doc is None:
+        raise UserNotFound(username)
+    lines = doc.get("cart") or []
+    return lines[0] if lines else None
+
+
+async def add_item(users, username, item, quantity, session=None):
+    # Returns {"cart", "cartTotals"} after the write. `item` is the full cart entry used when the
+    # product is new; an existing line keeps the price it was added at.
+    now = datetime.utcnow()
+    line_price = item["price"]
+    for _ in range(MAX_CAS_RETRIES):
+        # Already in the cart: bump the quantity in place
+        doc = await users.find_one_and_update(
+            {"username": username, "cart": {"$elemMatch": {"productId": item["productId"], "price": line_price}}},
+            {"$inc": {"cart.$.quantity": quantity, **_totals_inc(0, quantity, line_price)}, "$set": {"updatedAt": now}},
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if doc is not None:
+            return doc
+        # Not in the cart yet: push it, guarded so two racing adds can't push it twice
+        doc = await users.find_one_and_update(
+            {"username": username, "cart.productId": {"$ne": item["productId"]}},
+            {"$push": {"cart": {**item, "quantity": quantity}}, "$inc": _totals_inc(1, quantity, item["price"]), "$set": {"updatedAt": now}},
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if doc is not None:
+            return doc
+        # Both missed: another request pushed the item in between, or the line was added at an older price
+        line = await _cart_line(users, username, item["productId"], session)
+        if line is not None:
+            line_price = line["price"]
+    raise CartError("Cart is changing too quickly, please retry")
+
+
+async def set_quantity(users, products, username, product_id, quantity, session=None):
+    # Returns {"cart", "cartTotals"} after the write. Raising quantity reserves stock first; lowering it gives stock back.
+    for _ in range(MAX_CAS_RETRIES):
+        line = await _cart_line(users, username, product_id, session)
+        if line is None:
+            raise ItemNotInCart(username)
+        current = line["quantity"]
+        difference = quantity - current
+
+        if difference > 0:
+            reserved = await products.find_one_and_update(
+                {"id": product_id, "stock": {"$gte": difference}},
+                {"$inc": {"stock": -difference}},
+                projection={"_id": 1},
+                session=session,
+            )
+            if reserved is None:
+                product = await products.find_one({"id": product_id}, {"stock": 1}, session=session)
+                raise InsufficientStock(int((product or {}).get("stock", 0)))
+
+        # Compare-and-set on the quantity we read, so a concurrent update makes us retry instead of clobbering
+        doc = await users.find_one_and_update(
+            {"username": username, "cart": {"$elemMatch": {"productId": product_id, "quantity": current}}},
+            {"$set": {"cart.$.quantity": quantity, "updatedAt": datetime.utcnow()}, "$inc": _totals_inc(0, difference, line["price"])},
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if doc is None:
+            if difference > 0:
+                await products.update_one({"id": product_id}, {"$inc": {"stock": difference}}, session=session)
+            continue
+        if difference < 0:
+            await products.update_one({"id": product_id}, {"$inc": {"stock": -difference}}, session=session)
+        return doc
+    raise CartError("Cart is changing too quickly, please retry")
+
+
+async def remove_item(users, products, username, product_id, session=None):
+    # Returns {"cart", "cartTotals"} after the write; the removed quantity goes back to product stock
+    for _ in range(MAX_CAS_RETRIES):
+        line = await _cart_line(users, username, product_id, session)
+        if line is None:
+            raise ItemNotInCart(username)
+        # Guard on the quantity we read so the totals delta matches what is actually pulled
+        doc = await users.find_one_and_update(
+            {"username": username, "cart": {"$elemMatch": {"productId": product_id, "quantity": line["quantity"]}}},
+            {"$pull": {"cart": {"productId": product_id}}, "$inc": _totals_inc(-1, -line["quantity"], line["price"]), "$set": {"updatedAt": datetime.utcnow()}},
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if doc is None:
+            continue
+        if line["quantity"] > 0:
+            await products.update_one({"id": product_id}, {"$inc": {"stock": line["quantity"]}}, session=session)
+        return doc
+    raise CartError("Cart is changing too quickly, please retry")
+
+
+async def backfill_cart_totals(users):
+    # One-off migration for users created before cartTotals existed
+    ops = []
+    async for user in users.find({"cartTotals": {"$exists": False}}, {"cart": 1}):
+        ops.append(UpdateOne(
+            {"_id": user["_id"], "cartTotals": {"$exists": False}},
+            {"$set": {"cartTotals": compute_totals(user.get("cart") or [])}},
+        ))
+    if ops:
+        await users.bulk_write(ops, ordered=False)
+    return len(ops)
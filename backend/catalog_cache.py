@@ -0,0 +1,200 @@
+import json
+import asyncio
+import hashlib
+
+# In-process copy of the products collection.
+# - products: product 'id' -> document (with _id already stringified), in catalog order
+# - /products is served from a pre-serialised JSON blob + ETag, rebuilt lazily after a change in a
+#   worker thread (json_blob_async) so a large catalog doesn't stall the event loop
+# - kept fresh from a MongoDB change stream; standalone mongod / mongomock don't support change
+#   streams, so we fall back to polling the collection every `poll_interval` seconds
+# - VOLATILE_FIELDS (stock, moved by every cart update) are kept current in the cached documents; a
+#   change to them alone updates the document in place, without a new blob, ETag or listener call.
+#   The blob still carries them, as of its last rebuild, so they may lag there: /products/{id}/stock
+#   reads the current value
+# Listeners registered with subscribe(fn) are called as fn(op, product_id, product) after each
+# applied change, op being "upsert" or "delete" (product is None for deletes).
+
+VOLATILE_FIELDS = frozenset({"stock"})
+
+
+def _key(doc):
+    return str(doc.get("id", doc.get("_id")))
+
+
+def _stable(doc):
+    return {k: v for k, v in doc.items() if k not in VOLATILE_FIELDS}
+
+
+def _serialize(docs):
+    blob = json.dumps(docs, default=str, separators=(",", ":")).encode("utf-8")
+    return blob, f'"{hashlib.sha1(blob).hexdigest()}"'
+
+
+def _serializable(doc):
+    doc = dict(doc)
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+class CatalogCache:
+    def __init__(self, collection, poll_interval=30.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.products = {}
+        self._key_by_object_id = {}
+        self._blob = None
+        self._etag = None
+        self._building = None
+        self.version = 0
+        self.mode = "idle"  # "change-stream" or "polling" once running
+        self._task = None
+        self._listeners = []
+
+    # --- reads ---
+    def get(self, product_id):
+        return self.products.get(str(product_id))
+
+    def all(self):
+        return list(self.products.values())
+
+    def __len__(self):
+        return len(self.products)
+
+    def json_blob(self):
+        # Returns (bytes, etag); serialised once per catalog version, not per request
+        if self._blob is None:
+            self._blob, self._etag = _serialize(list(self.products.values()))
+        return self._blob, self._etag
+
+    async def json_blob_async(self):
+        # Same as json_blob, but a rebuild runs in a worker thread; concurrent requests share it
+        if self._blob is not None:
+            return self._blob, self._etag
+        if self._building is None:
+            self._building = asyncio.ensure_future(self._build())
+        return await asyncio.shield(self._building)
+
+    async def _build(self):
+        version = self.version
+        try:
+            # Documents are replaced, never mutated, so the snapshot list is safe to read off-loop
+            blob, etag = await asyncio.to_thread(_serialize, list(self.products.values()))
+        finally:
+            self._building = None
+        if self.version == version: # if the catalog changed meanwhile this snapshot is served once, not kept
+            self._blob, self._etag = blob, etag
+        return blob, etag
+
+    # --- writes ---
+    def subscribe(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, op, product_id, product):
+        for fn in self._listeners:
+            try:
+                fn(op, product_id, product)
+            except Exception as e:
+                print(f"ERROR: catalog listener failed for {op} {product_id}: {e}")
+
+    def _invalidate(self):
+        self._blob = None
+        self._etag = None
+        self.version += 1
+
+    def upsert(self, doc):
+        doc = _serializable(doc)
+        key = _key(doc)
+        current = self.products.get(key)
+        if current is not None and _stable(current) == _stable(doc):
+            self.products[key] = doc # at most a stock change: nothing downstream depends on it
+            return
+        self.products[key] = doc
+        self._key_by_object_id[doc["_id"]] = key
+        self._invalidate()
+        self._notify("upsert", key, doc)
+
+    def delete(self, object_id):
+        key = self._key_by_object_id.pop(str(object_id), None)
+        if key is not None and self.products.pop(key, None) is not None:
+            self._invalidate()
+            self._notify("delete", key, None)
+
+    async def load(self):
+        docs = await self.collection.find().to_list(length=None)
+        self._replace_all(docs)
+
+    def _replace_all(self, docs):
+        fresh = {}
+        for doc in docs:
+            doc = _serializable(doc)
+            fresh[_key(doc)] = doc
+        removed = [k for k in self.products if k not in fresh]
+        changed = [k for k, d in fresh.items() if k not in self.products or _stable(self.products[k]) != _stable(d)]
+        if not removed and not changed and list(fresh) == list(self.products):
+            self.products = fresh # picks up stock changes
+            return
+        self.products = fresh
+        self._key_by_object_id = {d["_id"]: k for k, d in fresh.items()}
+        self._invalidate()
+        for k in removed:
+            self._notify("delete", k, None)
+        for k in changed:
+            self._notify("upsert", k, fresh[k])
+
+    # --- background sync ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _apply_change(self, change):
+        op = change.get("operationType")
+        if op in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is not None:
+                self.upsert(doc)
+            else:  # document was deleted before the lookup ran
+                self.delete(change["documentKey"]["_id"])
+        elif op == "delete":
+            self.delete(change["documentKey"]["_id"])
+        elif op in ("drop", "rename", "invalidate"):
+            raise RuntimeError(f"Change stream ended by '{op}'")
+
+    async def _watch(self):
+        async with self.collection.watch(full_document="updateLookup") as stream:
+            self.mode = "change-stream"
+            # Catch anything written between load() and the stream opening
+            await self.load()
+            async for change in stream:
+                self._apply_change(change)
+
+    async def _poll(self):
+        self.mode = "polling"
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"ERROR: catalog poll failed: {e}")
+
+    async def _sync_forever(self):
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.mode != "change-stream":
+                    # Never got a stream (standalone server, mongomock): poll instead
+                    print(f"Catalog change streams unavailable ({e}); polling every {self.poll_interval}s.")
+                    await self._poll()
+                    return
+                print(f"Catalog change stream dropped ({e}); reconnecting.")
+                self.mode = "idle"
+                await asyncio.sleep(1)
@@ -0,0 +1,39 @@
+import json
+
+# Helpers for /chatbot/stream: Server-Sent Events framing and incremental markdown rendering.
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class MarkdownBlockRenderer:
+    # Feeds streamed text in and hands back HTML for each markdown block as soon as it is complete.
+    # A block ends at a blank line; list items are also emitted one by one so bullet-style answers
+    # render progressively instead of all at once when the list closes.
+    def __init__(self, render):
+        self.render = render
+        self.buffer = ""
+
+    @staticmethod
+    def _is_list_item(line):
+        stripped = line.lstrip()
+        return stripped[:2] in ("- ", "* ", "+ ") or (stripped.split(". ", 1)[0].isdigit() and ". " in stripped)
+
+    def feed(self, text):
+        self.buffer += text
+        blocks = []
+        while True:
+            if "\n\n" in self.buffer:
+                block, self.buffer = self.buffer.split("\n\n", 1)
+            elif "\n" in self.buffer and self._is_list_item(self.buffer.split("\n", 1)[0]):
+                block, self.buffer = self.buffer.split("\n", 1)
+            else:
+                break
+            if block.strip():
+                blocks.append(self.render(block))
+        return blocks
+
+    def finish(self):
+        block, self.buffer = self.buffer, ""
+        return [self.render(block)] if block.strip() else []
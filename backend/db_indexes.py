@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import asyncio
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Index bootstrap for the ecommerce database, run on startup (ensure_indexes) and from the
+# command line:
+#   python db_indexes.py           -> create/verify every index below
+#   python db_indexes.py --check   -> explain() the hot queries and flag collection scans
+# Each entry: (collection, keys, options). create_index is a no-op when the index already exists.
+
+INDEXES = [
+    # Login / profile / cart lookups
+    ("users", [("username", ASCENDING)], {"unique": True}),
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    # Product lookups by catalog id
+    ("products", [("id", ASCENDING)], {"unique": True}),
+    # Category browsing + keyset pagination for /products
+    ("products", [("category", ASCENDING), ("_id", ASCENDING)], {}),
+    ("products", [("category", ASCENDING), ("subcategory", ASCENDING), ("_id", ASCENDING)], {}),
+    # Price-range pages are keyset-paged in (price, _id) order, so both end in _id
+    ("products", [("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], {}),
+    ("products", [("price", ASCENDING), ("_id", ASCENDING)], {}),
+    # Analytics time queries (the TTL index on timestamp is owned by AnalyticsRollups)
+    ("analytics_events", [("eventName", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ("analytics_events", [("userId", ASCENDING), ("timestamp", DESCENDING)], {}),
+]
+
+# Representative hot queries for --check: (collection, filter, sort)
+HOT_QUERIES = [
+    ("users", {"username": "__check__"}, None),
+    ("users", {"email": "__check__@example.com"}, None),
+    ("products", {"id": "1"}, None),
+    ("products", {"category": "Electronics"}, [("_id", ASCENDING)]),
+    ("products", {"category": "Electronics", "subcategory": "Headphones"}, [("_id", ASCENDING)]),
+    # Same shapes as a /products price-range page
+    ("products", {"price": {"$gte": 100, "$lte": 500}}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    ("products", {"category": "Electronics", "price": {"$gte": 100, "$lte": 500}}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    ("analytics_events", {"eventName": "product_viewed"}, [("timestamp", DESCENDING)]),
+]
+
+
+async def ensure_indexes(db):
+    # Returns the key specs of indexes that could not be built (e.g. duplicate usernames already stored)
+    failed = []
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            failed.append(f"{collection}{keys}")
+            print(f"WARNING: could not create index {collection}{keys}: {e}")
+    return failed
+
+
+def _plan_stages(plan):
+    # With the slot-based engine (MongoDB 6+) the classic plan tree sits under "queryPlan"
+    plan = plan.get("queryPlan", plan)
+    stages = [plan["stage"]] if plan.get("stage") else []
+    for child in plan.get("inputStages", []) + ([plan["inputStage"]] if "inputStage" in plan else []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def check_queries(db):
+    report = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        t0 = time.perf_counter()
+        explain = await cursor.explain()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        stats = explain.get("executionStats", {})
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({
+            "collection": collection,
+            "query": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "explain_ms": round(elapsed_ms, 2),
+        })
+    return report
+
+
+async def _main(argv):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(override=True)
+    db = AsyncIOMotorClient(os.getenv("MONGO_URI"))["ecommerce"]
+
+    if "--check" in argv:
+        slow = 0
+        for row in await check_queries(db):
+            flag = "SLOW" if row["collscan"] or row["in_memory_sort"] else "ok"
+            slow += flag == "SLOW"
+            print(f"[{flag:4}] {row['collection']:17} {row['query']} sort={row['sort']} "
+                  f"stages={'>'.join(row['stages'])} examined={row['docs_examined']} returned={row['returned']}")
+        return 1 if slow else 0
+
+    failed = await ensure_indexes(db)
+    print("Indexes ensured." if not failed else f"Indexes ensured except: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,168 @@
+import os
+import json
+import pickle
+import hashlib
+import uuid
+import numpy as np
+
+# On-disk cache for the product vectors built in setup_vectorization.
+# Layout of the store directory:
+#   manifest.json  -> model name, embedding dim, generation and one {"id", "hash"} entry per row
+#   clip.<generation>.npy -> float32 (N, dim) CLIP text embeddings, row i belongs to entries[i]
+#   tfidf.pkl      -> fitted TfidfVectorizer + matrix, reused while the catalog fingerprint matches
+#   neighbors.npz  -> content neighbour rows/similarities for the recommendation table, same rule
+# Arrays are opened with mmap_mode="r" so several workers share the same pages.
+# save() writes the vectors under a fresh generation name first and then the manifest naming it, so
+# the manifest rename is the commit point: a crash in between leaves the old pair intact. The previous
+# generation is kept for readers that still hold the old manifest; older ones are removed.
+
+MANIFEST_FILE = "manifest.json"
+CLIP_PREFIX = "clip."
+TFIDF_FILE = "tfidf.pkl"
+NEIGHBORS_FILE = "neighbors.npz"
+ENCODE_BATCH_SIZE = 256
+
+
+def product_key(product):
+    return str(product.get("id", product.get("_id")))
+
+
+def content_hash(text, model_name=""):
+    return hashlib.sha1(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path, mode, write_fn):
+    # Write to a temp file next to the target and rename, so readers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode) as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _clip_file(generation):
+        return f"{CLIP_PREFIX}{generation}.npy"
+
+    def load(self):
+        # Returns (entries, matrix) or ([], None) if nothing usable is stored
+        try:
+            with open(self._file(MANIFEST_FILE), "r") as f:
+                manifest = json.load(f)
+            if manifest.get("model") != self.model_name or not manifest.get("generation"):
+                return [], None
+            matrix = np.load(self._file(self._clip_file(manifest["generation"])), mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape != (len(manifest["entries"]), manifest["dim"]):
+                return [], None
+            return manifest["entries"], matrix
+        except (OSError, ValueError, KeyError):
+            return [], None
+
+    def save(self, entries, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        previous = self._generation()
+        generation = uuid.uuid4().hex[:16]
+        _atomic_write(self._file(self._clip_file(generation)), "wb", lambda f: np.save(f, matrix))
+        manifest = {
+            "model": self.model_name,
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "generation": generation,
+            "entries": entries,
+        }
+        _atomic_write(self._file(MANIFEST_FILE), "w", lambda f: json.dump(manifest, f))
+        self._remove_generations(keep={generation, previous})
+
+    def _generation(self):
+        try:
+            with open(self._file(MANIFEST_FILE), "r") as f:
+                return json.load(f).get("generation")
+        except (OSError, ValueError):
+            return None
+
+    def _remove_generations(self, keep):
+        # Also clears the unversioned clip.npy of older stores. Temp files are left alone: another
+        # worker may be mid-save.
+        keep_files = {self._clip_file(g) for g in keep if g}
+        for name in os.listdir(self.path):
+            if name.startswith(CLIP_PREFIX) and name.endswith(".npy") and name not in keep_files:
+                try:
+                    os.remove(self._file(name))
+                except FileNotFoundError:
+                    pass
+
+    def sync(self, products, texts, encode_fn):
+        # Returns a float32 matrix aligned with `products`, encoding only rows whose id/hash
+        # are missing from the store, and persists the result if anything changed.
+        stored_entries, stored_matrix = self.load()
+        stored_rows = {(e["id"], e["hash"]): i for i, e in enumerate(stored_entries)}
+
+        entries = [{"id": product_key(p), "hash": content_hash(t, self.model_name)} for p, t in zip(products, texts)]
+        row_sources = [stored_rows.get((e["id"], e["hash"])) for e in entries]
+        missing = [i for i, src in enumerate(row_sources) if src is None]
+
+        if not missing and len(entries) == len(stored_entries) and row_sources == list(range(len(entries))):
+            print(f"Embedding store hit: reusing {len(entries)} vectors.")
+            return stored_matrix
+
+        new_vectors = None
+        if missing:
+            print(f"Embedding store: encoding {len(missing)} new/changed of {len(entries)} products.")
+            new_vectors = np.asarray(
+                encode_fn([texts[i] for i in missing], batch_size=ENCODE_BATCH_SIZE), dtype=np.float32
+            )
+
+        dim = new_vectors.shape[1] if new_vectors is not None else stored_matrix.shape[1]
+        matrix = np.empty((len(entries), dim), dtype=np.float32)
+        kept = [i for i, src in enumerate(row_sources) if src is not None]
+        if kept:
+            matrix[kept] = stored_matrix[[row_sources[i] for i in kept]]
+        if missing:
+            matrix[missing] = new_vectors
+
+        self.save(entries, matrix)
+        return matrix
+
+    # --- TF-IDF: the vocabulary is global, so it's refit whenever any name changes ---
+    def catalog_fingerprint(self, products, texts):
+        h = hashlib.sha1()
+        for p, t in zip(products, texts):
+            h.update(f"{product_key(p)}\x00{t}\x01".encode("utf-8"))
+        return h.hexdigest()
+
+    def load_tfidf(self, fingerprint):
+        try:
+            with open(self._file(TFIDF_FILE), "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                return cached["vectorizer"], cached["matrix"]
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+        return None, None
+
+    def save_tfidf(self, fingerprint, vectorizer, matrix):
+        payload = {"fingerprint": fingerprint, "vectorizer": vectorizer, "matrix": matrix}
+        _atomic_write(self._file(TFIDF_FILE), "wb", lambda f: pickle.dump(payload, f))
+
+    # --- Content neighbours for the recommendation table (derived from the vectors above) ---
+    def load_neighbors(self, fingerprint):
+        try:
+            with np.load(self._file(NEIGHBORS_FILE)) as data:
+                if str(data["fingerprint"]) == fingerprint:
+                    return data["rows"], data["sims"]
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def save_neighbors(self, fingerprint, rows, sims):
+        _atomic_write(
+            self._file(NEIGHBORS_FILE), "wb",
+            lambda f: np.savez(f, fingerprint=np.array(fingerprint), rows=rows, sims=sims),
+        )
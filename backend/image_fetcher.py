@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+from io import BytesIO
+
+import httpx
+
+# Product image acquisition: search for an image URL per product name, optionally download it.
+# - one pooled httpx.AsyncClient for every request, at most `concurrency` products in flight
+# - transient failures (timeouts, connection errors, 429/5xx) are retried with exponential
+#   backoff and jitter
+# - every finished product is appended to a JSON-lines checkpoint, so a crashed run resumes
+#   where it stopped instead of starting over
+# - search providers are pluggable: "serpapi", "ddgs" or "http" (a local stub that answers
+#   GET <url>?q=<name> with {"images": [<url>, ...]})
+# - images and output JSON are written to a temp file and renamed
+#
+# CLI (replaces bing.py), from backend/:
+#   python image_fetcher.py --provider ddgs --concurrency 8
+#   python image_fetcher.py --provider http --search-url http://127.0.0.1:8102/search
+
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/600"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    pass
+
+
+class SerpApiProvider:
+    url = "https://serpapi.com/search.json"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    async def search(self, client, query):
+        res = await client.get(self.url, params={"q": query, "tbm": "isch", "api_key": self.api_key})
+        raise_for_retry(res)
+        results = res.json().get("images_results") or []
+        return results[0]["original"] if results else None
+
+
+class DDGSProvider:
+    async def search(self, client, query):
+        # ddgs has no async API and keeps its own session; run it on a worker thread
+        def lookup():
+            from ddgs import DDGS
+            with DDGS() as ddgs:
+                results = ddgs.images(query, max_results=1)
+            return results[0]["image"] if results else None
+        return await asyncio.to_thread(lookup)
+
+
+class HttpSearchProvider:
+    def __init__(self, url):
+        self.url = url
+
+    async def search(self, client, query):
+        res = await client.get(self.url, params={"q": query})
+        raise_for_retry(res)
+        images = res.json().get("images") or []
+        return images[0] if images else None
+
+
+def make_provider(name, api_key=None, url=None):
+    if name == "serpapi":
+        return SerpApiProvider(api_key)
+    if name == "ddgs":
+        return DDGSProvider()
+    if name == "http":
+        if not url:
+            raise ValueError("A search URL is required for the http image search provider")
+        return HttpSearchProvider(url)
+    raise ValueError(f"Unknown image search provider: {name}")
+
+
+def raise_for_retry(res):
+    if res.status_code in RETRY_STATUSES:
+        raise RetryableError(f"HTTP {res.status_code} from {res.request.url.host}")
+    res.raise_for_status()
+
+
+def image_file_name(product_name):
+    return f"{product_name.lower().replace(' ', '_').replace('/', '_')}.jpg"
+
+
+def atomic_write_bytes(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, obj, **kwargs):
+    atomic_write_bytes(path, json.dumps(obj, **kwargs).encode("utf-8"))
+
+
+def encode_jpeg(content):
+    from PIL import Image
+    img = Image.open(BytesIO(content)).convert("RGB")
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+class Checkpoint:
+    # Append-only JSON lines: {"name": ..., "url": ..., "path": ...}. A torn last line from a crash
+    # is ignored on load.
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[entry["name"]] = entry
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def record(self, entry):
+        self.done[entry["name"]] = entry
+        if self._file is not None:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ImageFetcher:
+    def __init__(self, provider, out_dir=None, concurrency=8, retries=3, backoff=0.5, timeout=10.0,
+                 checkpoint_path=None, client=None):
+        self.provider = provider
+        self.out_dir = out_dir # None = only resolve URLs, don't download
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.checkpoint_path = checkpoint_path
+        self.client = client
+        self.stats = {"searched": 0, "downloaded": 0, "resumed": 0, "retries": 0, "failed": 0}
+
+    async def _with_retries(self, fn, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return await fn(*args)
+            except (RetryableError, httpx.TransportError):
+                if attempt == self.retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    async def _download(self, client, url, path):
+        res = await client.get(url, follow_redirects=True)
+        raise_for_retry(res)
+        data = await asyncio.to_thread(encode_jpeg, res.content)
+        await asyncio.to_thread(atomic_write_bytes, path, data)
+
+    async def _fetch_one(self, client, name, checkpoint, semaphore):
+        async with semaphore:
+            entry = {"name": name, "url": None, "path": None}
+            try:
+                path = os.path.join(self.out_dir, image_file_name(name)) if self.out_dir else None
+                if path and os.path.exists(path):
+                    entry["path"] = path # downloaded by an earlier run without a checkpoint
+                else:
+                    entry["url"] = await self._with_retries(self.provider.search, client, name)
+                    self.stats["searched"] += 1
+                    if path and entry["url"]:
+                        await self._with_retries(self._download, client, entry["url"], path)
+                        entry["path"] = path
+                        self.stats["downloaded"] += 1
+            except Exception as e:
+                # Failures aren't checkpointed, so the next run tries them again
+                self.stats["failed"] += 1
+                print(f"Image fetch failed for {name}: {e}")
+                return entry
+            checkpoint.record(entry)
+            return entry
+
+    async def run(self, names):
+        # Returns {name: {"name", "url", "path"}} for every name; url/path are None on failure
+        checkpoint = Checkpoint(self.checkpoint_path)
+        if self.out_dir:
+            os.makedirs(self.out_dir, exist_ok=True)
+        results = {}
+        todo = []
+        for name in dict.fromkeys(names):
+            if name in checkpoint.done:
+                results[name] = checkpoint.done[name]
+                self.stats["resumed"] += 1
+            else:
+                todo.append(name)
+
+        client = self.client or httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            headers={"User-Agent": "SmartShop-image-fetcher/1.0"},
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            entries = await asyncio.gather(*(self._fetch_one(client, n, checkpoint, semaphore) for n in todo))
+        finally:
+            checkpoint.close()
+            if self.client is None:
+                await client.aclose()
+        results.update((e["name"], e) for e in entries)
+        return results
+
+
+async def resolve_image_urls(names, provider, cache_path, concurrency=8):
+    # Image URL per product name, backed by a JSON name -> url cache; misses are searched
+    # concurrently. Names that can't be resolved get the placeholder but aren't cached.
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    missing = [n for n in dict.fromkeys(names) if n not in cache]
+    if missing:
+        fetched = await ImageFetcher(provider, concurrency=concurrency).run(missing)
+        cache.update((name, e["url"]) for name, e in fetched.items() if e["url"])
+        atomic_write_json(cache_path, cache, indent=2)
+    return {n: cache.get(n, PLACEHOLDER_IMAGE_URL) for n in names}
+
+
+async def _main(args):
+    with open(args.products, encoding="utf-8") as f:
+        products = json.load(f)
+
+    provider = make_provider(args.provider, api_key=os.getenv("SERPAPI_KEY"), url=args.search_url)
+    fetcher = ImageFetcher(
+        provider,
+        out_dir=args.out_dir,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        checkpoint_path=args.checkpoint,
+    )
+    results = await fetcher.run([p["name"] for p in products])
+    for product in products:
+        product["image"] = results[product["name"]]["path"] or os.path.join(args.out_dir, "placeholder.jpg")
+
+    atomic_write_json(args.products, products, indent=2, ensure_ascii=False)
+    print(f"Updated {len(products)} entries in {args.products}: {json.dumps(fetcher.stats)}")
+    if not fetcher.stats["failed"] and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint) # complete run; the next one starts fresh
+    return 1 if fetcher.stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download product images")
+    parser.add_argument("--products", default="data/products.json")
+    parser.add_argument("--out-dir", default="images")
+    parser.add_argument("--provider", default="ddgs", choices=["ddgs", "serpapi", "http"])
+    parser.add_argument("--search-url", help="search endpoint for --provider http")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--checkpoint", default="data/image_fetch.checkpoint.jsonl")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,110 @@
+import os
+import uuid
+from PIL import Image
+from starlette.responses import JSONResponse
+
+# Helpers for turning an uploaded file object into a small RGB image without touching disk.
+# - UploadLimitMiddleware turns away oversized request bodies before Starlette spools them
+# - decode_image checks the byte size, then the pixel count at the size it would actually decode
+#   (PNG, WebP etc. decode at full size; Pillow's own bomb check only fires far above what we want)
+
+# Multipart boundaries and the other form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class ImageTooLargeError(Exception):
+    pass
+
+
+def upload_size(fileobj):
+    # UploadFile.file is a SpooledTemporaryFile, so seeking is cheap (memory) or a single lseek (rolled over)
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+class UploadLimitMiddleware:
+    # Pure ASGI: a declared Content-Length over the limit is answered with 413 before anything is
+    # read, and chunked bodies are counted as they arrive
+    def __init__(self, app, max_bytes, paths):
+        self.app = app
+        self.max_bytes = max_bytes + MULTIPART_OVERHEAD
+        self.paths = set(paths)
+        self.detail = f"Image too large (max {max_bytes // (1024 * 1024)} MB)."
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+            return
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            # The form parser turns exceptions from here into a 400, so the 413 is sent from here and
+            # whatever the app answers afterwards is dropped
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes and not rejected:
+                    rejected = True
+                    await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+                    raise ImageTooLargeError(self.detail)
+            return message
+
+        async def send_wrapper(message):
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, send_wrapper)
+        except ImageTooLargeError:
+            if not rejected:
+                raise
+
+
+def decode_image(fileobj, max_side=448, max_bytes=None, max_pixels=None):
+    # Decode straight from the upload buffer. For JPEGs `draft` lets libjpeg decode at 1/2, 1/4 or 1/8
+    # scale, so a 12MP photo never gets fully materialised; `thumbnail` then reduces the rest of the way.
+    if max_bytes is not None and upload_size(fileobj) > max_bytes:
+        raise ImageTooLargeError(f"Image too large (max {max_bytes // (1024 * 1024)} MB).")
+    fileobj.seek(0)
+    img = Image.open(fileobj)
+    img.draft("RGB", (max_side, max_side))
+    # Only the header has been read so far; after draft() img.size is the size that would be decoded
+    if max_pixels is not None and img.size[0] * img.size[1] > max_pixels:
+        raise ImageTooLargeError(f"Image too large (max {max_pixels // 1_000_000} megapixels).")
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side))
+    return img
+
+
+def dhash(img, size=8):
+    # 64-bit difference hash: compares neighbouring pixels of a (size+1) x size greyscale thumbnail.
+    # Robust to re-encoding and resizing, so near-identical photos land within a few bits.
+    gray = img.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    px = gray.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (px[offset + col] > px[offset + col + 1])
+    return bits
+
+
+def save_upload(fileobj, directory, filename):
+    # Opt-in persistence; prefix with a uuid so clients uploading the same filename don't collide
+    os.makedirs(directory, exist_ok=True)
+    safe_name = os.path.basename(filename or "upload")
+    path = os.path.join(directory, f"{uuid.uuid4().hex[:12]}_{safe_name}")
+    fileobj.seek(0)
+    with open(path, "wb") as f:
+        while chunk := fileobj.read(1024 * 1024):
+            f.write(chunk)
+    fileobj.seek(0)
+    return path
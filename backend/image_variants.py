@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps, features
+
+from embedding_store import product_key, content_hash
+from image_fetcher import image_file_name, atomic_write_bytes, atomic_write_json
+
+# Resized, re-encoded copies of the product images under images/, plus the CLIP input pixels.
+# - each source is decoded once in a pool process, which writes every (width, format) variant and
+#   hands back a 224x224 centre crop for CLIP, so embeddings don't decode the image again
+# - variant files are content-addressed (<sha256 prefix>.<ext>), so they can be served with
+#   immutable cache headers: a changed source image produces new file names
+# - manifest.json maps source file -> size/mtime/hash + variants; unchanged sources are skipped
+# Build step (from backend/): python image_variants.py [--workers 4] [--embeddings]
+
+VARIANT_WIDTHS = (160, 320, 640, 1024)
+VARIANT_FORMATS = ("avif", "webp", "jpeg")
+CLIP_INPUT_SIZE = 224
+MANIFEST_FILE = "manifest.json"
+EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+ENCODE_OPTIONS = {"avif": {"quality": 55}, "webp": {"quality": 80, "method": 4}, "jpeg": {"quality": 82, "optimize": True, "progressive": True}}
+VARIANT_FILE_RE = re.compile(r"^[0-9a-f]{20}\.(avif|webp|jpg)$")
+
+
+def supported_formats(formats):
+    # Drops formats this Pillow build can't encode (AVIF needs Pillow 11.2+ or pillow-avif-plugin)
+    return [f for f in formats if f == "jpeg" or features.check(f)]
+
+
+def clip_pixels(img, size=CLIP_INPUT_SIZE):
+    # Same geometry as CLIP's preprocessing: shortest side to `size`, then a centre crop
+    return np.asarray(ImageOps.fit(img, (size, size), Image.Resampling.BICUBIC), dtype=np.uint8)
+
+
+def render_variants(src_path, out_dir, widths, formats, clip_size=CLIP_INPUT_SIZE):
+    # Runs inside a pool process
+    with open(src_path, "rb") as f:
+        data = f.read()
+    img = ImageOps.exif_transpose(Image.open(BytesIO(data))).convert("RGB")
+
+    # Never upscale; a source narrower than every width gets one variant at its own width
+    targets = sorted({w for w in widths if w <= img.width} or {img.width})
+    variants = []
+    for width in targets:
+        resized = img if width == img.width else img.resize(
+            (width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS, reducing_gap=2.0
+        )
+        for fmt in formats:
+            out = BytesIO()
+            resized.save(out, format=fmt.upper(), **ENCODE_OPTIONS[fmt])
+            encoded = out.getvalue()
+            file_name = f"{hashlib.sha256(encoded).hexdigest()[:20]}.{EXTENSIONS[fmt]}"
+            path = os.path.join(out_dir, file_name)
+            if not os.path.exists(path):
+                atomic_write_bytes(path, encoded)
+            variants.append({"width": width, "format": fmt, "file": file_name, "bytes": len(encoded)})
+
+    return {
+        "sourceHash": hashlib.sha1(data).hexdigest(),
+        "width": img.width,
+        "height": img.height,
+        "variants": variants,
+        "pixels": clip_pixels(img, clip_size),
+    }
+
+
+class ImageVariantStore:
+    def __init__(self, source_dir="images", out_dir="data/image_variants", widths=VARIANT_WIDTHS,
+                 formats=VARIANT_FORMATS, workers=2):
+        self.source_dir = source_dir
+        self.out_dir = out_dir
+        self.widths = tuple(sorted(widths))
+        self.formats = supported_formats(formats)
+        self.workers = workers
+        self.images = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.out_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("widths") == list(self.widths) and manifest.get("formats") == self.formats:
+                self.images = manifest["images"]
+        except (OSError, ValueError, KeyError):
+            self.images = {}
+
+    def _save(self):
+        manifest = {"widths": list(self.widths), "formats": self.formats, "images": self.images}
+        atomic_write_json(os.path.join(self.out_dir, MANIFEST_FILE), manifest)
+
+    def _is_current(self, name):
+        entry = self.images.get(name)
+        if entry is None:
+            return False
+        st = os.stat(os.path.join(self.source_dir, name))
+        return entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns
+
+    async def build(self, names=None, force=()):
+        # Renders variants for new/changed sources (and any in `force`). Returns {name: clip pixels}
+        # for every source that was decoded in this call.
+        os.makedirs(self.out_dir, exist_ok=True)
+        if names is None:
+            names = sorted(n for n in os.listdir(self.source_dir) if not n.startswith("."))
+        names = [n for n in names if os.path.isfile(os.path.join(self.source_dir, n))]
+        todo = [n for n in names if n in force or not self._is_current(n)]
+        if not todo:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                loop.run_in_executor(pool, render_variants, os.path.join(self.source_dir, n), self.out_dir, self.widths, self.formats)
+                for n in todo
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+
+        pixels = {}
+        for name, result in zip(todo, results):
+            if isinstance(result, Exception):
+                print(f"Image variants failed for {name}: {result}")
+                continue
+            st = os.stat(os.path.join(self.source_dir, name))
+            pixels[name] = result.pop("pixels")
+            self.images[name] = {"size": st.st_size, "mtime": st.st_mtime_ns, **result}
+        self._save()
+        print(f"Image variants: rendered {len(pixels)} of {len(names)} sources.")
+        return pixels
+
+    def variants(self, name):
+        entry = self.images.get(name)
+        return entry["variants"] if entry else []
+
+    def pick(self, name, width, accept=""):
+        # Best format the client accepts, then the smallest variant at least `width` wide
+        # (or the largest there is)
+        variants = self.variants(name)
+        for fmt in self.formats:
+            if fmt != "jpeg" and MEDIA_TYPES[fmt] not in accept:
+                continue
+            candidates = sorted((v for v in variants if v["format"] == fmt), key=lambda v: v["width"])
+            if candidates:
+                return next((v for v in candidates if v["width"] >= width), candidates[-1])
+        return None
+
+    def file_path(self, file_name):
+        # None for anything that isn't a variant file name (keeps the route from serving other paths)
+        if not VARIANT_FILE_RE.match(file_name):
+            return None
+        path = os.path.join(self.out_dir, file_name)
+        return path if os.path.exists(path) else None
+
+
+def product_image_name(product):
+    # Local image file for a product, named the way image_fetcher saves them
+    return image_file_name(product["name"])
+
+
+async def sync_image_embeddings(variant_store, embedding_store, products, encode_fn):
+    # Builds variants and returns (products_with_images, float32 matrix) of CLIP image embeddings.
+    # Embeddings are keyed by the source image hash; CLIP only sees pixels decoded by the variant
+    # build, and sources are decoded again only if their embedding is missing from the store.
+    products = [p for p in products if os.path.isfile(os.path.join(variant_store.source_dir, product_image_name(p)))]
+    names = sorted({product_image_name(p) for p in products})
+    pixels = await variant_store.build(names)
+
+    stored_entries, _ = embedding_store.load()
+    stored = {(e["id"], e["hash"]) for e in stored_entries}
+    force = set()
+    for p in products:
+        name = product_image_name(p)
+        source_hash = variant_store.images.get(name, {}).get("sourceHash", "")
+        if name not in pixels and (product_key(p), content_hash(source_hash, embedding_store.model_name)) not in stored:
+            force.add(name)
+    if force:
+        pixels.update(await variant_store.build(sorted(force), force=force))
+
+    products = [p for p in products if product_image_name(p) in variant_store.images]
+    hashes = [variant_store.images[product_image_name(p)]["sourceHash"] for p in products]
+    pixels_by_hash = {variant_store.images[n]["sourceHash"]: px for n, px in pixels.items()}
+
+    def encode_images(source_hashes, batch_size):
+        images = [Image.fromarray(pixels_by_hash[h]) for h in source_hashes]
+        return encode_fn(images, batch_size=batch_size)
+
+    if not products:
+        return [], None
+    # EmbeddingStore.sync only calls encode for rows whose (id, hash) isn't stored yet
+    return products, await asyncio.to_thread(embedding_store.sync, products, hashes, encode_images)
+
+
+async def _main(args):
+    store = ImageVariantStore(args.source_dir, args.out_dir, workers=args.workers)
+    pixels = await store.build(force=set(os.listdir(args.source_dir)) if args.force else ())
+    total = sum(v["bytes"] for e in store.images.values() for v in e["variants"])
+    print(f"{len(store.images)} images, {len(pixels)} rendered, formats={store.formats}, variant bytes={total}")
+
+    if args.embeddings:
+        # Offline image-embedding build, so the API starts with the index already on disk
+        from sentence_transformers import SentenceTransformer
+        from embedding_store import EmbeddingStore
+        with open(args.products, encoding="utf-8") as f:
+            products = [{**p, "id": str(p["id"]).strip()} for p in json.load(f)]
+        model = SentenceTransformer(args.model)
+        embedded, matrix = await sync_image_embeddings(
+            store, EmbeddingStore(os.path.join(args.embeddings, "images"), args.model), products, model.encode
+        )
+        print(f"Image embeddings: {len(embedded)} products, dim={matrix.shape[1] if matrix is not None else 0}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render resized WebP/AVIF/JPEG variants of product images")
+    parser.add_argument("--source-dir", default="images")
+    parser.add_argument("--out-dir", default="data/image_variants")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--force", action="store_true", help="re-render every source")
+    parser.add_argument("--embeddings", nargs="?", const="data/embeddings", metavar="STORE_DIR",
+                        help="also compute CLIP image embeddings into STORE_DIR/images (default data/embeddings)")
+    parser.add_argument("--products", default="data/products.json")
+    parser.add_argument("--model", default="clip-ViT-B-32")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
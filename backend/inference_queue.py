@@ -0,0 +1,95 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Micro-batching front for a blocking batch function such as clip_model.encode.
+# Requests are queued on the event loop; a single background task takes the first waiting
+# item, keeps collecting for up to `max_wait_ms` (or until `max_batch_size` items) and runs
+# one batched call in a worker thread, so the event loop keeps serving other routes.
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class BatchingEncoder:
+    def __init__(self, encode_fn, max_batch_size=16, max_wait_ms=10, max_queue=256, workers=1):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.workers = workers
+        self.queue = None
+        self.executor = None
+        self.tasks = []
+        # Simple counters, handy when tuning batch size / wait window
+        self.stats = {"requests": 0, "batches": 0, "rejected": 0, "max_batch": 0}
+
+    def start(self):
+        if self.queue is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="clip-encode")
+        # One collector per worker thread so batches can overlap when workers > 1
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.queue is not None:
+            while not self.queue.empty():
+                _, future = self.queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Encoder is shutting down"))
+            self.queue = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def encode(self, item):
+        if self.queue is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFullError("Inference queue is full")
+        self.stats["requests"] += 1
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Drop requests whose caller already went away
+            batch = [(item, fut) for item, fut in batch if not fut.cancelled()]
+            if not batch:
+                continue
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            try:
+                results = await loop.run_in_executor(self.executor, self.encode_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
@@ -0,0 +1,190 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from metrics import span, observe
+
+# Async wrapper around an OpenAI-compatible chat client (Groq) used by /chatbot and /cart/summary.
+# - responses are cached in an LRU with a TTL, keyed on the model, call params and normalised prompt
+# - concurrent identical requests share one upstream call (single-flight)
+# - at most `max_concurrency` upstream calls run at once, each bounded by `timeout` seconds
+# - stream() yields tokens as they arrive (cache hits are replayed in one piece) and caches the
+#   assembled text once the upstream stream finishes
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def cache_key(model, messages, params):
+    normalized = [{"role": m["role"], "content": normalize_text(m["content"])} for m in messages]
+    raw = json.dumps({"model": model, "messages": normalized, "params": params}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    def __init__(self, max_size=1024, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()
+
+    def get(self, key):
+        entry = self.items.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.items[key]
+            return None
+        self.items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.items[key] = (time.monotonic() + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CachedLLMClient:
+    def __init__(self, client, max_concurrency=8, timeout=30.0, cache_size=1024, cache_ttl=3600.0):
+        self.client = client # openai.AsyncOpenAI
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "timeouts": 0, "cancelled": 0,
+                      "upstream_ms_total": 0.0, "saved_ms_total": 0.0}
+
+    @property
+    def semaphore(self):
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call(self, model, messages, params):
+        async with self.semaphore:
+            t0 = time.perf_counter()
+            try:
+                with span("llm", "complete"):
+                    res = await asyncio.wait_for(
+                        self.client.chat.completions.create(model=model, messages=messages, **params),
+                        self.timeout,
+                    )
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError(f"LLM call timed out after {self.timeout}s")
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+        self.stats["upstream_ms_total"] += elapsed_ms
+        return res.choices[0].message.content, elapsed_ms
+
+    async def complete(self, model, messages, **params):
+        # Returns the completion text
+        key = cache_key(model, messages, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            text, cost_ms = cached
+            self.stats["hits"] += 1
+            self.stats["saved_ms_total"] += cost_ms
+            return text
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            text, cost_ms = await asyncio.shield(inflight)
+            self.stats["saved_ms_total"] += cost_ms
+            return text
+
+        self.stats["misses"] += 1
+        # The upstream call is its own task and every caller (this one included) only shields it, so
+        # a caller that is cancelled (client gone, request timeout) doesn't fail the others
+        task = asyncio.create_task(self._fill(key, model, messages, params))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception()) # retrieved even if nobody waits
+        self._inflight[key] = task
+        text, _ = await asyncio.shield(task)
+        return text
+
+    async def _fill(self, key, model, messages, params):
+        try:
+            result = await self._call(model, messages, params)
+        except Exception:
+            self.stats["errors"] += 1
+            raise # every waiter gets the same error; failures aren't cached
+        else:
+            self.cache.set(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def stream(self, model, messages, **params):
+        # Async generator of text deltas. Closing it (e.g. the HTTP client went away) closes the
+        # upstream response, which cancels generation on the provider side.
+        key = cache_key(model, messages, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            self.stats["saved_ms_total"] += cached[1]
+            yield cached[0]
+            return
+
+        self.stats["misses"] += 1
+        async with self.semaphore:
+            t0 = time.perf_counter()
+            try:
+                upstream = await asyncio.wait_for(
+                    self.client.chat.completions.create(model=model, messages=messages, stream=True, **params),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError(f"LLM call timed out after {self.timeout}s")
+            parts = []
+            try:
+                deadline = t0 + self.timeout
+                iterator = upstream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, deadline - time.perf_counter()))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.stats["timeouts"] += 1
+                        raise LLMTimeoutError(f"LLM stream timed out after {self.timeout}s")
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except GeneratorExit:
+                # Consumer stopped reading (client disconnected); don't cache a partial answer
+                self.stats["cancelled"] += 1
+                raise
+            except BaseException:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                await upstream.close()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+        self.stats["upstream_ms_total"] += elapsed_ms
+        observe("llm", "stream", elapsed_ms / 1000)
+        self.cache.set(key, ("".join(parts), elapsed_ms))
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "cached": len(self.cache),
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 4) if lookups else 0.0,
+        }
@@ -1,60 +1,235 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
-import pandas as pd
 import numpy as np
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from deep_translator import GoogleTranslator
-from sentence_transformers import SentenceTransformer, util
-import pdfkit
-import uuid
-import shutil
+from openai import AsyncOpenAI
 import json
 import markdown
 from PIL import Image
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-import bcrypt
-from datetime import datetime
+import re
+import asyncio
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from embedding_store import EmbeddingStore
+from vector_search import build_index
+from visual_search import FusedVisualIndex, PerceptualHashCache
+from inference_queue import BatchingEncoder, QueueFullError
+from image_io import decode_image, dhash, save_upload, ImageTooLargeError, UploadLimitMiddleware
+from catalog_cache import CatalogCache
+from analytics_buffer import EventBuffer, BufferFullError
+from analytics_rollups import AnalyticsRollups
+from password_hasher import PasswordHasher, HasherBusyError
+from db_indexes import ensure_indexes
+from llm_client import CachedLLMClient, TTLCache
+from chat_stream import sse, MarkdownBlockRenderer
+from sentiment import SentimentScorer, classify, aggregate
+from translation import TranslationService, SQLiteTranslationStore, TranslationUnavailableError, TranslationInputError, make_backend
+from receipts import ReceiptJobs, ReceiptQueueFullError
+from image_fetcher import make_provider, resolve_image_urls
+from image_variants import ImageVariantStore, sync_image_embeddings, product_image_name, MEDIA_TYPES
+from model_registry import ModelRegistry
+from metrics import REGISTRY, GaugeFunction, MetricsMiddleware, InstrumentedThreadPool, LoopLagMonitor, SlowRequestProfiler, mongo_command_listener, span
+from search_index import SearchIndex, blend, tokenize
+from recommendation_table import RecommendationTable, content_neighbors
+from pymongo.errors import DuplicateKeyError
+from pymongo import UpdateOne
+from cart_ops import add_item, set_quantity, remove_item, backfill_cart_totals, totals_response, EMPTY_TOTALS, CartError, UserNotFound, ItemNotInCart, InsufficientStock
 
-# SerpApi for image fetching (make sure you have it installed: pip install google-search-results)
-from serpapi import GoogleSearch # 👈 Added this import
 
 # --- Load environment variables ---
 load_dotenv(override=True)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "mistral-saba-24b")
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+# Image URL lookup for the initial catalog load: "serpapi", "ddgs" or "http" (IMAGE_SEARCH_URL, e.g. a local stub)
+IMAGE_SEARCH_PROVIDER = os.getenv("IMAGE_SEARCH_PROVIDER", "serpapi")
+IMAGE_SEARCH_URL = os.getenv("IMAGE_SEARCH_URL")
+IMAGE_SEARCH_CONCURRENCY = int(os.getenv("IMAGE_SEARCH_CONCURRENCY", "8"))
 MONGO_URI = os.getenv("MONGO_URI")
+CLIP_MODEL_NAME = "clip-ViT-B-32"
+# When heavy models (CLIP, VADER) load:
+#   "background" -> after startup, while the server already answers requests (default)
+#   "lazy"       -> on first use
+#   "preload"    -> at import; with `gunicorn --preload -k uvicorn.workers.UvicornWorker -w N main:app`
+#                   the master loads the weights once and forked workers share them copy-on-write
+MODEL_LOADING = os.getenv("MODEL_LOADING", "background")
+# Set EMBEDDING_STORE_DIR="" to disable the on-disk embedding cache
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "data/embeddings")
+# "exact" (brute force + argpartition) or "ivf" (approximate, for large catalogs) for the CLIP index
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "exact")
+# Micro-batching for /visual-search image encodes
+CLIP_BATCH_MAX_SIZE = int(os.getenv("CLIP_BATCH_MAX_SIZE", "16"))
+CLIP_BATCH_WAIT_MS = float(os.getenv("CLIP_BATCH_WAIT_MS", "10"))
+CLIP_QUEUE_MAX = int(os.getenv("CLIP_QUEUE_MAX", "256"))
+# Visual-search uploads are decoded in memory; set SAVE_UPLOADS=1 to also keep a copy in uploads/
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_DECODE_MAX_SIDE = int(os.getenv("UPLOAD_DECODE_MAX_SIDE", "448"))
+# Pixels an upload may decode to (JPEGs count at their reduced draft size): 24M RGB is ~72 MB
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", str(24_000_000)))
+SAVE_UPLOADS = os.getenv("SAVE_UPLOADS", "0") == "1"
+# /visual-search ranking: weight of image-image vs image-text similarity, and the upload embedding
+# cache keyed by perceptual hash (uploads within UPLOAD_HASH_MAX_DISTANCE bits reuse an embedding)
+VISUAL_SEARCH_IMAGE_WEIGHT = float(os.getenv("VISUAL_SEARCH_IMAGE_WEIGHT", "0.7"))
+UPLOAD_EMBEDDING_CACHE_SIZE = int(os.getenv("UPLOAD_EMBEDDING_CACHE_SIZE", "4096"))
+UPLOAD_HASH_MAX_DISTANCE = int(os.getenv("UPLOAD_HASH_MAX_DISTANCE", "4"))
+# Resized WebP/AVIF/JPEG copies of images/, rendered on startup (or by `python image_variants.py`)
+# /search: BM25 over name/description/category/subcategory; semantic=true blends in CLIP text
+# similarity with this weight, over `limit * SEARCH_OVERFETCH` candidates from each side
+SEARCH_SEMANTIC_WEIGHT = float(os.getenv("SEARCH_SEMANTIC_WEIGHT", "0.3"))
+SEARCH_OVERFETCH = int(os.getenv("SEARCH_OVERFETCH", "5"))
+SEARCH_QUERY_CACHE_SIZE = int(os.getenv("SEARCH_QUERY_CACHE_SIZE", "2048"))
+SEARCH_PAGE_MAX = 50
+
+# Precomputed /recommendations neighbours: content (TF-IDF + CLIP names) blended with co-view /
+# co-cart counts. REC_TABLE_K is the most neighbours kept (and served) per product.
+REC_TABLE_K = int(os.getenv("REC_TABLE_K", "50"))
+REC_CONTENT_CANDIDATES = int(os.getenv("REC_CONTENT_CANDIDATES", "100"))
+REC_TFIDF_WEIGHT = float(os.getenv("REC_TFIDF_WEIGHT", "0.5")) # share of TF-IDF vs CLIP in content similarity
+REC_CONTENT_WEIGHT = float(os.getenv("REC_CONTENT_WEIGHT", "0.6"))
+REC_VIEW_WEIGHT = float(os.getenv("REC_VIEW_WEIGHT", "0.25"))
+REC_CART_WEIGHT = float(os.getenv("REC_CART_WEIGHT", "0.15"))
+REC_SESSION_WINDOW = int(os.getenv("REC_SESSION_WINDOW", "20")) # views per user that count as co-viewed
+REC_REFRESH_SECONDS = float(os.getenv("REC_REFRESH_SECONDS", "5"))
+REC_HISTORY_DAYS = int(os.getenv("REC_HISTORY_DAYS", "30"))
+REC_HISTORY_MAX_EVENTS = int(os.getenv("REC_HISTORY_MAX_EVENTS", "1000000")) # newest views replayed at startup
+# Co-view/co-cart counts are kept in two generations of this length, so they cover the last 1-2 of them
+REC_COUNTS_ROTATE_DAYS = float(os.getenv("REC_COUNTS_ROTATE_DAYS", str(REC_HISTORY_DAYS / 2)))
+
+# /metrics (Prometheus text format). PROFILE_SLOW_REQUEST_MS > 0 turns on the sampling profiler:
+# requests slower than that leave a folded-stack file in PROFILE_DIR.
+DEFAULT_EXECUTOR_WORKERS = int(os.getenv("DEFAULT_EXECUTOR_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.25"))
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+IMAGE_VARIANTS_DIR = os.getenv("IMAGE_VARIANTS_DIR", "data/image_variants")
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Fallback refresh interval for the catalog cache when change streams aren't available
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "30"))
+# Run cart + stock writes in a MongoDB transaction (requires a replica set)
+CART_TRANSACTIONS = os.getenv("CART_TRANSACTIONS", "0") == "1"
+# Analytics events are buffered and written with insert_many every N events or T ms
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_MS = float(os.getenv("ANALYTICS_FLUSH_MS", "250"))
+ANALYTICS_BUFFER_CAPACITY = int(os.getenv("ANALYTICS_BUFFER_CAPACITY", "50000"))
+ANALYTICS_MAX_BATCH_REQUEST = 1000
+# Raw events expire after this many days; summaries are answered from the rollups
+ANALYTICS_RAW_TTL_DAYS = int(os.getenv("ANALYTICS_RAW_TTL_DAYS", "30"))
+# bcrypt cost factor; existing hashes with a different cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "4"))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "64"))
+AUTH_TIMEOUT_SECONDS = float(os.getenv("AUTH_TIMEOUT_SECONDS", "5"))
+# LLM calls: concurrency cap, per-call timeout and response cache
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+# Review sentiment: memo size and process pool used for large batches (0 workers = score inline)
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "100000"))
+SENTIMENT_POOL_WORKERS = int(os.getenv("SENTIMENT_POOL_WORKERS", "2"))
+SENTIMENT_MAX_BATCH = 5000
+# Review translation: "google" or "http" (LibreTranslate-compatible TRANSLATOR_URL, e.g. a local stub)
+TRANSLATOR_BACKEND = os.getenv("TRANSLATOR_BACKEND", "google")
+TRANSLATOR_URL = os.getenv("TRANSLATOR_URL")
+# Persistent translation cache; set to "" to keep it in memory only
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "data/translations.sqlite3")
+TRANSLATION_TIMEOUT_SECONDS = float(os.getenv("TRANSLATION_TIMEOUT_SECONDS", "5"))
+TRANSLATION_MAX_BATCH = 500
+# Receipt PDFs: "auto" (wkhtmltopdf if installed), "wkhtmltopdf" or "builtin" (pure Python)
+RECEIPT_RENDERER = os.getenv("RECEIPT_RENDERER", "auto")
+RECEIPT_WORKERS = int(os.getenv("RECEIPT_WORKERS", "2"))
+RECEIPT_MAX_PENDING = int(os.getenv("RECEIPT_MAX_PENDING", "256"))
+# How long /receipt/{id}/download waits for a pending job before answering 409
+RECEIPT_DOWNLOAD_WAIT_SECONDS = float(os.getenv("RECEIPT_DOWNLOAD_WAIT_SECONDS", "10"))
+# Receipt jobs and their PDFs are deleted this long after the order
+RECEIPT_TTL_SECONDS = float(os.getenv("RECEIPT_TTL_SECONDS", "3600"))
 
 # --- Initialize clients ---
-groq_client = OpenAI(api_key=GROQ_API_KEY, base_url="https://api.groq.com/openai/v1")
-sentiment_analyzer = SentimentIntensityAnalyzer()
-translator = GoogleTranslator()
-clip_model = SentenceTransformer('clip-ViT-B-32')
+groq_client = AsyncOpenAI(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
+llm = CachedLLMClient(
+    groq_client,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT_SECONDS,
+    cache_size=LLM_CACHE_SIZE,
+    cache_ttl=LLM_CACHE_TTL_SECONDS,
+)
+
+def load_clip():
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(CLIP_MODEL_NAME)
+    model.eval()
+    return model
+
+def load_vader():
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+models = ModelRegistry()
+models.register("clip", load_clip)
+models.register("vader", load_vader)
+if MODEL_LOADING == "preload":
+    models.preload()
+
+def clip_encode(items, **kwargs):
+    model = models.get("clip")
+    with span("clip", "encode"):
+        return model.encode(items, **kwargs)
+
+sentiment_scorer = SentimentScorer(lambda: models.get("vader"), cache_size=SENTIMENT_CACHE_SIZE, pool_workers=SENTIMENT_POOL_WORKERS)
+translation_service = TranslationService(
+    make_backend(TRANSLATOR_BACKEND, TRANSLATOR_URL, timeout=TRANSLATION_TIMEOUT_SECONDS),
+    store=SQLiteTranslationStore(TRANSLATION_CACHE_PATH) if TRANSLATION_CACHE_PATH else None,
+    timeout=TRANSLATION_TIMEOUT_SECONDS,
+)
+receipt_jobs = ReceiptJobs("receipts", renderer=RECEIPT_RENDERER, max_workers=RECEIPT_WORKERS, max_pending=RECEIPT_MAX_PENDING, job_ttl=RECEIPT_TTL_SECONDS)
+clip_image_encoder = BatchingEncoder(
+    lambda images: clip_encode(images, batch_size=len(images), convert_to_numpy=True),
+    max_batch_size=CLIP_BATCH_MAX_SIZE,
+    max_wait_ms=CLIP_BATCH_WAIT_MS,
+    max_queue=CLIP_QUEUE_MAX,
+)
+upload_embedding_cache = PerceptualHashCache(UPLOAD_EMBEDDING_CACHE_SIZE, UPLOAD_HASH_MAX_DISTANCE)
 
 # MongoDB Client
-client = AsyncIOMotorClient(MONGO_URI)
+client = AsyncIOMotorClient(MONGO_URI, event_listeners=[mongo_command_listener()]) # per-command timings for /metrics
 db = client["ecommerce"]
 users_collection = db["users"]
 products_collection = db["products"] # We'll use this to store products for better management
+catalog_cache = CatalogCache(products_collection, poll_interval=CATALOG_POLL_SECONDS) # Serves product reads in-process
+search_index = SearchIndex()
+catalog_cache.subscribe(search_index.on_catalog_change) # indexed as the catalog loads and changes
+search_query_embeddings = TTLCache(max_size=SEARCH_QUERY_CACHE_SIZE, ttl=24 * 3600) # query text -> CLIP embedding
 
 # --- App setup ---
 app = FastAPI()
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, paths=["/visual-search"]) # innermost: 413s still get CORS headers
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+profiler = SlowRequestProfiler(PROFILE_SLOW_REQUEST_MS, PROFILE_DIR, PROFILE_INTERVAL_MS) if PROFILE_SLOW_REQUEST_MS > 0 else None
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+default_executor = InstrumentedThreadPool("default", DEFAULT_EXECUTOR_WORKERS).register() # behind asyncio.to_thread
+loop_lag = LoopLagMonitor(LOOP_LAG_INTERVAL_SECONDS)
 app.mount("/images", StaticFiles(directory="images"), name="images")
+image_variant_store = ImageVariantStore("images", IMAGE_VARIANTS_DIR, workers=IMAGE_VARIANT_WORKERS)
 
-# Utility for password hashing
-def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+# Password hashing runs on a bounded bcrypt thread pool, never on the event loop
+password_hasher = PasswordHasher(
+    rounds=BCRYPT_ROUNDS,
+    max_workers=AUTH_WORKERS,
+    max_pending=AUTH_MAX_PENDING,
+    timeout=AUTH_TIMEOUT_SECONDS,
+)
 
 class AnalyticsEvent(BaseModel):
     eventName: str
@@ -66,6 +241,25 @@ class AnalyticsEvent(BaseModel):
 # --- MongoDB Collection for Analytics ---
 # Ensure this is defined near your other collection definitions (users_collection, products_collection)
 analytics_collection = db["analytics_events"]
+analytics_buffer = EventBuffer(
+    analytics_collection,
+    batch_size=ANALYTICS_BATCH_SIZE,
+    flush_interval_ms=ANALYTICS_FLUSH_MS,
+    capacity=ANALYTICS_BUFFER_CAPACITY,
+)
+analytics_rollups = AnalyticsRollups(analytics_collection, db["analytics_rollups"], raw_ttl_days=ANALYTICS_RAW_TTL_DAYS)
+analytics_buffer.subscribe(analytics_rollups.apply) # per-minute/per-hour counts updated on every flush
+recommendation_table = RecommendationTable(
+    k=REC_TABLE_K,
+    candidates=REC_CONTENT_CANDIDATES,
+    content_weight=REC_CONTENT_WEIGHT,
+    view_weight=REC_VIEW_WEIGHT,
+    cart_weight=REC_CART_WEIGHT,
+    window=REC_SESSION_WINDOW,
+    refresh_interval=REC_REFRESH_SECONDS,
+    rotate_interval=REC_COUNTS_ROTATE_DAYS * 86400,
+)
+analytics_buffer.subscribe(recommendation_table.apply) # co-view/co-cart counts from every flush
 
 # Pydantic Models for Cart Items and Requests
 class CartItem(BaseModel):
@@ -92,43 +286,25 @@ class RemoveFromCartRequest(BaseModel):
 
 # --- Load product data (modified to store in MongoDB) ---
 async def load_products_to_mongodb():
-    if await products_collection.count_documents({}) == 0: # Only load if collection is empty
+    if await products_collection.find_one({}, {"_id": 1}) is None: # Only load if collection is empty
         try:
+            import pandas as pd # only needed for this one-off seed
             products_df = pd.read_json('data/products.json')
             products_df['id'] = products_df['id'].astype(str).str.strip()
 
-            image_dict = {}
-            image_cache_path = 'data/product_images.json'
-            if os.path.exists(image_cache_path):
-                with open(image_cache_path, "r") as f:
-                    image_dict = json.load(f)
-
-            def fetch_serp_image(product_name):
-                try:
-                    search = GoogleSearch({
-                        "q": product_name,
-                        "tbm": "isch",
-                        "api_key": SERPAPI_KEY
-                    })
-                    results = search.get_dict()
-                    return results["images_results"][0]["original"]
-                except Exception:
-                    return "https://via.placeholder.com/600"
-
-            def get_or_cache_image(product_name):
-                if product_name in image_dict:
-                    return image_dict[product_name]
-                image_url = fetch_serp_image(product_name)
-                image_dict[product_name] = image_url
-                return image_url
-
-            products_df["image"] = products_df["name"].apply(get_or_cache_image)
-
-            with open(image_cache_path, "w") as f:
-                json.dump(image_dict, f, indent=2)
-
-            # Store products in MongoDB
+            # Looked up concurrently; names already in data/product_images.json aren't searched again
+            image_urls = await resolve_image_urls(
+                products_df["name"].tolist(),
+                make_provider(IMAGE_SEARCH_PROVIDER, api_key=SERPAPI_KEY, url=IMAGE_SEARCH_URL),
+                "data/product_images.json",
+                concurrency=IMAGE_SEARCH_CONCURRENCY,
+            )
+            products_df["image"] = products_df["name"].map(image_urls)
+
+            # Store products in MongoDB, with their review sentiment summarised up front
             products_to_insert = products_df.to_dict(orient="records")
+            for product in products_to_insert:
+                product["sentimentSummary"] = await product_sentiment_summary(product)
             await products_collection.insert_many(products_to_insert)
             print("Products loaded to MongoDB.")
 
@@ -137,52 +313,293 @@ async def load_products_to_mongodb():
     else:
         print("Products already exist in MongoDB. Skipping initial load.")
 
+async def product_sentiment_summary(product):
+    texts = [r.get("text", "") for r in product.get("reviews") or [] if isinstance(r, dict)]
+    await models.aget("vader")
+    return aggregate(await sentiment_scorer.score_many(texts))
+
+async def backfill_product_sentiment():
+    # Catalogs loaded before sentimentSummary existed get it computed once; the cache picks up the writes
+    ops = []
+    for product in catalog_cache.all():
+        if "sentimentSummary" not in product:
+            summary = await product_sentiment_summary(product)
+            ops.append(UpdateOne({"id": product["id"]}, {"$set": {"sentimentSummary": summary}}))
+    if ops:
+        await products_collection.bulk_write(ops, ordered=False)
+        await catalog_cache.load()
+        print(f"Computed sentiment summaries for {len(ops)} products.")
+
 # Run this on startup
 @app.on_event("startup")
 async def startup_event():
+    global recommendation_history_until
+    asyncio.get_running_loop().set_default_executor(default_executor)
+    loop_lag.start()
+    if profiler is not None:
+        profiler.start()
     await load_products_to_mongodb()
+    await ensure_indexes(db)
+    await analytics_rollups.ensure_indexes()
+    migrated = await backfill_cart_totals(users_collection)
+    if migrated:
+        print(f"Backfilled cart totals for {migrated} users.")
+    await catalog_cache.load()
+    await backfill_product_sentiment()
+    search_index.compile_all() # before catalog sync starts changing it
+    catalog_cache.start()
+    clip_image_encoder.start()
+    recommendation_history_until = ObjectId() # events flushed from here on reach the table live
+    analytics_buffer.start()
+    # Everything model-related happens once the server is already answering (see /health/ready)
+    task = asyncio.create_task(warm_up())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def warm_up():
+    # A failure here is kept in warm_up_error so /health/ready stays 503 and says why
+    global warm_up_done, warm_up_error
+    if MODEL_LOADING == "background":
+        try:
+            await models.warm()
+        except Exception as e:
+            warm_up_error = f"model warm-up failed: {e}"
+            print(f"WARNING: {warm_up_error}")
+    try:
+        await setup_vectorization()
+        warm_up_done = True
+    except Exception as e:
+        warm_up_error = f"vectorization failed: {e}"
+        print(f"WARNING: {warm_up_error}")
+    try:
+        await build_recommendation_table()
+    except Exception as e:
+        print(f"WARNING: recommendation table build failed: {e}")
+    await build_image_derivatives()
+
+def build_content_neighbors(products, product_matrix, text_embeddings):
+    # Worker thread: blockwise similarity over the whole catalog, cached while the catalog and
+    # settings are unchanged
+    store = EmbeddingStore(EMBEDDING_STORE_DIR, CLIP_MODEL_NAME) if EMBEDDING_STORE_DIR else None
+    fingerprint = None
+    if store is not None:
+        settings = f"{REC_CONTENT_CANDIDATES}:{REC_TFIDF_WEIGHT}:{text_embeddings is not None}"
+        fingerprint = f"{store.catalog_fingerprint(products, [p['name'] for p in products])}:{settings}"
+        cached = store.load_neighbors(fingerprint)
+        if cached is not None:
+            return cached
+    matrices, weights = [product_matrix], [1.0]
+    if text_embeddings is not None:
+        matrices.append(text_embeddings)
+        weights = [REC_TFIDF_WEIGHT, 1 - REC_TFIDF_WEIGHT]
+    rows, sims = content_neighbors(matrices, weights, REC_CONTENT_CANDIDATES)
+    if store is not None:
+        store.save_neighbors(fingerprint, rows, sims)
+    return rows, sims
+
+async def load_recommendation_history():
+    # Co-views replayed from the raw events written before this process started, co-carts from
+    # the carts as they are now; after that both come from analytics_buffer flushes
+    since = datetime.utcnow() - timedelta(days=REC_HISTORY_DAYS)
+    query = {
+        "eventName": "product_viewed",
+        "timestamp": {"$gte": since},
+        "_id": {"$lt": recommendation_history_until},
+    }
+    # Past the cap only the newest REC_HISTORY_MAX_EVENTS count: find the oldest timestamp among them
+    # (newest first on the eventName/timestamp index), then replay from there in time order
+    newest_first = analytics_collection.find(query, {"_id": 0, "timestamp": 1}).sort("timestamp", -1)
+    oldest = await newest_first.skip(REC_HISTORY_MAX_EVENTS - 1).limit(1).to_list(1)
+    if oldest:
+        query["timestamp"] = {"$gte": oldest[0]["timestamp"]}
+    projection = {"_id": 0, "eventName": 1, "eventData.productId": 1, "userId": 1, "sessionId": 1}
+    cursor = analytics_collection.find(query, projection).sort("timestamp", 1)
+    batch = []
+    async for event in cursor:
+        batch.append(event)
+        if len(batch) >= 10_000:
+            recommendation_table.add_events(batch)
+            batch = []
+    recommendation_table.add_events(batch)
+    carts = [
+        [line.get("productId") for line in user.get("cart") or []]
+        async for user in users_collection.find({"cart.1": {"$exists": True}}, {"_id": 0, "cart.productId": 1})
+    ]
+    recommendation_table.add_carts(carts)
+
+async def build_recommendation_table():
+    global recommendation_history_loaded
+    if product_matrix is None:
+        return
+    products = product_data_for_vectorization
+    rows, sims = await asyncio.to_thread(build_content_neighbors, products, product_matrix, text_embeddings)
+    if not recommendation_history_loaded:
+        await load_recommendation_history()
+        recommendation_history_loaded = True
+    await recommendation_table.rebuild(products, rows, sims)
+    recommendation_table.start()
+    print(f"Recommendation table: {len(products)} products, {recommendation_table.snapshot()['coViewPairs']} co-view pairs.")
+
+async def build_image_derivatives():
+    # Variants + CLIP image embeddings, in the background so startup isn't held up by a cold build.
+    # The embeddings use the pixels decoded for the variants; with EMBEDDING_STORE_DIR="" only the
+    # variants are built.
+    global image_embedding_products, image_embeddings
+    try:
+        if not EMBEDDING_STORE_DIR:
+            await image_variant_store.build()
+            return
+        image_embedding_products, image_embeddings = await sync_image_embeddings(
+            image_variant_store,
+            EmbeddingStore(os.path.join(EMBEDDING_STORE_DIR, "images"), CLIP_MODEL_NAME),
+            catalog_cache.all(),
+            clip_encode,
+        )
+        attach_image_embeddings()
+    except Exception as e:
+        print(f"WARNING: image variant/embedding build failed: {e}")
+
+def attach_image_embeddings():
+    # The image build runs in the background, so this is called by whichever of it and
+    # setup_vectorization finishes last
+    if visual_index is None or image_embeddings is None:
+        return
+    pairs = [
+        (product_row_by_id[str(p.get("id"))], i)
+        for i, p in enumerate(image_embedding_products) if str(p.get("id")) in product_row_by_id
+    ]
+    if pairs:
+        rows, image_rows = zip(*pairs)
+        visual_index.set_image_vectors(list(rows), image_embeddings[list(image_rows)])
+        print(f"Visual search: {len(pairs)} product images indexed.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await clip_image_encoder.stop()
+    await analytics_buffer.stop() # flushes whatever is still buffered
+    await recommendation_table.stop()
+    await catalog_cache.stop()
+    password_hasher.shutdown()
+    sentiment_scorer.shutdown()
+    translation_service.shutdown()
+    receipt_jobs.shutdown()
+    await loop_lag.stop()
+    if profiler is not None:
+        profiler.stop()
 
 # Vectorization (now done on products fetched from MongoDB)
 product_data_for_vectorization = []
-vectorizer = TfidfVectorizer()
+vectorizer = None
 product_matrix = None
 text_embeddings = None
+name_index = None # TF-IDF index over product names, used by /recommendations
+visual_index = None # CLIP name + image embeddings, used by /visual-search
+product_row_by_id = {} # product 'id' -> row in product_data_for_vectorization
+warm_up_done = False # set once the search indexes are built
+warm_up_error = None # why warm-up failed, reported by /health/ready
+background_tasks = set() # keeps startup background tasks referenced until they finish
+image_embedding_products = [] # products with a local image, aligned with image_embeddings
+image_embeddings = None # CLIP image embeddings, built by build_image_derivatives
+recommendation_history_until = None # ObjectId bound for the event history replay
+recommendation_history_loaded = False
+
+def analytics_event_doc(event: AnalyticsEvent):
+    # Add a timestamp if not provided by the frontend (though frontend often provides it)
+    if not event.timestamp:
+        event.timestamp = datetime.utcnow()
+    # Convert Pydantic model to dictionary for MongoDB insertion
+    return event.dict()
 
 @app.post("/api/analytics/track")
 async def track_analytics_event(event: AnalyticsEvent):
+    # Buffered; written to MongoDB in batches by analytics_buffer
     try:
-        # Add a timestamp if not provided by the frontend (though frontend often provides it)
-        if not event.timestamp:
-            event.timestamp = datetime.utcnow()
-
-        # Convert Pydantic model to dictionary for MongoDB insertion
-        event_data_dict = event.dict()
-        await analytics_collection.insert_one(event_data_dict)
-        print(f"Analytics event tracked: {event.eventName} for user: {event.userId}") # For backend console visibility
-        return {"message": "Analytics event tracked successfully"}
-    except Exception as e:
-        # Log the error on the backend for debugging
-        print(f"ERROR: Failed to track analytics event: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to track analytics event: {str(e)}")
+        analytics_buffer.add(analytics_event_doc(event))
+    except BufferFullError:
+        raise HTTPException(status_code=503, detail="Analytics is overloaded, event dropped.", headers={"Retry-After": "1"})
+    return {"message": "Analytics event tracked successfully"}
+
+@app.post("/api/analytics/track/batch")
+async def track_analytics_events(events: List[AnalyticsEvent]):
+    if len(events) > ANALYTICS_MAX_BATCH_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {ANALYTICS_MAX_BATCH_REQUEST} events per batch.")
+    try:
+        analytics_buffer.add_many([analytics_event_doc(e) for e in events])
+    except BufferFullError:
+        raise HTTPException(status_code=503, detail="Analytics is overloaded, events dropped.", headers={"Retry-After": "1"})
+    return {"message": "Analytics events tracked successfully", "count": len(events)}
+
+@app.get("/api/analytics/summary")
+async def analytics_summary(hours: float = 24, eventName: Optional[str] = None, top: int = 10):
+    # Answered from the rollups, never from a scan of raw events
+    if hours <= 0:
+        raise HTTPException(status_code=400, detail="hours must be positive.")
+    until = datetime.utcnow()
+    since = until - timedelta(hours=hours)
+    granularity, event_counts = await analytics_rollups.event_counts(since, until, eventName)
+    _, top_products = await analytics_rollups.top_products(since, until, eventName, limit=max(1, min(top, 100)))
+    return {
+        "since": since,
+        "until": until,
+        "granularity": granularity,
+        "eventCounts": event_counts,
+        "topProducts": top_products,
+    }
 
 
-@app.on_event("startup")
-async def setup_vectorization():
-    global product_data_for_vectorization, vectorizer, product_matrix, text_embeddings
-    products_from_db = await products_collection.find().to_list(length=None)
-    product_data_for_vectorization = products_from_db # Store for later use
-    if product_data_for_vectorization:
-        product_names = [p['name'] for p in product_data_for_vectorization]
+def build_vector_indexes(products):
+    # CPU-bound (TF-IDF fit, CLIP encode of new names, index build), so it runs on a worker thread.
+    # With a warm embedding store CLIP isn't loaded here at all.
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    product_names = [p['name'] for p in products]
+    if EMBEDDING_STORE_DIR:
+        # Reuse vectors from disk and only encode products that are new or whose name changed
+        store = EmbeddingStore(EMBEDDING_STORE_DIR, CLIP_MODEL_NAME)
+        fingerprint = store.catalog_fingerprint(products, product_names)
+        vectorizer, product_matrix = store.load_tfidf(fingerprint)
+        if vectorizer is None:
+            vectorizer = TfidfVectorizer()
+            product_matrix = vectorizer.fit_transform(product_names)
+            store.save_tfidf(fingerprint, vectorizer, product_matrix)
+        text_embeddings = store.sync(products, product_names, clip_encode)
+    else:
         vectorizer = TfidfVectorizer()
         product_matrix = vectorizer.fit_transform(product_names)
-        text_embeddings = clip_model.encode(product_names, convert_to_tensor=True)
-    else:
+        text_embeddings = clip_encode(product_names, convert_to_numpy=True)
+
+    categories = [p.get('category') for p in products]
+    # TF-IDF rows are sparse and already small, so they always use the exact backend
+    name_index = build_index(product_matrix, "exact", categories=categories)
+    visual_index = FusedVisualIndex(text_embeddings, categories, VECTOR_SEARCH_BACKEND, image_weight=VISUAL_SEARCH_IMAGE_WEIGHT)
+    return vectorizer, product_matrix, text_embeddings, name_index, visual_index
+
+async def setup_vectorization():
+    global product_data_for_vectorization, vectorizer, product_matrix, text_embeddings
+    global name_index, visual_index, product_row_by_id
+    products = catalog_cache.all() # Loaded by startup_event
+    if not products:
         print("No products found in DB for vectorization.")
+        return
+    vectorizer, product_matrix, text_embeddings, new_name_index, new_visual_index = await asyncio.to_thread(build_vector_indexes, products)
+    product_data_for_vectorization = products
+    product_row_by_id = {str(p.get('id')): i for i, p in enumerate(products)}
+    name_index, visual_index = new_name_index, new_visual_index
+    attach_image_embeddings()
 
 # --- Request models (existing) ---
 class ReviewRequest(BaseModel):
     review: str
 
+class BatchTranslateRequest(BaseModel):
+    reviews: Optional[List[str]] = None
+    productId: Optional[str] = None
+    langCode: str = "auto"
+    target: str = "en"
+
+class BatchSentimentRequest(BaseModel):
+    reviews: Optional[List[str]] = None
+    productId: Optional[str] = None
+
 class ChatRequest(BaseModel):
     query: str
 
@@ -214,76 +631,257 @@ class LoginIn(BaseModel):
 def home():
     return {"status": "AI Backend running via FastAPI + Groq"}
 
+PRODUCT_PAGE_MAX = 100
+FIELD_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def parse_fields(fields: Optional[str]):
+    # "id,name,price" -> Mongo projection; list pages skip reviews unless asked for explicitly
+    if not fields:
+        return {"reviews": 0}
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    if not names or not all(FIELD_NAME_RE.match(n) for n in names):
+        raise HTTPException(status_code=400, detail="Invalid fields parameter.")
+    projection = {n: 1 for n in names}
+    projection["_id"] = 1 # needed to build the next cursor
+    return projection
+
 @app.get("/products")
-async def get_products():
-    # Fetch products directly from MongoDB
-    products_list = await products_collection.find().to_list(length=None)
-    # Convert ObjectId to string for JSON serialization
-    for product in products_list:
-        product['_id'] = str(product['_id'])
-    return products_list
+async def get_products(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fields: Optional[str] = None,
+):
+    paged = any(v is not None for v in (limit, cursor, category, subcategory, min_price, max_price, fields))
+    if paged:
+        return await get_products_page(limit, cursor, category, subcategory, min_price, max_price, fields)
+
+    # Full catalog: served from the in-process catalog cache as pre-serialised JSON; no DB round-trip
+    body, etag = await catalog_cache.json_blob_async()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def get_products_page(limit, cursor, category, subcategory, min_price, max_price, fields):
+    limit = max(1, min(limit or 24, PRODUCT_PAGE_MAX))
+    query = {}
+    if category is not None:
+        query["category"] = category
+    if subcategory is not None:
+        query["subcategory"] = subcategory
+    # Keyset pagination: stable under inserts and O(limit) regardless of page depth. Price ranges are
+    # paged in (price, _id) order so the (price, _id) indexes serve them without a blocking sort; their
+    # cursor is "<price>:<_id>", otherwise it's the last _id.
+    by_price = min_price is not None or max_price is not None
+    if by_price:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if cursor:
+        try:
+            if by_price:
+                price, last_id = cursor.split(":", 1)
+                price, last_id = float(price), ObjectId(last_id)
+                query["$or"] = [{"price": {"$gt": price}}, {"price": price, "_id": {"$gt": last_id}}]
+            else:
+                query["_id"] = {"$gt": ObjectId(cursor)}
+        except (InvalidId, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    projection = parse_fields(fields)
+    if by_price and fields:
+        projection["price"] = 1 # needed for the cursor, like _id
+    sort = [("price", 1), ("_id", 1)] if by_price else [("_id", 1)]
+    docs = await products_collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    next_cursor = None
+    if has_more:
+        next_cursor = f"{docs[-1]['price']!r}:{docs[-1]['_id']}" if by_price else docs[-1]["_id"]
+    return {"items": docs, "next_cursor": next_cursor}
+
+@app.get("/products/{product_id}/image")
+async def get_product_image(product_id: str, request: Request, w: int = 320):
+    # Redirects to the best pre-rendered variant for this width and the client's Accept header.
+    # Short-lived (the variant changes if the image does); the target itself is immutable.
+    product = catalog_cache.get(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    variant = image_variant_store.pick(product_image_name(product), w, request.headers.get("accept", ""))
+    if variant is None:
+        # Not rendered (yet): fall back to the original image
+        return RedirectResponse(product.get("image") or "/images/placeholder.jpg", status_code=307)
+    return RedirectResponse(
+        f"/image-variants/{variant['file']}",
+        status_code=307,
+        headers={"Cache-Control": "public, max-age=3600", "Vary": "Accept"},
+    )
 
-@app.get("/recommendations")
-async def get_recommendations(product_id: str):
-    if not product_matrix or not text_embeddings:
-        raise HTTPException(status_code=500, detail="Product data not loaded for recommendations.")
+@app.get("/products/{product_id}/stock")
+async def get_product_stock(product_id: str):
+    # Current stock; the copy in the /products catalog blob is as of its last rebuild (stock-only
+    # changes, i.e. every cart update, don't rebuild it)
+    product = catalog_cache.get(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"productId": product_id, "stock": product.get("stock")}
+
+@app.get("/image-variants/{file_name}")
+async def get_image_variant(file_name: str, request: Request):
+    path = image_variant_store.file_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # The file name is a hash of the content, so it doubles as a strong ETag
+    etag = f'"{file_name.split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    fmt = {"avif": "avif", "webp": "webp", "jpg": "jpeg"}[file_name.rsplit(".", 1)[1]]
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+@app.get("/products/{product_id}/reviews")
+async def get_product_reviews(product_id: str, offset: int = 0, limit: int = 20):
+    product = catalog_cache.get(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    reviews = product.get("reviews") or []
+    offset = max(0, offset)
+    limit = max(1, min(limit, PRODUCT_PAGE_MAX))
+    return {
+        "productId": product_id,
+        "total": len(reviews),
+        "offset": offset,
+        "reviews": reviews[offset:offset + limit],
+    }
 
-    # Find the product by its 'id' field (which comes from the original JSON, not MongoDB's _id)
-    try:
-        product_doc = await products_collection.find_one({"id": product_id})
-        if not product_doc:
+@app.get("/recommendations")
+async def get_recommendations(product_id: str, k: int = 3, category: Optional[str] = None):
+    k = max(1, min(k, REC_TABLE_K))
+    hits = recommendation_table.lookup(product_id, k, category)
+    if hits is None:
+        # Table not built yet (or the product is newer than it): similarity pass over the names
+        if name_index is None:
+            raise HTTPException(status_code=503, detail="Recommendations are warming up, please retry shortly.", headers={"Retry-After": "2"})
+        # Look the product up by its 'id' field (which comes from the original JSON, not MongoDB's _id)
+        row = product_row_by_id.get(product_id)
+        if row is None:
             raise HTTPException(status_code=404, detail="Product ID not found")
-        product_name = product_doc['name']
-    except Exception:
-        raise HTTPException(status_code=404, detail="Product ID not found")
+        hits = [
+            (str(product_data_for_vectorization[idx].get('id')), score)
+            for idx, score in name_index.search(product_matrix[row], k=k, category=category, exclude=row)
+        ]
 
-    vec = vectorizer.transform([product_name])
-    sims = cosine_similarity(vec, product_matrix).flatten()
-    indices = sims.argsort()[::-1][1:4] # Get top 3 (excluding itself)
-
-    # Map indices back to original product data for names and images
     results = []
-    for idx in indices:
-        # Assuming product_data_for_vectorization still holds the original DataFrame structure or similar
-        # A more robust way would be to fetch by a unique identifier if possible
-        matched_product = product_data_for_vectorization[idx]
+    for matched_id, score in hits:
+        matched_product = catalog_cache.get(matched_id)
+        if matched_product is None:
+            continue # deleted since the table was built
         results.append({
             "id": matched_product.get('id', str(matched_product.get('_id'))), # Use 'id' or '_id'
             "name": matched_product['name'],
-            "image": matched_product.get('image', 'https://via.placeholder.com/600')
+            "image": matched_product.get('image', 'https://via.placeholder.com/600'),
+            "score": round(score, 4)
         })
     return {"recommended_products": results}
 
+def search_item(product, score):
+    return {
+        "id": product.get("id"),
+        "name": product.get("name"),
+        "category": product.get("category"),
+        "subcategory": product.get("subcategory"),
+        "price": product.get("price"),
+        "image": product.get("image", "https://via.placeholder.com/600"),
+        "score": round(score, 4),
+    }
+
+async def semantic_rerank(q, lexical_hits, limit, category):
+    # Union of the BM25 candidates and the nearest CLIP name embeddings, each scored exactly in
+    # both spaces and blended
+    embedding = search_query_embeddings.get(q)
+    if embedding is None:
+        embedding = (await asyncio.to_thread(clip_encode, [q], convert_to_numpy=True))[0].astype(np.float32)
+        embedding /= np.linalg.norm(embedding) or 1.0
+        search_query_embeddings.set(q, embedding)
+
+    index = visual_index
+    rows = {product_row_by_id[pid] for pid, _ in lexical_hits if pid in product_row_by_id}
+    rows.update(row for row, _ in index.text_index.search(embedding, k=limit * SEARCH_OVERFETCH, category=category))
+    rows = sorted(rows)
+    cosine = index.text_vectors[rows] @ embedding
+    semantic = {str(product_data_for_vectorization[row].get("id")): float(c) for row, c in zip(rows, cosine)}
+    lexical = dict(lexical_hits)
+    lexical.update((pid, 0.0) for pid in semantic if pid not in lexical)
+    return blend(lexical, semantic, SEARCH_SEMANTIC_WEIGHT)
+
+@app.get("/search")
+async def search_products(q: str, limit: int = 20, category: Optional[str] = None, semantic: bool = False):
+    # The last word is matched as a prefix, so this also serves search-as-you-type
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    hits = search_index.search(q, k=limit * SEARCH_OVERFETCH if semantic else limit, category=category)
+    blended = False
+    if semantic and q.strip() and visual_index is not None:
+        hits = await semantic_rerank(q.strip(), hits, limit, category)
+        blended = True
+    items = []
+    for pid, score in hits:
+        product = catalog_cache.get(pid)
+        if product is not None:
+            items.append(search_item(product, score))
+        if len(items) == limit:
+            break
+    return {"query": q, "semantic": blended, "total": len(items), "items": items}
+
+@app.get("/search/autocomplete")
+async def search_autocomplete(q: str, limit: int = 8):
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    terms = tokenize(q)
+    completions = []
+    if terms and not q[-1].isspace():
+        head = " ".join(terms[:-1])
+        completions = [f"{head} {term}".strip() for term in search_index.complete(terms[-1], limit)]
+    products = [catalog_cache.get(pid) for pid, _ in search_index.search(q, k=limit)]
+    return {
+        "query": q,
+        "completions": completions,
+        "products": [{"id": p.get("id"), "name": p.get("name")} for p in products if p is not None],
+    }
 
 @app.post("/analyze-review")
-def analyze_review(payload: ReviewRequest):
-    scores = sentiment_analyzer.polarity_scores(payload.review)
-    sentiment = "positive" if scores["compound"] > 0.3 else "negative" if scores["compound"] < -0.3 else "neutral"
-    return {"sentiment": sentiment, "scores": scores}
+async def analyze_review(payload: ReviewRequest):
+    await models.aget("vader")  # first call loads the lexicon off the event loop
+    scores = sentiment_scorer.score(payload.review)
+    return {"sentiment": classify(scores["compound"]), "scores": scores}
+
+CHATBOT_SYSTEM_PROMPT = (
+    "You are SmartShop AI — a friendly, helpful shopping assistant. "
+    "Always respond in 3-5 short bullet points. "
+    "Keep replies under 100 words. "
+    "Avoid tech jargon unless asked. "
+    "Reply only to shopping-related queries. "
+    "Use simple language that everyday users understand."
+)
+
+def chatbot_messages(query: str):
+    return [
+        {"role": "system", "content": CHATBOT_SYSTEM_PROMPT},
+        {"role": "user", "content": query}
+    ]
 
 @app.post("/chatbot")
-def chatbot(payload: ChatRequest):
+async def chatbot(payload: ChatRequest):
     try:
-        res = groq_client.chat.completions.create(
-            model="mistral-saba-24b",
-            max_tokens=300,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are SmartShop AI — a friendly, helpful shopping assistant. "
-                        "Always respond in 3-5 short bullet points. "
-                        "Keep replies under 100 words. "
-                        "Avoid tech jargon unless asked. "
-                        "Reply only to shopping-related queries. "
-                        "Use simple language that everyday users understand."
-                    )
-                },
-                {"role": "user", "content": payload.query}
-            ]
-        )
-
-        raw_response = res.choices[0].message.content
+        # Cached and de-duplicated; identical questions share one Groq call
+        raw_response = await llm.complete(GROQ_MODEL, chatbot_messages(payload.query), max_tokens=300)
         html_response = markdown.markdown(raw_response)
         return {
             "response_raw": raw_response,
@@ -293,19 +891,93 @@ def chatbot(payload: ChatRequest):
     except Exception as e:
         return {"error": f"Groq API error: {str(e)}"}
 
+@app.post("/chatbot/stream")
+async def chatbot_stream(payload: ChatRequest, request: Request):
+    # Server-Sent Events: "token" per delta, "block" with HTML for each finished markdown block,
+    # then "done" with the full raw + HTML answer (or "error")
+    async def events():
+        renderer = MarkdownBlockRenderer(markdown.markdown)
+        parts = []
+        tokens = llm.stream(GROQ_MODEL, chatbot_messages(payload.query), max_tokens=300)
+        try:
+            async for delta in tokens:
+                if await request.is_disconnected():
+                    return # finally closes the upstream stream, cancelling generation
+                parts.append(delta)
+                yield sse("token", {"text": delta})
+                for html in renderer.feed(delta):
+                    yield sse("block", {"html": html})
+        except Exception as e:
+            yield sse("error", {"error": f"Groq API error: {str(e)}"})
+            return
+        finally:
+            await tokens.aclose()
+
+        for html in renderer.finish():
+            yield sse("block", {"html": html})
+        raw_response = "".join(parts)
+        yield sse("done", {"response_raw": raw_response, "response_html": markdown.markdown(raw_response)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/reviews/translate")
-def translate_review(payload: TranslateRequest):
+async def translate_review(payload: TranslateRequest):
     try:
-        translated = GoogleTranslator(source=payload.langCode, target='en').translate(payload.reviewText)
+        translated = await translation_service.translate(payload.reviewText, payload.langCode, "en")
         return {"translated": translated}
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/reviews/translate/batch")
+async def translate_reviews_batch(payload: BatchTranslateRequest):
+    # Either explicit review texts or every review of a product; failed items come back as null
+    if payload.productId is not None:
+        product = catalog_cache.get(payload.productId)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        texts = [r.get("text", "") for r in product.get("reviews") or [] if isinstance(r, dict)]
+    else:
+        texts = payload.reviews or []
+    if len(texts) > TRANSLATION_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {TRANSLATION_MAX_BATCH} reviews per batch.")
+
+    try:
+        translated = await translation_service.translate_many(texts, payload.langCode, payload.target)
+    except TranslationInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranslationUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"translations": [{"original": t, "translated": tr} for t, tr in zip(texts, translated)]}
+
 @app.post("/reviews/sentiment")
-def review_sentiment(payload: ReviewRequest):
-    scores = sentiment_analyzer.polarity_scores(payload.review)
-    sentiment = "positive" if scores['compound'] > 0.3 else "negative" if scores['compound'] < -0.3 else "neutral"
-    return {"sentiment": sentiment, "score": scores['compound']}
+async def review_sentiment(payload: ReviewRequest):
+    await models.aget("vader")
+    scores = sentiment_scorer.score(payload.review)
+    return {"sentiment": classify(scores["compound"]), "score": scores['compound']}
+
+@app.post("/reviews/sentiment/batch")
+async def review_sentiment_batch(payload: BatchSentimentRequest):
+    # Either explicit review texts or every review of a product (from the catalog cache)
+    if payload.productId is not None:
+        product = catalog_cache.get(payload.productId)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        texts = [r.get("text", "") for r in product.get("reviews") or [] if isinstance(r, dict)]
+    else:
+        texts = payload.reviews or []
+    if len(texts) > SENTIMENT_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {SENTIMENT_MAX_BATCH} reviews per batch.")
+
+    await models.aget("vader")
+    scores = await sentiment_scorer.score_many(texts)
+    return {
+        "results": [{"sentiment": classify(s["compound"]), "score": s["compound"]} for s in scores],
+        "summary": aggregate(scores),
+    }
 
 @app.post("/reviews/check")
 def fake_review_check(payload: FakeReviewRequest):
@@ -314,46 +986,111 @@ def fake_review_check(payload: FakeReviewRequest):
     return {"isFake": is_fake == "fake", "confidence": round(confidence, 2)}
 
 @app.post("/cart/summary")
-def cart_summary(payload: CartSummaryRequest):
-    prompt = f"Generate a short promotional sales pitch for the following products: {', '.join(payload.cartItems)}"
+async def cart_summary(payload: CartSummaryRequest):
+    # Sorted so the same cart in a different order hits the same cache entry
+    prompt = f"Generate a short promotional sales pitch for the following products: {', '.join(sorted(payload.cartItems))}"
     try:
-        # Assuming `client` here refers to the Groq client, not the Mongo client
-        res = groq_client.chat.completions.create( # Changed `client` to `groq_client`
-            model="mistral-saba-24b",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return {"summaryText": res.choices[0].message.content}
+        summary = await llm.complete(GROQ_MODEL, [{"role": "user", "content": prompt}])
+        return {"summaryText": summary}
     except Exception as e:
         return {"error": str(e)}
 
-@app.post("/receipt")
-def generate_receipt(data: ReceiptRequest):
-    receipt_id = str(uuid.uuid4())[:8]
-    file_path = f"receipts/{receipt_id}.pdf"
-    os.makedirs("receipts", exist_ok=True)
-    html_content = f"<h1>Receipt ID: {receipt_id}</h1><ul>"
-    for k, v in data.orderDetails.items():
-        html_content += f"<li><strong>{k}</strong>: {v}</li>"
-    html_content += "</ul>"
-    pdfkit.from_string(html_content, file_path)
-    return {"downloadLink": f"/static/receipts/{receipt_id}.pdf"}
+@app.post("/receipt", status_code=202)
+async def generate_receipt(data: ReceiptRequest):
+    # Rendering happens on the receipt process pool; the download link works once the job is done
+    try:
+        job_id = receipt_jobs.submit(data.orderDetails)
+    except ReceiptQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return {
+        "jobId": job_id,
+        "status": "pending",
+        "statusUrl": f"/receipt/{job_id}",
+        "downloadLink": f"/receipt/{job_id}/download",
+    }
+
+@app.get("/receipt/{job_id}")
+async def receipt_status(job_id: str):
+    status = receipt_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return status
+
+@app.get("/receipt/{job_id}/download")
+async def download_receipt(job_id: str):
+    status = await receipt_jobs.wait(job_id, RECEIPT_DOWNLOAD_WAIT_SECONDS)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    if status["status"] == "pending":
+        raise HTTPException(status_code=409, detail="Receipt is still being generated", headers={"Retry-After": "1"})
+    if status["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Receipt generation failed: {status['error']}")
+    return FileResponse(receipt_jobs.path_for(job_id), media_type="application/pdf", filename=f"receipt-{job_id[:8]}.pdf")
+
+def decode_upload(fileobj):
+    img = decode_image(fileobj, UPLOAD_DECODE_MAX_SIDE, MAX_UPLOAD_BYTES, MAX_UPLOAD_PIXELS)
+    return img, dhash(img)
 
 @app.post("/visual-search")
-async def visual_search(file: UploadFile = File(...)):
-    if not text_embeddings:
-        raise HTTPException(status_code=500, detail="Product data not loaded for visual search.")
-
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    img = Image.open(file_path).convert("RGB")
-    img_embedding = clip_model.encode([img], convert_to_tensor=True)
-    similarities = util.pytorch_cos_sim(img_embedding, text_embeddings).squeeze().cpu().numpy()
-    best_match_index = similarities.argmax()
-    # Assuming product_data_for_vectorization is a list of dicts
-    matched_product = product_data_for_vectorization[best_match_index]
-    return {"match": matched_product}
+async def visual_search(file: UploadFile = File(...), k: int = 1, category: Optional[str] = None):
+    if visual_index is None:
+        raise HTTPException(status_code=503, detail="Visual search is warming up, please retry shortly.", headers={"Retry-After": "2"})
+
+    try:
+        # Decode from the spooled upload buffer in the threadpool; no disk round-trip
+        img, phash = await run_in_threadpool(decode_upload, file.file)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (OSError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image.")
+    if SAVE_UPLOADS:
+        await run_in_threadpool(save_upload, file.file, "uploads", file.filename)
+
+    # Same or near-identical photo seen recently: reuse its embedding instead of running CLIP
+    img_embedding = upload_embedding_cache.get(phash)
+    if img_embedding is None:
+        try:
+            # Batched with other concurrent uploads and run off the event loop
+            img_embedding = await clip_image_encoder.encode(img)
+        except QueueFullError:
+            raise HTTPException(status_code=503, detail="Visual search is busy, please retry shortly.", headers={"Retry-After": "1"})
+        upload_embedding_cache.put(phash, img_embedding)
+
+    k = max(1, min(k, 50))
+    hits = visual_index.search(img_embedding, k=k, category=category)
+    if not hits:
+        raise HTTPException(status_code=404, detail="No matching products found.")
+    matches = [
+        {
+            **product_data_for_vectorization[row],
+            "score": round(score, 4),
+            "imageScore": round(image_score, 4) if image_score is not None else None,
+            "textScore": round(text_score, 4),
+        }
+        for row, score, image_score, text_score in hits
+    ]
+    # "match" keeps the single best hit for existing clients
+    return {"match": matches[0], "matches": matches}
+
+@app.get("/health/recommendations")
+async def check_recommendations():
+    return recommendation_table.snapshot()
+
+@app.get("/health/search")
+async def check_search():
+    return {
+        "documents": len(search_index),
+        "terms": len(search_index.postings),
+        "queryEmbeddingCache": len(search_query_embeddings),
+    }
+
+@app.get("/health/visual-search")
+async def check_visual_search():
+    return {
+        "products": len(product_data_for_vectorization),
+        "productImages": visual_index.image_count if visual_index is not None else 0,
+        "uploadCache": upload_embedding_cache.snapshot(),
+    }
 
 @app.post("/api/signup")
 async def signup(user: UserSignup):
@@ -361,46 +1098,105 @@ async def signup(user: UserSignup):
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed_pwd = hash_password(user.password)
+    try:
+        hashed_pwd = await password_hasher.hash(user.password)
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry.", headers={"Retry-After": "1"})
     new_user = {
         "name": user.name,
         "email": user.email,
         "username": user.username,
         "password": hashed_pwd,
         "cart": [],  # Initialize empty cart for new user
+        "cartTotals": dict(EMPTY_TOTALS),
         "orders": []
     }
-    await users_collection.insert_one(new_user)
+    try:
+        await users_collection.insert_one(new_user)
+    except DuplicateKeyError:
+        # Unique indexes on username/email catch races and username clashes the lookup above misses
+        raise HTTPException(status_code=400, detail="User already exists")
     return {"message": "Signup successful"}
 
 @app.post("/auth/login")
 async def login(data: LoginIn):
-    user = await db.users.find_one({"username": data.username})
-    if not user or not verify_password(data.password, user["password"]):
+    user = await db.users.find_one({"username": data.username}, {"username": 1, "email": 1, "password": 1})
+    if not user:
         raise HTTPException(401, "Invalid username or password")
+    try:
+        valid = await password_hasher.verify(data.password, user["password"])
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry.", headers={"Retry-After": "1"})
+    if not valid:
+        raise HTTPException(401, "Invalid username or password")
+
+    if password_hasher.needs_rehash(user["password"]):
+        # Cost factor changed: upgrade the stored hash now that we have the plaintext (best effort)
+        try:
+            new_hash = await password_hasher.hash(data.password)
+            await db.users.update_one({"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+            password_hasher.stats["rehashed"] += 1
+        except HasherBusyError:
+            pass
     return {"username": user["username"], "email": user["email"]}
 
+PROFILE_PROJECTION = {"password": 0, "cart": 0, "orders": 0}
+
 @app.get("/api/user/{email}")
 async def get_user_by_email(email: str): # Renamed to avoid conflict with get_user_by_username
-    user = await users_collection.find_one({"email": email})
+    # Profile only: the cart and order history have their own endpoints
+    user = await users_collection.find_one({"email": email}, PROFILE_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user["_id"] = str(user["_id"])
     return user
 
 @app.get("/auth/user/{username}")
-async def get_user_by_username(username: str):
-    user = await db.users.find_one({"username": username})
+async def get_user_by_username(username: str, include_cart: bool = False):
+    projection = None if include_cart else PROFILE_PROJECTION
+    user = await db.users.find_one({"username": username}, projection)
     if not user:
         raise HTTPException(404, "User not found")
-    # Ensure cart and orders fields exist, even if empty
-    return {
+    profile = {
         "username": user["username"],
         "email": user["email"],
         "name": user["name"],
-        "cart": user.get("cart", []),
-        "orders": user.get("orders", [])
+        "cartSummary": totals_response(user),
     }
+    if include_cart:
+        # Ensure cart and orders fields exist, even if empty
+        profile["cart"] = user.get("cart", [])
+        profile["orders"] = user.get("orders", [])
+    return profile
+
+# Queue depths of the in-process workers, read at scrape time
+REGISTRY.register(GaugeFunction("work_queue_depth", "Items waiting in in-process queues", lambda: {
+    ("analytics_buffer",): len(analytics_buffer),
+    ("clip_encoder",): clip_image_encoder.queue.qsize() if clip_image_encoder.queue is not None else 0,
+    ("password_hasher",): password_hasher.pending,
+    ("receipts",): receipt_jobs.pending,
+    ("recommendation_table",): len(recommendation_table.dirty),
+}, ("queue",)))
+REGISTRY.register(GaugeFunction("llm_cache_lookups_total", "LLM cache lookups by outcome", lambda: {
+    (k,): llm.stats[k] for k in ("hits", "misses", "coalesced")
+}, ("outcome",), kind="counter"))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/health/live")
+async def liveness():
+    # The process is up and the event loop responds; nothing else is checked
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    # Ready once the search indexes are built and (unless MODEL_LOADING=lazy) the models are loaded
+    ready = warm_up_done and warm_up_error is None and (MODEL_LOADING == "lazy" or models.ready())
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "indexes": warm_up_done, "error": warm_up_error, "modelLoading": MODEL_LOADING, **models.snapshot()}
 
 @app.get("/health/db")
 async def check_db_connection():
@@ -410,173 +1206,100 @@ async def check_db_connection():
     except Exception as e:
         return {"status": "disconnected", "error": str(e)}
 
+@app.get("/health/receipts")
+async def check_receipts():
+    return receipt_jobs.snapshot()
+
+@app.get("/health/translation")
+async def check_translation():
+    # Cache hit counts and circuit-breaker state for the translator
+    return translation_service.snapshot()
+
+@app.get("/health/llm")
+async def check_llm_cache():
+    # Cache hit ratio and latency saved by the LLM response cache
+    return llm.snapshot()
+
+@app.get("/health/auth")
+async def check_auth_pool():
+    # bcrypt pool load and timings (queue wait vs hashing time)
+    return password_hasher.snapshot()
+
 # --- NEW CART ROUTES ---
 
+async def run_cart_op(op, *args):
+    # With CART_TRANSACTIONS=1 the cart write and the stock write commit together (needs a replica set)
+    if CART_TRANSACTIONS:
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                return await op(*args, session=session)
+    return await op(*args)
+
+def cart_error_to_http(e: CartError):
+    if isinstance(e, UserNotFound):
+        return HTTPException(status_code=404, detail="User not found")
+    if isinstance(e, ItemNotInCart):
+        return HTTPException(status_code=404, detail="Product not found in cart.")
+    if isinstance(e, InsufficientStock):
+        return HTTPException(status_code=400, detail=f"Not enough stock. Available: {e.available} more units.")
+    return HTTPException(status_code=409, detail=str(e))
+
 @app.post("/cart/add")
 async def add_to_cart(payload: AddToCartRequest):
-    user = await users_collection.find_one({"username": payload.username})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    product = await products_collection.find_one({"id": payload.productId}) # Using 'id' from JSON
+    product = catalog_cache.get(payload.productId) # Using 'id' from JSON
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     if payload.quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be positive.")
 
-    # --- REMOVED STOCK CHECKING LOGIC ---
-    # product_stock = int(product.get("stock", 0))
-    # if product_stock < payload.quantity:
-    #     raise HTTPException(status_code=400, detail=f"Not enough stock for {product['name']}. Available: {product_stock}")
-    # --- END REMOVED STOCK CHECKING LOGIC ---
-
-    # Initialize cart if it doesn't exist
-    if "cart" not in user or not isinstance(user["cart"], list):
-        user["cart"] = []
-
-    # Check if product is already in cart
-    existing_item_index = -1
-    for i, item in enumerate(user["cart"]):
-        if item["productId"] == payload.productId:
-            existing_item_index = i
-            break
-
-    if existing_item_index != -1:
-        # Product exists, update quantity
-        user["cart"][existing_item_index]["quantity"] += payload.quantity
-    else:
-        # Product not in cart, add new item
-        new_cart_item = {
-            "productId": product["id"], # Store the 'id' from your products.json
-            "name": product["name"],
-            "price": float(product["price"]), # Ensure price is float
-            "quantity": payload.quantity,
-            "image": product.get("image")
-        }
-        user["cart"].append(new_cart_item)
-
-    # Recalculate total price
-    total_price = sum(item["price"] * item["quantity"] for item in user["cart"])
-
-    # Update user's cart in MongoDB
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cart": user["cart"], "updatedAt": datetime.utcnow()}}
-    )
-
-    # --- REMOVED STOCK DECREMENTING LOGIC ---
-    # await products_collection.update_one(
-    #     {"id": payload.productId},
-    #     {"$inc": {"stock": -payload.quantity}}
-    # )
-    # --- END REMOVED STOCK DECREMENTING LOGIC ---
+    # Stock isn't checked or decremented on add; it's only reserved when quantities are updated
+    new_cart_item = {
+        "productId": product["id"], # Store the 'id' from your products.json
+        "name": product["name"],
+        "price": float(product["price"]), # Ensure price is float
+        "image": product.get("image")
+    }
+    try:
+        doc = await run_cart_op(add_item, users_collection, payload.username, new_cart_item, payload.quantity)
+    except CartError as e:
+        raise cart_error_to_http(e)
 
-    return {"message": "Product added to cart successfully", "cart": user["cart"], "totalPrice": total_price}
+    return {"message": "Product added to cart successfully", "cart": doc["cart"], **totals_response(doc)}
 
 @app.post("/cart/update")
 async def update_cart_item(payload: UpdateCartItemRequest):
-    user = await users_collection.find_one({"username": payload.username})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if "cart" not in user or not isinstance(user["cart"], list):
-        raise HTTPException(status_code=400, detail="Cart is empty or invalid.")
-
-    product_in_cart_index = -1
-    for i, item in enumerate(user["cart"]):
-        if item["productId"] == payload.productId:
-            product_in_cart_index = i
-            break
-
-    if product_in_cart_index == -1:
-        raise HTTPException(status_code=404, detail="Product not found in cart.")
-
-    current_quantity = user["cart"][product_in_cart_index]["quantity"]
-    new_quantity = payload.quantity
-
-    if new_quantity <= 0:
+    if payload.quantity <= 0:
         # If quantity is 0 or less, remove the item
         return await remove_from_cart(RemoveFromCartRequest(username=payload.username, productId=payload.productId))
 
-    # Check available stock if increasing quantity
-    product_db = await products_collection.find_one({"id": payload.productId})
-    if not product_db:
-        raise HTTPException(status_code=404, detail="Product details not found in database.")
-
-    product_stock = int(product_db.get("stock", 0))
-
-    quantity_difference = new_quantity - current_quantity
-    if quantity_difference > 0 and product_stock < quantity_difference:
-        raise HTTPException(status_code=400, detail=f"Not enough stock for {product_db['name']}. Available: {product_stock} more units needed.")
-
-
-    user["cart"][product_in_cart_index]["quantity"] = new_quantity
-
-    # Update product stock
-    await products_collection.update_one(
-        {"id": payload.productId},
-        {"$inc": {"stock": -quantity_difference}}
-    )
-
-    # Recalculate total price
-    total_price = sum(item["price"] * item["quantity"] for item in user["cart"])
-
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cart": user["cart"], "updatedAt": datetime.utcnow()}}
-    )
-    return {"message": "Cart item updated successfully", "cart": user["cart"], "totalPrice": total_price}
+    try:
+        doc = await run_cart_op(set_quantity, users_collection, products_collection, payload.username, payload.productId, payload.quantity)
+    except CartError as e:
+        raise cart_error_to_http(e)
+    return {"message": "Cart item updated successfully", "cart": doc["cart"], **totals_response(doc)}
 
 
 @app.post("/cart/remove")
 async def remove_from_cart(payload: RemoveFromCartRequest):
-    user = await users_collection.find_one({"username": payload.username})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if "cart" not in user or not isinstance(user["cart"], list):
-        raise HTTPException(status_code=400, detail="Cart is empty or invalid.")
-
-    initial_cart_len = len(user["cart"])
-    item_removed_quantity = 0
-
-    # Filter out the item to be removed
-    new_cart_items = []
-    for item in user["cart"]:
-        if item["productId"] == payload.productId:
-            item_removed_quantity = item["quantity"] # Store quantity to return to stock
-        else:
-            new_cart_items.append(item)
-
-    if len(new_cart_items) == initial_cart_len:
-        raise HTTPException(status_code=404, detail="Product not found in cart.")
-
-    user["cart"] = new_cart_items
-
-    # Return quantity to product stock
-    if item_removed_quantity > 0:
-        await products_collection.update_one(
-            {"id": payload.productId},
-            {"$inc": {"stock": item_removed_quantity}}
-        )
-
-    # Recalculate total price
-    total_price = sum(item["price"] * item["quantity"] for item in user["cart"])
-
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"cart": user["cart"], "updatedAt": datetime.utcnow()}}
-    )
-    return {"message": "Product removed from cart successfully", "cart": user["cart"], "totalPrice": total_price}
+    try:
+        doc = await run_cart_op(remove_item, users_collection, products_collection, payload.username, payload.productId)
+    except CartError as e:
+        raise cart_error_to_http(e)
+    return {"message": "Product removed from cart successfully", "cart": doc["cart"], **totals_response(doc)}
 
 @app.get("/cart/{username}")
 async def get_user_cart(username: str):
-    user = await users_collection.find_one({"username": username}, {"cart": 1, "_id": 0})
+    user = await users_collection.find_one({"username": username}, {"cart": 1, "cartTotals": 1, "_id": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    cart_items = user.get("cart", [])
-    total_price = sum(item["price"] * item["quantity"] for item in cart_items)
+    return {"cart": user.get("cart", []), **totals_response(user)}
 
-    return {"cart": cart_items, "totalPrice": total_price}
\ No newline at end of file
+@app.get("/cart/{username}/summary")
+async def get_user_cart_summary(username: str):
+    # Counts and totals only (for the header badge); never loads the cart array
+    user = await users_collection.find_one({"username": username}, {"cartTotals": 1, "_id": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return totals_response(user)
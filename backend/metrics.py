@@ -0,0 +1,369 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# In-process metrics in the Prometheus text format (served by /metrics), no client library needed.
+# - MetricsMiddleware: per-route latency histogram (its _count is the request counter), labelled
+#   with the route template (/products/{product_id}), not the raw path, so cardinality stays bounded
+# - span(dependency, operation) / observe(...): per-dependency timings (mongo, clip, vader, llm,
+#   translator, bcrypt, pdf) into one dependency_duration_seconds histogram; the listener from
+#   mongo_command_listener() feeds it every Motor/PyMongo command
+# - LoopLagMonitor: how late a sleep on the event loop wakes up, i.e. how long something blocked it
+# - InstrumentedThreadPool (the loop's default executor, behind asyncio.to_thread) reports busy /
+#   queued workers and queue wait; the anyio limiter behind run_in_threadpool is exported too
+# - SlowRequestProfiler (opt-in): a sampler thread records every thread's stack while requests are
+#   in flight; a request slower than the threshold gets its window dumped as folded stacks
+#   (flamegraph.pl / speedscope input)
+
+# Innermost frames of a worker thread that is just waiting for work; not worth a sample
+IDLE_FRAMES = {("thread.py", "_worker"), ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock() # Mongo listener events arrive on driver threads
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, n=1):
+        with self._lock:
+            self.values[labels] += n
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self.values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items)
+        return lines
+
+
+class GaugeFunction:
+    # Value(s) read when /metrics is scraped: fn() returns a number or {label values: number}.
+    # kind="counter" for totals some component already keeps (e.g. its stats dict).
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        values = value if isinstance(value, dict) else {(): value}
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {v}" for labels, v in values.items())
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")))
+DEPENDENCY_SECONDS = REGISTRY.register(Histogram(
+    "dependency_duration_seconds", "Time spent in downstream calls", ("dependency", "operation")))
+DEPENDENCY_ERRORS = REGISTRY.register(CounterMetric(
+    "dependency_errors_total", "Downstream calls that raised", ("dependency", "operation")))
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "Event-loop scheduling delay",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+THREADPOOL_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "threadpool_queue_wait_seconds", "Time work waited for a free thread", ("pool",)))
+
+
+def observe(dependency, operation, seconds):
+    DEPENDENCY_SECONDS.observe(seconds, dependency, operation)
+
+
+class span:
+    # with span("clip", "encode"): ...   (also usable as `async with`)
+    def __init__(self, dependency, operation):
+        self.labels = (dependency, operation)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        DEPENDENCY_SECONDS.observe(time.perf_counter() - self.t0, *self.labels)
+        if exc_type is not None and not issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            DEPENDENCY_ERRORS.inc(*self.labels)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def mongo_command_listener():
+    # Passed to AsyncIOMotorClient(event_listeners=[...]); every command lands in
+    # dependency_duration_seconds{dependency="mongo", operation=<command name>}
+    from pymongo import monitoring
+
+    class MongoCommandListener(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            observe("mongo", event.command_name, event.duration_micros / 1e6)
+
+        def failed(self, event):
+            observe("mongo", event.command_name, event.duration_micros / 1e6)
+            DEPENDENCY_ERRORS.inc("mongo", event.command_name)
+
+    return MongoCommandListener()
+
+
+class InstrumentedThreadPool(ThreadPoolExecutor):
+    def __init__(self, name, max_workers=None, **kwargs):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name, **kwargs)
+        self.name = name
+        self.queued = 0
+        self.busy = 0
+        self._counts_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.perf_counter()
+        with self._counts_lock:
+            self.queued += 1
+
+        def run():
+            with self._counts_lock:
+                self.queued -= 1
+                self.busy += 1
+            THREADPOOL_WAIT_SECONDS.observe(time.perf_counter() - submitted, self.name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts_lock:
+                    self.busy -= 1
+
+        return super().submit(run)
+
+    def register(self):
+        THREADPOOLS.append(self)
+        return self
+
+
+THREADPOOLS = []
+
+
+def _threadpool_threads():
+    values = {}
+    for pool in THREADPOOLS:
+        values.update({(pool.name, "busy"): pool.busy, (pool.name, "queued"): pool.queued, (pool.name, "max"): pool._max_workers})
+    try:
+        # The capacity limiter behind FastAPI's run_in_threadpool and sync endpoints
+        import anyio.to_thread
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        values.update({("anyio", "busy"): limiter.borrowed_tokens, ("anyio", "queued"): limiter.statistics().tasks_waiting,
+                       ("anyio", "max"): limiter.total_tokens})
+    except Exception:
+        pass # no running event loop
+    return values
+
+
+REGISTRY.register(GaugeFunction("threadpool_threads", "Worker threads per pool by state", _threadpool_threads, ("pool", "state")))
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+        REGISTRY.register(GaugeFunction("event_loop_lag_max_seconds", "Largest event-loop lag seen", lambda: round(self.max, 6)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - t0 - self.interval)
+            self.max = max(self.max, self.last)
+            LOOP_LAG_SECONDS.observe(self.last)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, out_dir="profiles", interval_ms=5.0, window_seconds=120.0, max_files=200):
+        self.threshold = threshold_ms / 1000
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        self.samples = deque(maxlen=max(1, int(window_seconds / self.interval))) # (t, folded stack)
+        self.inflight = 0
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"samples": 0, "dumps": 0}
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_forever, name="profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._active.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _sample_forever(self):
+        me = threading.get_ident()
+        main = threading.main_thread().ident
+        while not self._stop.is_set():
+            self._active.wait() # idle while no request is in flight
+            names = {t.ident: t.name for t in threading.enumerate()}
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident != main and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue # the loop thread idling in select() is kept: that is time nothing ran
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples.append((now, ";".join(reversed(stack))))
+                self.stats["samples"] += 1
+            time.sleep(self.interval)
+
+    def request_started(self):
+        self.inflight += 1
+        self._active.set()
+        return time.perf_counter()
+
+    def request_finished(self, started, method, route):
+        self.inflight -= 1
+        if self.inflight == 0:
+            self._active.clear()
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+        folded = Counter(stack for t, stack in list(self.samples) if started <= t)
+        if not folded:
+            return
+        safe_route = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{method}_{safe_route}_{round(elapsed * 1000)}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in folded.most_common())
+        self.stats["dumps"] += 1
+        self._prune()
+
+    def _prune(self):
+        files = sorted(os.listdir(self.out_dir))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            os.remove(os.path.join(self.out_dir, name))
+
+
+class MetricsMiddleware:
+    # Pure ASGI so streaming responses (SSE) are timed to their last byte without buffering
+    def __init__(self, app, profiler=None, exclude=("/metrics",)):
+        self.app = app
+        self.profiler = profiler
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        t0 = time.perf_counter()
+        profile_started = self.profiler.request_started() if self.profiler is not None else None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], route, status)
+            if profile_started is not None:
+                self.profiler.request_finished(profile_started, scope["method"], route)
@@ -0,0 +1,69 @@
+import time
+import asyncio
+import threading
+
+# Heavy models (CLIP, VADER) behind one registry instead of module-level globals, so importing
+# main.py stays cheap and a worker can answer /health/live straight away.
+# - register(name, loader) only records how to build a model; get(name) builds it on first use
+#   (thread-safe, one load per model even under concurrent callers)
+# - warm() loads everything in a worker thread in the background; ready() reports when every
+#   required model is loaded, for /health/ready
+# - preload() loads everything synchronously at import time. Combined with gunicorn --preload the
+#   weights are loaded once in the master and shared copy-on-write by the forked workers.
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self.state = {}
+
+    def register(self, name, loader, required=True):
+        self._loaders[name] = (loader, required)
+        self._locks[name] = threading.Lock()
+        self.state[name] = {"status": "pending", "required": required, "load_ms": None, "error": None}
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                loader, _ = self._loaders[name]
+                self.state[name]["status"] = "loading"
+                t0 = time.perf_counter()
+                try:
+                    model = loader()
+                except Exception as e:
+                    self.state[name].update(status="failed", error=str(e))
+                    raise
+                self.state[name].update(status="ready", load_ms=round((time.perf_counter() - t0) * 1000), error=None)
+                self._models[name] = model
+        return model
+
+    async def aget(self, name):
+        # Loads off the event loop when the model isn't there yet
+        model = self._models.get(name)
+        if model is None:
+            model = await asyncio.to_thread(self.get, name)
+        return model
+
+    async def warm(self, names=None):
+        # Loads one model at a time so warm-up doesn't compete with itself for CPU
+        for name in names or list(self._loaders):
+            try:
+                await self.aget(name)
+            except Exception as e:
+                print(f"WARNING: failed to load model {name}: {e}")
+
+    def preload(self, names=None):
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def ready(self):
+        return all(name in self._models for name, (_, required) in self._loaders.items() if required)
+
+    def snapshot(self):
+        return {"ready": self.ready(), "models": self.state}
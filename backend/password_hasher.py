@@ -0,0 +1,96 @@
+import time
+import asyncio
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import observe
+
+# bcrypt off the event loop. bcrypt releases the GIL while hashing, so a small thread pool gives
+# real parallelism without blocking other coroutines. The pool is bounded twice: `max_workers`
+# threads, and at most `max_pending` calls queued or running; past that callers get
+# HasherBusyError straight away instead of piling up behind a login burst.
+
+
+class HasherBusyError(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _verify(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_cost(hashed):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, max_workers=4, max_pending=64, timeout=5.0):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.stats = {
+            "calls": 0, "rejected": 0, "timeouts": 0, "rehashed": 0,
+            "queue_ms_total": 0.0, "work_ms_total": 0.0, "work_ms_max": 0.0,
+        }
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HasherBusyError("Too many password operations in flight")
+        self.pending += 1
+        submitted = time.perf_counter()
+        started = None
+
+        def timed():
+            nonlocal started
+            started = time.perf_counter()
+            return fn(*args)
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, timed)
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HasherBusyError("Password operation timed out")
+        finally:
+            self.pending -= 1
+            done = time.perf_counter()
+            self.stats["calls"] += 1
+            if started is not None:
+                work_ms = (done - started) * 1000
+                self.stats["queue_ms_total"] += (started - submitted) * 1000
+                self.stats["work_ms_total"] += work_ms
+                self.stats["work_ms_max"] = max(self.stats["work_ms_max"], work_ms)
+                observe("bcrypt", fn.__name__.lstrip("_"), work_ms / 1000)
+
+    async def hash(self, password):
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password, hashed):
+        return await self._run(_verify, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def snapshot(self):
+        calls = max(1, self.stats["calls"])
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "rounds": self.rounds,
+            "queue_ms_avg": round(self.stats["queue_ms_total"] / calls, 2),
+            "work_ms_avg": round(self.stats["work_ms_total"] / calls, 2),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,275 @@
+import os
+import time
+import uuid
+import html
+import shutil
+import asyncio
+import textwrap
+import multiprocessing
+from string import Template
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import observe
+
+# Receipt PDFs rendered off the request path.
+# - submit() records a job and hands it to a spawn-based process pool; the route returns the job id
+#   straight away and clients poll /receipt/{id} or download /receipt/{id}/download
+# - at most `max_pending` jobs may be queued or running; past that ReceiptQueueFullError
+# - renderers: "wkhtmltopdf" (pdfkit, HTML template) or "builtin" (a small pure-Python PDF writer,
+#   no subprocess); "auto" picks wkhtmltopdf when the binary is on PATH
+# - files are written to a temp name and renamed, so a finished file on disk is always complete
+# - finished jobs and their files are removed `job_ttl` seconds after submission (swept from submit(),
+#   at most every `sweep_interval` seconds, so files from before a restart go too)
+# - a worker that dies (OOM kill, segfault) breaks the whole pool; submit() then starts a fresh pool
+#   and retries once, and jobs that were on the broken pool fail
+
+RECEIPT_HTML = Template("""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Receipt $receipt_id</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; margin: 32px; }
+h1 { font-size: 20px; }
+th { text-align: left; padding-right: 16px; }
+</style></head>
+<body>
+<h1>Receipt ID: $receipt_id</h1>
+<table>
+$rows
+</table>
+</body>
+</html>
+""")
+RECEIPT_ROW = Template("<tr><th>$key</th><td>$value</td></tr>")
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842 # A4 in points
+MARGIN = 56
+FONT_SIZE = 11
+LEADING = 15
+WRAP_COLUMNS = 90
+
+
+class ReceiptQueueFullError(Exception):
+    pass
+
+
+def render_html(receipt_id, order_details):
+    rows = "\n".join(
+        RECEIPT_ROW.substitute(key=html.escape(str(k)), value=html.escape(str(v)))
+        for k, v in order_details.items()
+    )
+    return RECEIPT_HTML.substitute(receipt_id=html.escape(receipt_id), rows=rows)
+
+
+def _pdf_text(text):
+    # PDF literal string in WinAnsi; characters outside Latin-1 become "?"
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def receipt_lines(order_details):
+    lines = []
+    for k, v in order_details.items():
+        wrapped = textwrap.wrap(f"{k}: {v}", WRAP_COLUMNS, subsequent_indent="    ") or [f"{k}:"]
+        lines.extend(wrapped)
+    return lines
+
+
+def render_pdf_builtin(receipt_id, order_details):
+    # Minimal PDF 1.4: Helvetica text, one content stream per page
+    lines = receipt_lines(order_details)
+    per_page = (PAGE_HEIGHT - 2 * MARGIN - 2 * LEADING) // LEADING
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+
+    objects = [] # bodies of objects 1..n
+    font_id = 3
+    page_ids = []
+    for page_lines in pages:
+        ops = [f"BT /F1 16 Tf {MARGIN} {PAGE_HEIGHT - MARGIN} Td {_pdf_text(f'Receipt ID: {receipt_id}')} Tj ET"]
+        ops.append(f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN - 2 * LEADING} Td")
+        ops.extend(f"{_pdf_text(line)} Tj T*" for line in page_lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = 4 + 2 * len(page_ids)
+        page_ids.append(content_id + 1)
+        objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        objects.append((content_id + 1, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")))
+
+    kids = " ".join(f"{p} 0 R" for p in page_ids)
+    objects[:0] = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")),
+        (font_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"),
+    ]
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id, body in objects:
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n" % obj_id + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for obj_id in range(1, len(objects) + 1):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def resolve_renderer(name):
+    if name == "auto":
+        return "wkhtmltopdf" if shutil.which("wkhtmltopdf") else "builtin"
+    if name not in ("wkhtmltopdf", "builtin"):
+        raise ValueError(f"Unknown receipt renderer: {name}")
+    return name
+
+
+def render_receipt(receipt_id, order_details, path, renderer):
+    # Runs inside a pool process. Returns the time spent rendering, in ms.
+    t0 = time.perf_counter()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if renderer == "wkhtmltopdf":
+            import pdfkit
+            pdfkit.from_string(render_html(receipt_id, order_details), tmp_path, options={"quiet": ""})
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(render_pdf_builtin(receipt_id, order_details))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return (time.perf_counter() - t0) * 1000
+
+
+class ReceiptJobs:
+    def __init__(self, out_dir="receipts", renderer="auto", max_workers=2, max_pending=256, job_ttl=3600.0, sweep_interval=60.0):
+        self.out_dir = out_dir
+        self.renderer = resolve_renderer(renderer)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.sweep_interval = sweep_interval
+        self.jobs = {}
+        self.pending = 0
+        self._pool = None
+        self._last_sweep = 0.0
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0, "expired": 0, "pool_restarts": 0, "render_ms_total": 0.0}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _restart_pool(self, broken):
+        # Only the pool that broke is replaced; a later failure from an old pool leaves the new one alone
+        if self._pool is broken and broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self.stats["pool_restarts"] += 1
+
+    def path_for(self, job_id):
+        return os.path.join(self.out_dir, f"{job_id}.pdf")
+
+    def submit(self, order_details):
+        # Returns the job id; rendering continues in the background
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise ReceiptQueueFullError("Too many receipts being generated, try again shortly")
+        self._prune()
+        os.makedirs(self.out_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        args = (render_receipt, job_id[:8], order_details, self.path_for(job_id), self.renderer)
+        pool = self.pool
+        try:
+            future = loop.run_in_executor(pool, *args)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            pool = self.pool
+            future = loop.run_in_executor(pool, *args)
+        self.jobs[job_id] = {"status": "pending", "created": time.time(), "error": None, "future": future}
+        self.pending += 1
+        self.stats["submitted"] += 1
+        future.add_done_callback(lambda f: self._finished(job_id, f, pool))
+        return job_id
+
+    def _finished(self, job_id, future, pool):
+        self.pending -= 1
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._restart_pool(pool)
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job["finished"] = time.time()
+        if future.cancelled() or future.exception() is not None:
+            job["status"] = "failed"
+            job["error"] = "cancelled" if future.cancelled() else str(future.exception())
+            self.stats["failed"] += 1
+        else:
+            job["status"] = "done"
+            self.stats["done"] += 1
+            self.stats["render_ms_total"] += future.result()
+            observe("pdf", self.renderer, future.result() / 1000)
+
+    def _prune(self):
+        # Forgets finished jobs older than job_ttl and deletes their files, plus any receipt file on
+        # disk older than that (written before a restart, or whose job was already forgotten)
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        cutoff = now - self.job_ttl
+        for job_id in [j for j, job in self.jobs.items() if job["status"] != "pending" and job["created"] < cutoff]:
+            del self.jobs[job_id]
+        try:
+            entries = list(os.scandir(self.out_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            job_id = entry.name.split(".", 1)[0]
+            if job_id in self.jobs or not entry.name.endswith((".pdf", ".tmp")):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    self.stats["expired"] += 1
+            except FileNotFoundError:
+                pass
+
+    def status(self, job_id):
+        # None for unknown ids; finished jobs that were pruned from memory or rendered before a
+        # restart are recognised by their file until it expires
+        job = self.jobs.get(job_id)
+        if job is None:
+            if job_id.isalnum() and os.path.exists(self.path_for(job_id)):
+                return {"jobId": job_id, "status": "done", "error": None}
+            return None
+        return {"jobId": job_id, "status": job["status"], "error": job["error"]}
+
+    async def wait(self, job_id, timeout):
+        # Waits up to `timeout` seconds for a pending job, then returns its status
+        job = self.jobs.get(job_id)
+        if job is not None and job["status"] == "pending":
+            try:
+                await asyncio.wait_for(asyncio.shield(job["future"]), timeout)
+            except Exception:
+                pass
+        return self.status(job_id)
+
+    def snapshot(self):
+        done = max(1, self.stats["done"])
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "renderer": self.renderer,
+            "render_ms_avg": round(self.stats["render_ms_total"] / done, 2),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,283 @@
+import math
+import time
+import asyncio
+from collections import Counter, OrderedDict, defaultdict
+
+import numpy as np
+
+from vector_search import normalize_rows
+
+# Precomputed item-item neighbours behind /recommendations: a request is an O(k) slice of two
+# arrays instead of a similarity pass.
+# - content: for every product the top `candidates` neighbours by a blend of TF-IDF (names) and
+#   CLIP name-embedding cosine, computed blockwise in a worker thread. They only change with the
+#   catalog, so main.py caches them in the embedding store (neighbors.npz).
+# - behaviour: co-view counts (products viewed by the same user within `window` views of each
+#   other, from analytics_events) and co-cart counts (products sharing a cart in users, then
+#   add-to-cart events as they arrive), normalised as c(a,b) / sqrt(n(a) * n(b)).
+#   A user's window is their last `window` distinct products; n(a) counts each stay of a in a
+#   window (views while it's still there don't), and a pair counts at most once per stay of either
+#   product, so c(a,b) <= min(n(a), n(b)) and the score stays in [0, 1].
+# - counts expire: every `rotate_interval` seconds the current generation is retired and the one
+#   before it dropped (user windows restart too), so they cover the last one to two intervals
+# - each row keeps the top `k` of content candidates + behaviour partners by
+#   content_weight * content + view_weight * coview + cart_weight * cocart
+# - new analytics batches (apply) only bump counts and mark the touched rows dirty; the
+#   background loop re-ranks dirty rows every `refresh_interval` seconds. A catalog rebuild ranks
+#   into a fresh table and swaps it in, so lookups never see a half-built one.
+
+VIEW_EVENT = "product_viewed"
+CART_EVENT = "product_added_to_cart"
+
+
+def _similarity_block(matrices, weights, start, stop):
+    block = None
+    for matrix, weight in zip(matrices, weights):
+        sims = matrix[start:stop] @ matrix.T
+        sims = sims.toarray() if hasattr(sims, "toarray") else np.asarray(sims)
+        block = weight * sims if block is None else block + weight * sims
+    return block
+
+
+def content_neighbors(matrices, weights, m, block_size=256):
+    # matrices: row-aligned product representations (dense or sparse), each L2-normalised here.
+    # Returns (rows [n, m] int32, sims [n, m] float32), best first, -1 padded.
+    matrices = [normalize_rows(mat) for mat in matrices]
+    n = matrices[0].shape[0]
+    m = min(m, n - 1)
+    rows = np.full((n, max(m, 0)), -1, dtype=np.int32)
+    sims = np.zeros((n, max(m, 0)), dtype=np.float32)
+    if m <= 0:
+        return rows, sims
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = _similarity_block(matrices, weights, start, stop)
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf # never your own neighbour
+        part = np.argpartition(-block, m - 1, axis=1)[:, :m]
+        part_sims = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_sims, axis=1, kind="stable")
+        rows[start:stop] = np.take_along_axis(part, order, axis=1)
+        sims[start:stop] = np.take_along_axis(part_sims, order, axis=1)
+    return rows, sims
+
+
+class CoOccurrence:
+    # Symmetric pair counts plus per-item counts for normalisation, in two generations: new counts
+    # go into pairs/items, rotate() moves them to the retired generation and drops the older one
+    def __init__(self):
+        self.pairs = defaultdict(Counter)
+        self.items = Counter()
+        self.retired_pairs = {}
+        self.retired_items = Counter()
+
+    def add(self, a, b, n=1):
+        self.pairs[a][b] += n
+        self.pairs[b][a] += n
+
+    def count(self, a, b):
+        return self.pairs.get(a, {}).get(b, 0) + self.retired_pairs.get(a, {}).get(b, 0)
+
+    def score(self, a, b):
+        # Cosine-style in [0, 1], so it weighs the same as the content similarity in the blend
+        c = self.count(a, b)
+        return c / math.sqrt((self.items[a] + self.retired_items[a]) * (self.items[b] + self.retired_items[b])) if c else 0.0
+
+    def partners(self, a):
+        return self.pairs.get(a, {}).keys() | self.retired_pairs.get(a, {}).keys()
+
+    def rotate(self):
+        # Returns the items whose counts changed
+        touched = set(self.retired_items) | set(self.items)
+        self.retired_pairs, self.retired_items = dict(self.pairs), self.items
+        self.pairs, self.items = defaultdict(Counter), Counter()
+        return touched
+
+    def __len__(self):
+        keys = set(self.pairs) | set(self.retired_pairs)
+        return sum(len(self.partners(a)) for a in keys) // 2
+
+
+class _Table:
+    def __init__(self, products, content_rows, content_sims, k):
+        self.ids = [str(p.get("id")) for p in products] # row -> product id
+        self.row_of = {pid: i for i, pid in enumerate(self.ids)}
+        self.categories = [p.get("category") for p in products]
+        self.content_rows = content_rows
+        self.content_sims = content_sims
+        self.neighbors = np.full((len(self.ids), k), -1, dtype=np.int32) # -1 padded
+        self.scores = np.zeros((len(self.ids), k), dtype=np.float32)
+
+
+class RecommendationTable:
+    def __init__(self, k=50, candidates=100, content_weight=0.6, view_weight=0.25, cart_weight=0.15,
+                 window=20, max_actors=100_000, refresh_interval=5.0, rotate_interval=15 * 86400.0):
+        self.k = k
+        self.candidates = candidates
+        self.content_weight = content_weight
+        self.view_weight = view_weight
+        self.cart_weight = cart_weight
+        self.window = window
+        self.max_actors = max_actors
+        self.refresh_interval = refresh_interval
+        self.rotate_interval = rotate_interval
+        self._rotated_at = time.monotonic()
+        self.views = CoOccurrence()
+        self.carts = CoOccurrence()
+        # event -> actor -> recent product ids (oldest first) -> partners already counted in this stay
+        self._recent = {VIEW_EVENT: OrderedDict(), CART_EVENT: OrderedDict()}
+        self.table = None
+        self.dirty = set() # product ids whose row needs re-ranking
+        self.stats = {"events": 0, "rowRefreshes": 0, "rotations": 0, "builtAt": None}
+        self._task = None
+
+    # --- behaviour ---
+    def _observe(self, event_name, actor, product_id):
+        co = self.views if event_name == VIEW_EVENT else self.carts
+        actors = self._recent[event_name]
+        recent = actors.get(actor)
+        if recent is None:
+            recent = actors[actor] = OrderedDict()
+            if len(actors) > self.max_actors:
+                actors.popitem(last=False)
+        actors.move_to_end(actor)
+        if product_id in recent:
+            return # still in the window: neither the product nor its pairs count again
+        if len(recent) >= self.window:
+            recent.popitem(last=False)
+        co.items[product_id] += 1
+        counted = recent[product_id] = set()
+        for other, other_counted in recent.items():
+            # A partner that already paired with this product during its current stay doesn't
+            # pair again, so every pair count is matched by a stay of both products
+            if other == product_id or product_id in other_counted:
+                continue
+            co.add(product_id, other)
+            counted.add(other)
+            other_counted.add(product_id)
+            self.dirty.add(other)
+        self.dirty.add(product_id)
+
+    def add_events(self, events):
+        # Events in time order; anything without an actor or a productId is ignored
+        for event in events:
+            name = event.get("eventName")
+            if name not in self._recent:
+                continue
+            actor = event.get("userId") or event.get("sessionId")
+            product_id = (event.get("eventData") or {}).get("productId")
+            if actor and product_id is not None:
+                self._observe(name, actor, str(product_id))
+                self.stats["events"] += 1
+
+    def add_carts(self, carts):
+        # carts: iterable of product id lists, one per user (current cart contents)
+        for cart in carts:
+            cart = list(dict.fromkeys(str(p) for p in cart))
+            self.dirty.update(cart)
+            for i, a in enumerate(cart):
+                self.carts.items[a] += 1
+                for b in cart[i + 1:]:
+                    self.carts.add(a, b)
+
+    def rotate(self):
+        # Retires the current counts; user windows start over so no stay spans two generations
+        self.dirty.update(self.views.rotate() | self.carts.rotate())
+        for actors in self._recent.values():
+            actors.clear()
+        self._rotated_at = time.monotonic()
+        self.stats["rotations"] += 1
+
+    async def apply(self, events):
+        # EventBuffer listener; the refresh loop picks up the dirty rows
+        self.add_events(events)
+
+    # --- table ---
+    def _rank_row(self, table, row):
+        pid = table.ids[row]
+        blended = {}
+        for other, sim in zip(table.content_rows[row].tolist(), table.content_sims[row].tolist()):
+            if other >= 0:
+                blended[other] = self.content_weight * sim
+        # Behaviour partners outside the content candidates get no content score
+        for co, weight in ((self.views, self.view_weight), (self.carts, self.cart_weight)):
+            for other_id in co.partners(pid):
+                other = table.row_of.get(other_id)
+                if other is not None and other != row:
+                    blended[other] = blended.get(other, 0.0) + weight * co.score(pid, other_id)
+        best = sorted(blended.items(), key=lambda item: -item[1])[:self.k]
+        table.neighbors[row] = -1
+        table.scores[row] = 0.0
+        if best:
+            table.neighbors[row, :len(best)] = [r for r, _ in best]
+            table.scores[row, :len(best)] = [s for _, s in best]
+
+    async def _rank_rows(self, table, rows, chunk=500):
+        # Yields to the event loop between chunks
+        for i in range(0, len(rows), chunk):
+            for row in rows[i:i + chunk]:
+                self._rank_row(table, row)
+            await asyncio.sleep(0)
+        self.stats["rowRefreshes"] += len(rows)
+
+    async def rebuild(self, products, content_rows, content_sims):
+        # products: row-aligned with the content arrays
+        table = _Table(products, content_rows, content_sims, self.k)
+        self.dirty = set() # every row is ranked below; changes from here on are marked again
+        await self._rank_rows(table, list(range(len(table.ids))))
+        self.table = table
+        self.stats["builtAt"] = time.time()
+
+    async def refresh(self):
+        # Re-ranks the rows of products whose counts changed since the last refresh
+        table = self.table
+        if table is None or not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+        rows = [table.row_of[pid] for pid in dirty if pid in table.row_of]
+        await self._rank_rows(table, rows)
+        return len(rows)
+
+    def lookup(self, product_id, k, category=None):
+        # [(product id, score)] best first; None if the product isn't in the table
+        table = self.table
+        row = table.row_of.get(str(product_id)) if table is not None else None
+        if row is None:
+            return None
+        hits = []
+        for other, score in zip(table.neighbors[row].tolist(), table.scores[row].tolist()):
+            if other < 0 or len(hits) == k:
+                break
+            if category is None or table.categories[other] == category:
+                hits.append((table.ids[other], score))
+        return hits
+
+    # --- background refresh ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if time.monotonic() - self._rotated_at >= self.rotate_interval:
+                    self.rotate()
+                await self.refresh()
+            except Exception as e:
+                print(f"ERROR: recommendation table refresh failed: {e}")
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "products": len(self.table.ids) if self.table is not None else 0,
+            "k": self.k,
+            "dirty": len(self.dirty),
+            "coViewPairs": len(self.views),
+            "coCartPairs": len(self.carts),
+        }
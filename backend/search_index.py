@@ -0,0 +1,229 @@
+import re
+import math
+from bisect import bisect_left, insort
+
+import numpy as np
+
+# In-memory inverted index behind /search.
+# - one posting dict per term (doc -> field-weighted term frequency), so a product upsert/delete
+#   touches only its own terms. A term's postings are compiled into numpy arrays the first time it
+#   is queried; after that, updates are queued per term and merged into the arrays (one
+#   vectorised concat/filter) by the next query that touches the term.
+# - per-term BM25 contributions are cached and recomputed when the term changes or when the
+#   corpus size / average length has drifted by more than STATS_TOLERANCE since they were computed
+# - BM25 over a single virtual document per product, with name/subcategory/category/description
+#   term frequencies weighted per field (BM25F-style)
+# - the last query token is also treated as a prefix: it is expanded to the most frequent
+#   vocabulary terms that start with it (sorted vocabulary + bisect) and the best expansion counts
+# - kept in sync through CatalogCache.subscribe (on_catalog_change)
+
+TOKEN_RE = re.compile(r"\w+")
+FIELD_WEIGHTS = {"name": 3.0, "subcategory": 2.0, "category": 1.5, "description": 1.0}
+PREFIX_SCAN_LIMIT = 2000
+STATS_TOLERANCE = 0.01
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold())
+
+
+class SearchIndex:
+    def __init__(self, field_weights=FIELD_WEIGHTS, k1=1.2, b=0.75, max_prefix_terms=20):
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        self.max_prefix_terms = max_prefix_terms
+        self.postings = {} # term -> {doc: weighted tf}
+        self._compiled = {} # term -> (doc ids, tfs) as arrays
+        self._pending = {} # term -> ({doc: tf} added, {doc} removed) since the arrays were compiled
+        self._contrib = {} # term -> (n docs, avgdl, BM25 contribution per posting)
+        self.vocab = [] # sorted terms with at least one posting
+        self.doc_terms = {} # doc -> {term: weighted tf}
+        self.doc_by_id = {} # product id -> doc
+        self.ids = [] # doc -> product id (None for a freed slot)
+        self.free = []
+        self.doc_len = np.zeros(1024, dtype=np.float32)
+        self.doc_category = np.full(1024, -1, dtype=np.int32)
+        self.category_codes = {}
+        self.total_len = 0.0
+
+    def __len__(self):
+        return len(self.doc_by_id)
+
+    # --- updates ---
+    def _alloc(self, product_id):
+        if self.free:
+            doc = self.free.pop()
+            self.ids[doc] = product_id
+        else:
+            doc = len(self.ids)
+            self.ids.append(product_id)
+            if doc >= self.doc_len.shape[0]:
+                grow = self.doc_len.shape[0]
+                self.doc_len = np.concatenate([self.doc_len, np.zeros(grow, dtype=np.float32)])
+                self.doc_category = np.concatenate([self.doc_category, np.full(grow, -1, dtype=np.int32)])
+        self.doc_by_id[product_id] = doc
+        return doc
+
+    def add(self, product_id, product):
+        product_id = str(product_id)
+        tf = {}
+        for field, weight in self.field_weights.items():
+            for token in tokenize(str(product.get(field) or "")):
+                tf[token] = tf.get(token, 0.0) + weight
+        category = product.get("category")
+        doc = self.doc_by_id.get(product_id)
+        if doc is not None:
+            # Most catalog changes (stock, price, reviews) don't touch the indexed fields
+            if self.doc_terms[doc] == tf and self.doc_category[doc] == self.category_codes.get(category):
+                return
+            self.remove(product_id)
+        doc = self._alloc(product_id)
+        for term, freq in tf.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                insort(self.vocab, term)
+            postings[doc] = freq
+            if term in self._compiled:
+                self._pending.setdefault(term, ({}, set()))[0][doc] = freq
+                self._contrib.pop(term, None)
+        self.doc_terms[doc] = tf
+        length = sum(tf.values())
+        self.doc_len[doc] = length
+        self.total_len += length
+        self.doc_category[doc] = self.category_codes.setdefault(category, len(self.category_codes))
+
+    def remove(self, product_id):
+        doc = self.doc_by_id.pop(str(product_id), None)
+        if doc is None:
+            return
+        for term in self.doc_terms.pop(doc):
+            postings = self.postings[term]
+            del postings[doc]
+            self._contrib.pop(term, None)
+            if not postings:
+                del self.postings[term]
+                self._compiled.pop(term, None)
+                self._pending.pop(term, None)
+                del self.vocab[bisect_left(self.vocab, term)]
+            elif term in self._compiled:
+                added, removed = self._pending.setdefault(term, ({}, set()))
+                if added.pop(doc, None) is None:
+                    removed.add(doc)
+        self.total_len -= float(self.doc_len[doc])
+        self.doc_len[doc] = 0.0
+        self.doc_category[doc] = -1
+        self.ids[doc] = None
+        self.free.append(doc)
+
+    def on_catalog_change(self, op, product_id, product):
+        if op == "delete":
+            self.remove(product_id)
+        else:
+            self.add(product_id, product)
+
+    # --- queries ---
+    def _term_arrays(self, term):
+        compiled = self._compiled.get(term)
+        pending = self._pending.pop(term, None)
+        if compiled is None:
+            postings = self.postings[term]
+            compiled = self._compiled[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+        elif pending is not None:
+            # Removals first: a freed doc slot can be reused by a later add of the same term
+            docs, tfs = compiled
+            added, removed = pending
+            if removed:
+                keep = ~np.isin(docs, np.fromiter(removed, dtype=np.int64, count=len(removed)))
+                docs, tfs = docs[keep], tfs[keep]
+            if added:
+                docs = np.concatenate([docs, np.fromiter(added.keys(), dtype=np.int64, count=len(added))])
+                tfs = np.concatenate([tfs, np.fromiter(added.values(), dtype=np.float32, count=len(added))])
+            compiled = self._compiled[term] = (docs, tfs)
+        return compiled
+
+    def compile_all(self):
+        # Compiles every term up front (startup), so no query pays for a large cold posting list
+        for term in self.postings:
+            self._term_arrays(term)
+
+    def _bm25(self, term, avgdl):
+        n = len(self.doc_by_id)
+        cached = self._contrib.get(term)
+        if cached is not None:
+            cached_n, cached_avgdl, docs, contrib = cached
+            if abs(cached_n - n) <= STATS_TOLERANCE * n and abs(cached_avgdl - avgdl) <= STATS_TOLERANCE * avgdl:
+                return docs, contrib
+        docs, tfs = self._term_arrays(term)
+        df = docs.shape[0]
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / avgdl)
+        contrib = (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        self._contrib[term] = (n, avgdl, docs, contrib)
+        return docs, contrib
+
+    def complete(self, prefix, limit=None):
+        # Vocabulary terms starting with `prefix`, most frequent first
+        start = bisect_left(self.vocab, prefix)
+        matches = []
+        for term in self.vocab[start:start + PREFIX_SCAN_LIMIT]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        matches.sort(key=lambda t: -len(self.postings[t]))
+        return matches[:limit or self.max_prefix_terms]
+
+    def search(self, query, k=10, category=None, prefix=True):
+        # Returns [(product_id, score)] best first
+        terms = tokenize(query)
+        if not terms or not self.doc_by_id:
+            return []
+        avgdl = self.total_len / len(self.doc_by_id) or 1.0
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+
+        exact = terms
+        if prefix and not query[-1].isspace():
+            # Last token is still being typed: score its best completion (the exact term included)
+            exact = terms[:-1]
+            best = np.zeros_like(scores)
+            for term in self.complete(terms[-1]):
+                docs, contrib = self._bm25(term, avgdl)
+                best[docs] = np.maximum(best[docs], contrib)
+            scores += best
+        for term in exact:
+            if term in self.postings:
+                docs, contrib = self._bm25(term, avgdl)
+                scores[docs] += contrib
+
+        if category is not None:
+            code = self.category_codes.get(category)
+            if code is None:
+                return []
+            scores[self.doc_category[:scores.shape[0]] != code] = 0.0
+        candidates = np.flatnonzero(scores)
+        if candidates.shape[0] > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.ids[d], float(scores[d])) for d in order]
+
+
+def blend(lexical, semantic, semantic_weight):
+    # lexical / semantic: {product_id: score} over the same candidates. Each is min-max scaled to
+    # [0, 1] (BM25 is unbounded, cosine isn't comparable to it) and then mixed.
+    def scaled(scores):
+        if not scores:
+            return {}
+        lo, hi = min(scores.values()), max(scores.values())
+        span = hi - lo if hi > lo else 1.0
+        return {pid: (s - lo) / span for pid, s in scores.items()}
+
+    lexical, semantic = scaled(lexical), scaled(semantic)
+    fused = {
+        pid: (1 - semantic_weight) * lexical.get(pid, 0.0) + semantic_weight * semantic.get(pid, 0.0)
+        for pid in lexical.keys() | semantic.keys()
+    }
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import span
+
+# VADER sentiment with memoisation and a process pool for big batches.
+# - scores are memoised in an LRU keyed by a hash of the review text (reviews repeat a lot)
+# - small batches are scored inline (VADER is ~tens of microseconds per review); batches with at
+#   least `pool_threshold` uncached reviews are split across a spawn-based process pool, since
+#   VADER is pure Python and holds the GIL
+# - aggregate() turns a list of scores into the per-product summary stored on each product
+
+POSITIVE_THRESHOLD = 0.3
+NEGATIVE_THRESHOLD = -0.3
+
+_worker_analyzer = None
+
+
+def classify(compound):
+    return "positive" if compound > POSITIVE_THRESHOLD else "negative" if compound < NEGATIVE_THRESHOLD else "neutral"
+
+
+def _init_worker():
+    global _worker_analyzer
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    _worker_analyzer = SentimentIntensityAnalyzer()
+
+
+def _score_chunk(texts):
+    # Runs inside a pool process
+    return [_worker_analyzer.polarity_scores(t) for t in texts]
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def aggregate(scores):
+    counts = {"positive": 0, "neutral": 0, "negative": 0}
+    total = 0.0
+    for s in scores:
+        counts[classify(s["compound"])] += 1
+        total += s["compound"]
+    n = len(scores)
+    return {"count": n, "avgCompound": round(total / n, 4) if n else 0.0, **counts}
+
+
+class SentimentScorer:
+    def __init__(self, analyzer, cache_size=100_000, pool_workers=2, pool_threshold=256, chunk_size=512):
+        # `analyzer` is a SentimentIntensityAnalyzer or a zero-arg callable returning one (e.g. a
+        # model registry lookup, so the VADER lexicon only loads on first use)
+        self._analyzer = analyzer
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pool_workers = pool_workers
+        self.pool_threshold = pool_threshold
+        self.chunk_size = chunk_size
+        self._pool = None
+        self.stats = {"scored": 0, "cache_hits": 0, "pooled": 0}
+
+    @property
+    def analyzer(self):
+        if hasattr(self._analyzer, "polarity_scores"):
+            return self._analyzer
+        return self._analyzer()
+
+    def _remember(self, key, scores):
+        self.cache[key] = scores
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _lookup(self, key):
+        scores = self.cache.get(key)
+        if scores is not None:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+        return scores
+
+    def score(self, text):
+        key = text_key(text)
+        scores = self._lookup(key)
+        if scores is None:
+            scores = self.analyzer.polarity_scores(text)
+            self.stats["scored"] += 1
+            self._remember(key, scores)
+        return scores
+
+    @property
+    def pool(self):
+        if self._pool is None and self.pool_workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    async def score_many(self, texts):
+        # Returns scores aligned with `texts`; duplicates and cached texts are scored once/never
+        keys = [text_key(t) for t in texts]
+        results = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in results or key in missing:
+                continue
+            scores = self._lookup(key)
+            if scores is None:
+                missing[key] = text
+            else:
+                results[key] = scores
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [missing[k] for k in miss_keys]
+            if len(miss_texts) >= self.pool_threshold and self.pool is not None:
+                loop = asyncio.get_running_loop()
+                chunks = [miss_texts[i:i + self.chunk_size] for i in range(0, len(miss_texts), self.chunk_size)]
+                with span("vader", "score_pool"):
+                    scored = await asyncio.gather(*(loop.run_in_executor(self.pool, _score_chunk, c) for c in chunks))
+                fresh = [s for chunk in scored for s in chunk]
+                self.stats["pooled"] += len(fresh)
+            else:
+                with span("vader", "score"):
+                    fresh = [self.analyzer.polarity_scores(t) for t in miss_texts]
+            self.stats["scored"] += len(fresh)
+            for key, scores in zip(miss_keys, fresh):
+                results[key] = scores
+                self._remember(key, scores)
+
+        return [results[k] for k in keys]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
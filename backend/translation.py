@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import span
+
+# Cached, batched review translation.
+# - results are cached by (source, target, sha1(text)): an in-memory LRU in front of a SQLite file
+#   so translations survive restarts. SQLite reads/writes have their own small pool, so cache hits
+#   never queue behind slow upstream calls.
+# - the translator backend is pluggable: "google" (the endpoint deep_translator scrapes, called
+#   through one pooled httpx.Client) or "http" (any LibreTranslate-compatible POST /translate
+#   endpoint, e.g. a local stub for tests/benchmarks). Both put a timeout on the HTTP call itself,
+#   since asyncio.wait_for can't stop a worker thread.
+# - upstream calls run in a thread pool with a timeout, behind a circuit breaker that fails fast
+#   for `cooldown` seconds after `failure_threshold` consecutive failures, then lets a single probe
+#   call through. Bad input (unsupported language) raises TranslationInputError and never counts
+#   as a failure.
+
+
+class TranslationUnavailableError(Exception):
+    pass
+
+
+class TranslationInputError(ValueError):
+    pass
+
+
+class GoogleBackend:
+    # Same request and HTML parsing as deep_translator's GoogleTranslator, but through a shared
+    # httpx.Client (thread-safe, keeps connections alive) with a timeout on every call. The
+    # translator object itself keeps per-call state and calls requests without a timeout.
+    MAX_CHARS = 5000
+
+    def __init__(self, timeout=10.0, max_connections=8, client=None):
+        import httpx
+        from deep_translator.constants import BASE_URLS, GOOGLE_LANGUAGES_TO_CODES
+        self.url = BASE_URLS["GOOGLE_TRANSLATE"]
+        self.timeout = timeout
+        self.codes = {**{code: code for code in GOOGLE_LANGUAGES_TO_CODES.values()}, **GOOGLE_LANGUAGES_TO_CODES}
+        self.client = client or httpx.Client(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _code(self, language, allow_auto):
+        language = (language or "").lower()
+        if allow_auto and language == "auto":
+            return language
+        if language not in self.codes:
+            raise TranslationInputError(f"Unsupported language: {language}")
+        return self.codes[language]
+
+    def translate(self, text, source, target):
+        from bs4 import BeautifulSoup
+        source, target = self._code(source, True), self._code(target, False)
+        if len(text) > self.MAX_CHARS:
+            raise TranslationInputError(f"Text longer than {self.MAX_CHARS} characters")
+        text = text.strip()
+        if not text or source == target:
+            return text
+        response = self.client.get(self.url, params={"tl": target, "sl": source, "q": text}, timeout=self.timeout)
+        response.raise_for_status() # 429 and 5xx count as upstream failures
+        soup = BeautifulSoup(response.text, "html.parser")
+        element = soup.find("div", {"class": "t0"}) or soup.find("div", {"class": "result-container"})
+        if element is None:
+            raise RuntimeError("No translation in the response")
+        return element.get_text(strip=True)
+
+    def close(self):
+        self.client.close()
+
+
+class HttpBackend:
+    def __init__(self, base_url, timeout=10.0):
+        self.url = base_url.rstrip("/") + "/translate"
+        self.timeout = timeout
+
+    def translate(self, text, source, target):
+        body = json.dumps({"q": text, "source": source, "target": target, "format": "text"}).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                return json.loads(res.read())["translatedText"]
+        except urllib.error.HTTPError as e:
+            if e.code == 400: # LibreTranslate's answer to an unsupported language or bad input
+                raise TranslationInputError(f"Translator rejected the request: {e.reason}")
+            raise
+
+
+def make_backend(name, url=None, timeout=10.0, max_connections=8):
+    if name == "google":
+        return GoogleBackend(timeout, max_connections)
+    if name == "http":
+        if not url:
+            raise ValueError("TRANSLATOR_URL is required for the http translator backend")
+        return HttpBackend(url, timeout)
+    raise ValueError(f"Unknown translator backend: {name}")
+
+
+def cache_key(source, target, text):
+    return f"{source}:{target}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+class SQLiteTranslationStore:
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, translated TEXT NOT NULL)")
+            self.conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500): # stay under SQLite's bound-parameter limit
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, translated FROM translations WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO translations (key, translated) VALUES (?, ?)", items)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def _cooled_down(self):
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        # Half-open: after the cooldown exactly one call goes through; its outcome closes or re-opens it
+        if self.probing or not self._cooled_down():
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release(self):
+        # The call said nothing about upstream health (e.g. bad input): let another probe through
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing or self._cooled_down() else "open"
+
+
+class TranslationService:
+    def __init__(self, backend, store=None, memory_size=10_000, timeout=5.0, max_concurrency=8,
+                 failure_threshold=5, cooldown=30.0):
+        self.backend = backend
+        self.store = store
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="translate")
+        self.store_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="translate-store")
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.stats = {"memory_hits": 0, "store_hits": 0, "upstream": 0, "failures": 0, "rejected": 0, "short_circuited": 0}
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _remember(self, key, translated):
+        self.memory[key] = translated
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    async def _upstream(self, text, source, target):
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise TranslationUnavailableError("Translation service temporarily unavailable")
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.semaphore:
+                with span("translator", "translate"):
+                    translated = await asyncio.wait_for(
+                        loop.run_in_executor(self.executor, self.backend.translate, text, source, target),
+                        self.timeout,
+                    )
+        except TranslationInputError:
+            self.stats["rejected"] += 1
+            self.breaker.release()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release() # the caller went away; says nothing about upstream
+            raise
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise TranslationUnavailableError(f"Translation failed: {e or type(e).__name__}")
+        self.stats["upstream"] += 1
+        self.breaker.record_success()
+        return translated
+
+    async def translate_many(self, texts, source, target="en"):
+        # Returns translations aligned with `texts`. Memory -> SQLite -> upstream, each text once.
+        keys = [cache_key(source, target, t) for t in texts]
+        results = {}
+        for key in keys:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                results[key] = self.memory[key]
+                self.stats["memory_hits"] += 1
+
+        missing = list({k: t for k, t in zip(keys, texts) if k not in results}.items())
+        if missing and self.store is not None:
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(self.store_executor, self.store.get_many, [k for k, _ in missing])
+            for key, translated in stored.items():
+                results[key] = translated
+                self._remember(key, translated)
+            self.stats["store_hits"] += len(stored)
+            missing = [(k, t) for k, t in missing if k not in stored]
+
+        if missing:
+            translated = await asyncio.gather(
+                *(self._upstream(t, source, target) for _, t in missing), return_exceptions=True
+            )
+            fresh = []
+            for (key, _), value in zip(missing, translated):
+                if isinstance(value, Exception):
+                    continue
+                results[key] = value
+                self._remember(key, value)
+                fresh.append((key, value))
+            if fresh and self.store is not None:
+                await asyncio.get_running_loop().run_in_executor(self.store_executor, self.store.put_many, fresh)
+            errors = [v for v in translated if isinstance(v, Exception)]
+            rejected = [e for e in errors if isinstance(e, TranslationInputError)]
+            if rejected:
+                raise rejected[0] # the request itself is bad (e.g. unsupported language)
+            if errors and not results:
+                raise errors[0] # nothing could be translated at all
+
+        # Texts that failed upstream come back as None so callers can show the original
+        return [results.get(k) for k in keys]
+
+    async def translate(self, text, source, target="en"):
+        translated = (await self.translate_many([text], source, target))[0]
+        if translated is None:
+            raise TranslationUnavailableError("Translation failed")
+        return translated
+
+    def snapshot(self):
+        return {**self.stats, "breaker": self.breaker.state, "memory_entries": len(self.memory)}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.store_executor.shutdown(wait=True) # lets pending cache writes land before the close
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+        if self.store is not None:
+            self.store.close()
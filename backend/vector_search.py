@@ -0,0 +1,161 @@
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+except ImportError:  # scipy ships with scikit-learn, but keep dense-only use working without it
+    sp = None
+
+# Top-k similarity search used by /visual-search and /recommendations.
+# Two backends share the same interface:
+#   ExactIndex -> brute-force dot products on an L2-normalised float32 matrix (or sparse TF-IDF rows),
+#                 top-k picked with argpartition instead of a full sort
+#   IVFIndex   -> inverted-file index: vectors are bucketed by k-means centroid and only the
+#                 `nprobe` closest buckets are scanned per query
+# Both return [(row, score), ...] sorted by descending cosine similarity.
+
+
+def _is_sparse(matrix):
+    return sp is not None and sp.issparse(matrix)
+
+
+def normalize_rows(matrix):
+    if _is_sparse(matrix):
+        matrix = sp.csr_matrix(matrix, dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms).dot(matrix), dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k(scores, k, candidates=None):
+    # scores: 1-D array; candidates: optional row ids that `scores` refers to
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return []
+    if k < scores.shape[0]:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(scores.shape[0])
+    order = part[np.argsort(-scores[part], kind="stable")]
+    rows = order if candidates is None else candidates[order]
+    return [(int(r), float(s)) for r, s in zip(rows, scores[order])]
+
+
+class _BaseIndex:
+    def __init__(self, categories=None):
+        # category -> sorted int array of rows, so filters become a cheap gather
+        self.category_rows = {}
+        if categories is not None:
+            by_category = {}
+            for row, category in enumerate(categories):
+                by_category.setdefault(category, []).append(row)
+            self.category_rows = {c: np.asarray(r, dtype=np.int64) for c, r in by_category.items()}
+
+    def _allowed_rows(self, category):
+        if category is None:
+            return None
+        return self.category_rows.get(category, np.empty(0, dtype=np.int64))
+
+    def _prepare_query(self, query):
+        if _is_sparse(query):
+            return normalize_rows(query)
+        return normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+
+class ExactIndex(_BaseIndex):
+    def __init__(self, vectors, categories=None):
+        super().__init__(categories)
+        self.matrix = normalize_rows(vectors)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _scores(self, matrix, query):
+        if _is_sparse(matrix):
+            scores = matrix.dot(query.T)
+            return np.asarray(scores.todense() if _is_sparse(scores) else scores, dtype=np.float32).ravel()
+        return matrix @ query
+
+    def search(self, query, k=10, category=None, exclude=None):
+        query = self._prepare_query(query)
+        rows = self._allowed_rows(category)
+        if rows is None:
+            scores = self._scores(self.matrix, query)
+        else:
+            scores = self._scores(self.matrix[rows], query)
+        if exclude is not None:
+            # Ask for one extra and drop the excluded row (e.g. the product being recommended from)
+            hits = top_k(scores, k + 1, rows)
+            return [h for h in hits if h[0] != exclude][:k]
+        return top_k(scores, k, rows)
+
+
+class IVFIndex(_BaseIndex):
+    def __init__(self, vectors, categories=None, n_lists=None, nprobe=8, train_iters=10, seed=0):
+        super().__init__(categories)
+        if _is_sparse(vectors):
+            vectors = vectors.toarray()
+        matrix = normalize_rows(vectors)
+        self.size = matrix.shape[0]
+        self.n_lists = n_lists or max(1, int(np.sqrt(self.size)))
+        self.nprobe = nprobe
+        self.centroids = self._train(matrix, train_iters, seed)
+        assignments = self._assign(matrix)
+        # Rows grouped by list so each probed list is a contiguous slice; only this copy is kept
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.n_lists + 1))
+        self.sorted_matrix = matrix[self.order]
+
+    def __len__(self):
+        return self.size
+
+    def _train(self, matrix, iters, seed):
+        # Spherical k-means on a sample; good enough for a coarse quantizer
+        rng = np.random.default_rng(seed)
+        n = matrix.shape[0]
+        sample = matrix[rng.choice(n, size=min(n, self.n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=self.n_lists, replace=False)].copy()
+        for _ in range(iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.n_lists):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        return centroids
+
+    def _assign(self, matrix, chunk=65536):
+        out = np.empty(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], chunk):
+            out[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ self.centroids.T, axis=1)
+        return out
+
+    def search(self, query, k=10, category=None, exclude=None, nprobe=None):
+        query = self._prepare_query(query)
+        if _is_sparse(query):
+            query = query.toarray()[0]
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in probe])
+        rows = self.order[candidates]
+        allowed = self._allowed_rows(category)
+        if allowed is not None:
+            keep = np.isin(rows, allowed, assume_unique=True)
+            candidates, rows = candidates[keep], rows[keep]
+        scores = self.sorted_matrix[candidates] @ query
+        if exclude is not None:
+            hits = top_k(scores, k + 1, rows)
+            return [h for h in hits if h[0] != exclude][:k]
+        return top_k(scores, k, rows)
+
+
+BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def build_index(vectors, backend="exact", categories=None, **kwargs):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector search backend: {backend}")
+    return BACKENDS[backend](vectors, categories=categories, **kwargs)
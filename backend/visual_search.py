@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from vector_search import build_index, normalize_rows
+
+# /visual-search ranking: an uploaded photo is compared against both the CLIP embeddings of the
+# product images (image-image) and of the product names (image-text).
+# - candidates are the union of both indexes' top `k * overfetch` hits; each candidate is then
+#   scored exactly in both spaces
+# - the two cosine scores live on different scales (image-image sims sit far above image-text),
+#   so each is z-scored over the candidate set before the weighted sum; products without an image
+#   are ranked on their text score alone
+# - PerceptualHashCache maps a 64-bit dHash of the upload to its embedding, so re-uploads and
+#   near-duplicates (within `max_distance` bits) skip CLIP inference
+
+
+def _zscore(scores):
+    if scores.size == 0:
+        return scores
+    std = scores.std()
+    return (scores - scores.mean()) / (std if std > 1e-6 else 1.0)
+
+
+class FusedVisualIndex:
+    def __init__(self, text_vectors, categories, backend="exact", image_weight=0.7, overfetch=4):
+        self.text_vectors = normalize_rows(text_vectors)
+        self.categories = list(categories)
+        self.backend = backend
+        self.image_weight = image_weight
+        self.overfetch = overfetch
+        self.text_index = build_index(self.text_vectors, backend, categories=self.categories)
+        self.image_vectors = None # aligned with text rows; zero rows where a product has no image
+        self.has_image = np.zeros(self.text_vectors.shape[0], dtype=bool)
+        self.image_index = None
+        self.image_rows = None # image index row -> product row
+
+    def set_image_vectors(self, rows, vectors):
+        # rows: product row for each image vector
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        full = np.zeros((self.text_vectors.shape[0], vectors.shape[1]), dtype=np.float32)
+        full[rows] = vectors
+        has_image = np.zeros(self.text_vectors.shape[0], dtype=bool)
+        has_image[rows] = True
+        image_index = build_index(vectors, self.backend, categories=[self.categories[r] for r in rows])
+        # Swap in together so a concurrent search never sees a half-built state
+        self.image_vectors, self.has_image, self.image_index, self.image_rows = full, has_image, image_index, rows
+
+    @property
+    def image_count(self):
+        return int(self.has_image.sum())
+
+    def search(self, query, k=10, category=None):
+        # Returns [(row, fused_score, image_score or None, text_score)] best first
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        n = k * self.overfetch
+        candidates = {row for row, _ in self.text_index.search(query, k=n, category=category)}
+        image_vectors, has_image, image_index, image_rows = self.image_vectors, self.has_image, self.image_index, self.image_rows
+        if image_index is not None:
+            candidates.update(int(image_rows[row]) for row, _ in image_index.search(query, k=n, category=category))
+        if not candidates:
+            return []
+
+        rows = np.fromiter(sorted(candidates), dtype=np.int64)
+        text_scores = self.text_vectors[rows] @ query
+        fused = _zscore(text_scores)
+        image_scores = None
+        if image_vectors is not None:
+            image_scores = image_vectors[rows] @ query
+            with_image = has_image[rows]
+            if with_image.any():
+                fused = fused.copy()
+                fused[with_image] = (
+                    self.image_weight * _zscore(image_scores[with_image])
+                    + (1 - self.image_weight) * _zscore(text_scores[with_image])
+                )
+
+        order = np.argsort(-fused, kind="stable")[:k]
+        return [
+            (
+                int(rows[i]),
+                float(fused[i]),
+                float(image_scores[i]) if image_scores is not None and has_image[rows[i]] else None,
+                float(text_scores[i]),
+            )
+            for i in order
+        ]
+
+
+class PerceptualHashCache:
+    def __init__(self, max_size=4096, max_distance=4):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.items = OrderedDict()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0}
+
+    def get(self, phash):
+        embedding = self.items.get(phash)
+        if embedding is not None:
+            self.items.move_to_end(phash)
+            self.stats["hits"] += 1
+            return embedding
+        if self.max_distance > 0:
+            # Linear scan; a few thousand XOR + popcounts is well under a millisecond
+            best, best_distance = None, self.max_distance + 1
+            for key in self.items:
+                distance = (key ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            if best is not None:
+                self.items.move_to_end(best)
+                self.stats["near_hits"] += 1
+                return self.items[best]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, phash, embedding):
+        self.items[phash] = embedding
+        self.items.move_to_end(phash)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def snapshot(self):
+        return {**self.stats, "entries": len(self.items)}
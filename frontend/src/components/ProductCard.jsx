@@ -1,13 +1,27 @@
 
 import React from 'react';
 import { Link } from 'react-router-dom';
+import { productImageUrl } from '../services/apiService';
+
+const GRID_WIDTHS = [160, 320, 640];
 
 const ProductCard = ({ product }) => {
   return (
     <Link to={`/product/${product.id}`} className="group relative flex flex-col overflow-hidden rounded-lg border border-gray-200 dark:border-gray-700 bg-white dark:bg-gray-800 hover:shadow-lg transition-shadow duration-300">
       <div className="aspect-square bg-gray-200 dark:bg-gray-700 overflow-hidden">
         <img
-          src={product.image}
+          src={productImageUrl(product.id, 320)}
+          srcSet={GRID_WIDTHS.map((w) => `${productImageUrl(product.id, w)} ${w}w`).join(', ')}
+          sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw"
+          loading="lazy"
+          decoding="async"
+          onError={(e) => {
+            // Fall back to the original if the variant endpoint isn't reachable
+            if (e.currentTarget.src !== product.image) {
+              e.currentTarget.srcset = '';
+              e.currentTarget.src = product.image;
+            }
+          }}
           alt={product.name}
           className="h-full w-full object-cover object-center group-hover:opacity-75 transition-opacity"
         />
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import axios from 'axios';
+import { useCart } from './CartContext.jsx';
 
 const AuthContext = createContext(null);
 
@@ -12,6 +13,22 @@ export const AuthProvider = ({ children }) => {
   const [cartCount, setCartCount] = useState(0);
   // isLoadingAuth can be simplified as we're not waiting for localStorage
   const [isLoadingAuth, setIsLoadingAuth] = useState(false); // Set to false initially
+  const { cartItems } = useCart(); // AuthProvider sits inside CartProvider (see App.jsx)
+
+  // Header badge: read the stored cart totals instead of loading the whole cart.
+  // Refetched on login and whenever a cart call has replaced cartItems.
+  useEffect(() => {
+    if (!user) return;
+    let cancelled = false;
+    axios.get(`${API_URL}/cart/${encodeURIComponent(user.username)}/summary`)
+      .then((response) => {
+        if (!cancelled) setCartCount(response.data.quantity);
+      })
+      .catch((error) => console.error("Failed to fetch cart summary:", error));
+    return () => {
+      cancelled = true;
+    };
+  }, [user, cartItems]);
 
   // Function to log in a user
   const login = async (username, password) => {
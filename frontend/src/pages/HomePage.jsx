@@ -4,6 +4,7 @@ import { products as mockProducts } from '../data/mock.js';
 import ProductCard from '../components/ProductCard.jsx';
 import Spinner from '../components/Spinner.jsx';
 import { useAuth } from '../context/AuthContext.jsx';
+import { searchProducts } from '../services/apiService.js';
 
 // --- Utility functions for analytics (ensure this is consistent with ProductDetailPage) ---
 const API_URL = "http://localhost:8000";
@@ -78,7 +79,7 @@ const HomePage = () => {
   }, [user]);
 
   // --- Search and Filter Logic ---
-  const applyFiltersAndSearch = useCallback((currentSearchTerm, currentSelectedCategory) => {
+  const applyFiltersAndSearch = useCallback(async (currentSearchTerm, currentSelectedCategory) => {
     let tempProducts = [...allStoreProducts];
 
     if (currentSelectedCategory !== 'All') {
@@ -86,13 +87,21 @@ const HomePage = () => {
     }
 
     if (currentSearchTerm) {
-      const lowerCaseSearchTerm = currentSearchTerm.toLowerCase();
-      tempProducts = tempProducts.filter(p =>
-        p.name.toLowerCase().includes(lowerCaseSearchTerm) ||
-        p.description.toLowerCase().includes(lowerCaseSearchTerm) ||
-        (p.category && p.category.toLowerCase().includes(lowerCaseSearchTerm)) ||
-        (p.subcategory && p.subcategory.toLowerCase().includes(lowerCaseSearchTerm))
-      );
+      try {
+        // Ranked on the backend (/search); results come back best match first
+        const { items } = await searchProducts(currentSearchTerm, { category: currentSelectedCategory });
+        const byId = new Map(tempProducts.map(p => [String(p.id), p]));
+        tempProducts = items.map(item => byId.get(String(item.id))).filter(Boolean);
+      } catch (err) {
+        // Backend unreachable: fall back to substring matching on the local catalog
+        const lowerCaseSearchTerm = currentSearchTerm.toLowerCase();
+        tempProducts = tempProducts.filter(p =>
+          p.name.toLowerCase().includes(lowerCaseSearchTerm) ||
+          p.description.toLowerCase().includes(lowerCaseSearchTerm) ||
+          (p.category && p.category.toLowerCase().includes(lowerCaseSearchTerm)) ||
+          (p.subcategory && p.subcategory.toLowerCase().includes(lowerCaseSearchTerm))
+        );
+      }
     }
     setFilteredDisplayProducts(tempProducts);
     setGroupedFilteredProducts(groupProductsByCategory(tempProducts));
@@ -121,14 +130,13 @@ const HomePage = () => {
       setIsLoadingSearch(true);
       setSearchError(null);
 
-      const resultsCount = applyFiltersAndSearch(query, selectedCategory);
-
-      sendAnalyticsEvent('search_performed', {
-        query: query,
-        resultsCount: resultsCount,
+      applyFiltersAndSearch(query, selectedCategory).then(resultsCount => {
+        sendAnalyticsEvent('search_performed', {
+          query: query,
+          resultsCount: resultsCount,
+        });
+        setIsLoadingSearch(false); // Set to false after regular search
       });
-
-      setIsLoadingSearch(false); // Set to false after regular search
     } else {
       setFilteredDisplayProducts(allStoreProducts);
       setGroupedFilteredProducts(groupProductsByCategory(allStoreProducts));
@@ -29,7 +29,7 @@ const sendAnalyticsEvent = async (eventName, payload) => {
         eventName,
         timestamp: new Date().toISOString(),
         userId: getUserId(),
-        ...payload,
+        eventData: payload, // the backend reads productId etc. from eventData
       }),
     });
     if (!response.ok) {
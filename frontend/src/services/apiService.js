@@ -81,6 +81,22 @@ export async function sendMessageToBotStream(userInput) {
   }
 }
 
+// ===== Search =====
+// Ranked full-text search; the last word matches as a prefix, so it also works while typing
+export async function searchProducts(query, { category, limit = 50 } = {}) {
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+  if (category && category !== "All") params.set("category", category);
+  const res = await fetch(`${BASE_URL}/search?${params}`);
+  if (!res.ok) throw new Error("Search failed");
+  return res.json();
+}
+
+// ===== Product images =====
+// Resized WebP/AVIF variant closest to `width`; the backend redirects to an immutable, cacheable file
+export function productImageUrl(productId, width) {
+  return `${BASE_URL}/products/${encodeURIComponent(productId)}/image?w=${width}`;
+}
+
 // ===== Receipt =====
 export async function generateReceipt(orderDetails) {
   const data = await apiPost("/receipt", { orderDetails });